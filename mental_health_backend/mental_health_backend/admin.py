@@ -0,0 +1,62 @@
+from flask import Blueprint, request, jsonify
+from auth import admin_required, ensure_mongo_connection
+import traceback
+
+# Create blueprint for admin-only reports
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/admin/llm-usage', methods=['GET'])
+@admin_required
+def get_llm_usage():
+    """Per-feature LLM cost, tokens and latency percentiles by day, from the LLM ledger"""
+    # Ensure MongoDB connection
+    if not ensure_mongo_connection():
+        return jsonify({"error": "Database connection unavailable"}), 500
+
+    try:
+        days = int(request.args.get('days', 7))
+    except ValueError:
+        return jsonify({"error": "days must be an integer"}), 400
+    if days < 1 or days > 90:
+        return jsonify({"error": "days must be between 1 and 90"}), 400
+    feature = request.args.get('feature')
+
+    try:
+        from llm_ledger import usage_report, flush
+        # Include the calls this worker has not written yet
+        flush()
+        report = usage_report(days=days, feature=feature)
+        return jsonify({"days": days, "feature": feature, **report}), 200
+    except Exception as e:
+        print(f"DEBUG: Error building LLM usage report: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": "Failed to build LLM usage report", "details": str(e)}), 500
+
+@admin_bp.route('/admin/mood-population', methods=['GET'])
+@admin_required
+def get_mood_population():
+    """k-anonymized mood aggregates across all users per day or week, from the mood_population collection"""
+    # Ensure MongoDB connection
+    if not ensure_mongo_connection():
+        return jsonify({"error": "Database connection unavailable"}), 500
+
+    period = request.args.get('period', 'week')
+    from mood_population import PERIODS, population_report
+    if period not in PERIODS:
+        return jsonify({"error": f"period must be one of {', '.join(PERIODS)}"}), 400
+    since = request.args.get('since')
+    until = request.args.get('until')
+    try:
+        from mood_store import parse_mood_date
+        since = parse_mood_date(since).strftime('%Y-%m-%d') if since else None
+        until = parse_mood_date(until).strftime('%Y-%m-%d') if until else None
+    except ValueError:
+        return jsonify({"error": "since and until must be dates (YYYY-MM-DD)"}), 400
+
+    try:
+        # Computed by aggregate_mood_population.py; nothing is aggregated on request
+        return jsonify({"since": since, "until": until, **population_report(period, since, until)}), 200
+    except Exception as e:
+        print(f"DEBUG: Error reading mood population aggregates: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": "Failed to read mood population aggregates", "details": str(e)}), 500
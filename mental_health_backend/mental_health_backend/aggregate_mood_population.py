@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Admin command: refresh the population-level mood aggregates (mood_population)
+Recomputes, inside MongoDB, the daily and weekly k-anonymized aggregates of the days
+whose rollups changed since the last run (see mood_population.py). Schedule it, e.g.
+hourly from cron; --full recomputes every day
+Run with: python aggregate_mood_population.py [--full]
+"""
+import argparse
+from mood_population import refresh, ensure_population_indexes
+
+def main():
+    parser = argparse.ArgumentParser(description='Refresh the population-level mood aggregates')
+    parser.add_argument('--full', action='store_true',
+                        help='Recompute every day instead of the days changed since the last run')
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        ensure_population_indexes()
+        result = refresh(full=args.full)
+        since = f"changed since {result['since']:%Y-%m-%d %H:%M:%S}" if result["since"] else "all"
+        print(f"Refreshed {result['days']} daily and {result['weeks']} weekly mood aggregates ({since} days)")
+
+if __name__ == "__main__":
+    main()
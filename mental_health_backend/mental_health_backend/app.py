@@ -9,7 +9,10 @@ from mood import mood_bp
 from profile import profile_bp
 from emergency import emergency_bp
 from appointments import appointments_bp  # Import the appointments blueprint
+from admin import admin_bp
+from sync import sync_bp
 from auth import auth, chat_bp as auth_chat_bp
+from chat_socket import sock
 
 # Load environment variables from .env file
 load_dotenv()
@@ -79,6 +82,48 @@ def create_app():
         if not hasattr(mongo, 'db') or mongo.db is None:
             print("DEBUG: Flask-PyMongo not properly initialized, trying direct connection")
             init_mongo_client(app)
+        
+        # Indexes backing the mood queries and the per-session chat mood aggregates
+        try:
+            from mood_store import ensure_mood_indexes
+            ensure_mood_indexes()
+        except Exception as e:
+            print(f"DEBUG: Could not ensure mood indexes: {str(e)}")
+        try:
+            from mood_rollups import ensure_rollup_indexes
+            ensure_rollup_indexes()
+        except Exception as e:
+            print(f"DEBUG: Could not ensure mood rollup indexes: {str(e)}")
+        try:
+            from mood_factors import ensure_factor_indexes
+            ensure_factor_indexes()
+        except Exception as e:
+            print(f"DEBUG: Could not ensure mood factor indexes: {str(e)}")
+        try:
+            from mood_population import ensure_population_indexes
+            ensure_population_indexes()
+        except Exception as e:
+            print(f"DEBUG: Could not ensure mood population indexes: {str(e)}")
+        try:
+            from chat_archive import ensure_archive_indexes
+            ensure_archive_indexes()
+        except Exception as e:
+            print(f"DEBUG: Could not ensure chat archive indexes: {str(e)}")
+        try:
+            from tombstones import ensure_sync_indexes
+            ensure_sync_indexes()
+        except Exception as e:
+            print(f"DEBUG: Could not ensure sync indexes: {str(e)}")
+        
+        # Record every LLM call in the ledger
+        if Config.LLM_LEDGER_ENABLED:
+            from llm_gateway import add_listener
+            from llm_ledger import record_call, ensure_ledger_indexes
+            add_listener(record_call)
+            try:
+                ensure_ledger_indexes()
+            except Exception as e:
+                print(f"DEBUG: Could not ensure LLM ledger indexes: {str(e)}")
 
     # Import blueprints after initializing extensions to avoid circular imports
     from auth import auth, chat_bp
@@ -91,6 +136,12 @@ def create_app():
     app.register_blueprint(resources_bp, url_prefix='/api')
     app.register_blueprint(emergency_bp, url_prefix='/api')
     app.register_blueprint(appointments_bp, url_prefix='/api')  # Register the appointments blueprint
+    app.register_blueprint(admin_bp, url_prefix='/api')
+    app.register_blueprint(sync_bp, url_prefix='/api')
+    
+    # WebSocket channel for chat (/api/chat/ws), with keep-alive pings from the server
+    app.config['SOCK_SERVER_OPTIONS'] = {'ping_interval': Config.WEBSOCKET_PING_INTERVAL_SECONDS}
+    sock.init_app(app)
     
     # Debug endpoints
     @app.route('/debug/routes', methods=['GET'])
@@ -145,6 +196,22 @@ def create_app():
                 "message": str(e)
             }), 500
 
+    # Local intent router: deflection rate and classification latency of this worker
+    @app.route('/debug/intent-router', methods=['GET'])
+    def debug_intent_router():
+        from intent_router import router_stats, enabled_intents
+        return jsonify({
+            "enabled": Config.INTENT_ROUTER_ENABLED,
+            "intents": enabled_intents(),
+            **router_stats()
+        })
+
+    # Mood insights cache: hit rate and age of the responses served by this worker
+    @app.route('/debug/insights-cache', methods=['GET'])
+    def debug_insights_cache():
+        from insights_cache import cache_stats
+        return jsonify(cache_stats())
+
     # Health check endpoint
     @app.route('/health', methods=['GET'])
     def health_check():
@@ -7,6 +7,7 @@ import traceback
 import json
 # Import the new email utilities
 from email_utils import send_appointment_confirmation
+from tombstones import record_tombstone
 
 # Create blueprint
 appointments_bp = Blueprint('appointments', __name__)
@@ -409,6 +410,8 @@ def delete_appointment(appointment_id):
         
         if result.deleted_count == 0:
             return jsonify({"error": "Appointment not found or not authorized"}), 404
+        
+        record_tombstone(user_id, "appointments", appointment_id)
             
         return jsonify({"success": True, "message": "Appointment deleted successfully"}), 200
         
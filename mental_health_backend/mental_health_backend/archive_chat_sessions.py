@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Admin command: move inactive chat sessions to the compressed cold archive
+Sessions with no new message and no history read for --days days are packed into one
+compressed blob per session (see chat_archive.py); history endpoints keep serving them
+Run with: python archive_chat_sessions.py [--days 60] [--limit 1000] [--dry-run]
+          python archive_chat_sessions.py --report
+"""
+import argparse
+from config import Config
+from chat_archive import archive_session, inactive_sessions, archive_report, ensure_archive_indexes
+
+def format_bytes(value):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(value) < 1024 or unit == "GB":
+            return f"{value:.1f} {unit}" if unit != "B" else f"{value} B"
+        value /= 1024.0
+
+def print_report(report):
+    raw, stored = report["raw_bytes"], report["stored_bytes"]
+    ratio = f"{raw / stored:.1f}x" if stored else "n/a"
+    print(f"Archived sessions: {report['sessions']} ({report['messages']} messages)")
+    print(f"Raw size:          {format_bytes(raw)}")
+    print(f"Stored size:       {format_bytes(stored)} (compression {ratio})")
+    print(f"Bytes saved:       {format_bytes(report['saved_bytes'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive inactive chat sessions into compressed blobs')
+    parser.add_argument('--days', type=int, default=Config.CHAT_ARCHIVE_AFTER_DAYS,
+                        help=f'Archive sessions idle for more than this many days (default: {Config.CHAT_ARCHIVE_AFTER_DAYS})')
+    parser.add_argument('--limit', type=int, default=0, help='Maximum sessions archived in this run (0 = all)')
+    parser.add_argument('--dry-run', action='store_true', help='List the sessions that would be archived')
+    parser.add_argument('--report', action='store_true', help='Only print the archive totals and bytes saved')
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        if args.report:
+            print_report(archive_report())
+            return
+
+        ensure_archive_indexes()
+        sessions = messages = raw_total = stored_total = 0
+        for session in inactive_sessions(args.days):
+            if args.limit and sessions >= args.limit:
+                break
+            if args.dry_run:
+                print(f"Would archive {session['user_id']} / {session['session_id']}")
+                sessions += 1
+                continue
+            result = archive_session(session["user_id"], session["session_id"])
+            if result is None:
+                continue
+            count, raw_bytes, stored_bytes = result
+            sessions += 1
+            messages += count
+            raw_total += raw_bytes
+            stored_total += stored_bytes
+
+        if args.dry_run:
+            print(f"{sessions} sessions idle for more than {args.days} days (dry run)")
+            return
+        print(f"Archived {sessions} sessions ({messages} messages): "
+              f"{format_bytes(raw_total)} -> {format_bytes(stored_total)}")
+        print_report(archive_report())
+
+if __name__ == "__main__":
+    main()
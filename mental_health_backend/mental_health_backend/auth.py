@@ -3,80 +3,35 @@
 from flask import Blueprint, request, jsonify, current_app
 from models import db, User, Chat, bcrypt
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-import openai
 from config import Config
 from datetime import datetime
 from extensions import mongo, init_mongo_client
 from supabase_client import supabase, verify_supabase_token
+from crisis_detector import detect_crisis, SEVERITY_HIGH
+from chat_memory import retrieve_memories, remember_exchange, build_memory_prompt, forget_user
+from llm_gateway import get_gateway
+from mood_store import record_chat_mood
+from sentiment_policy import decide as decide_sentiment, inherit as inherit_sentiment
+from chat_events import publish as publish_event, publish_many as publish_events
+from chat_archive import session_chats, user_chats, delete_archive, delete_archives, archive_sessions
+from intent_router import route as route_intent
+from model_router import choose as choose_model_tier, record_latency as record_tier_latency
+from text_utils import estimate_tokens
+from session_context import get_context, store_context, append_context, invalidate_context
+from tombstones import record_tombstone, record_tombstones
+from pymongo import UpdateOne
+from bson.objectid import ObjectId
 from functools import wraps
 import uuid
+import time
 import traceback
 import json
 import re
 
-# Set the OpenAI API key
-openai.api_key = Config.OPENAI_API_KEY
-
 # Create blueprints
 auth = Blueprint('auth', __name__)
 chat_bp = Blueprint('chat', __name__)
 
-# Define sentiment analysis function
-def analyze_sentiment(text):
-    """
-    Analyze the sentiment of a message using OpenAI's API
-    Returns a sentiment score and mood category
-    """
-    try:
-        # Use the OpenAI API to analyze sentiment
-        messages = [
-            {"role": "system", "content": "You are a mental health professional analyzing the sentiment in a message. Rate the sentiment on a scale from -5 (extremely negative) to 5 (extremely positive). Also categorize the mood as one of: very_happy, happy, neutral, sad, very_sad, anxious, angry. Return your answer as a JSON object with fields 'score' and 'mood'."},
-            {"role": "user", "content": text}
-        ]
-        
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            max_tokens=150,
-            temperature=0.3
-        )
-        
-        # Extract the JSON response
-        result_text = response.choices[0].message.content.strip()
-        
-        # Try to parse the JSON
-        try:
-            # Sometimes the model might return text before/after the JSON
-            # This regex tries to extract the JSON object from the response
-            json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
-            if json_match:
-                result_json = json.loads(json_match.group(0))
-            else:
-                # If no JSON object is found, fallback to default values
-                result_json = {"score": 0, "mood": "neutral"}
-                
-            # Validate the sentiment score is between -5 and 5
-            score = float(result_json.get("score", 0))
-            score = max(-5, min(5, score))  # Clamp to range [-5, 5]
-            
-            # Validate the mood is one of the expected categories
-            valid_moods = ["very_happy", "happy", "neutral", "sad", "very_sad", "anxious", "angry"]
-            mood = result_json.get("mood", "neutral")
-            if mood not in valid_moods:
-                mood = "neutral"
-                
-            return {
-                "score": score,
-                "mood": mood
-            }
-        except Exception as json_error:
-            print(f"DEBUG: Error parsing sentiment JSON: {str(json_error)}")
-            return {"score": 0, "mood": "neutral"}  # Default values
-            
-    except Exception as e:
-        print(f"DEBUG: Error in sentiment analysis: {str(e)}")
-        return {"score": 0, "mood": "neutral"}  # Default values
-
 # Hybrid function to check both Supabase and JWT tokens
 def get_user_from_token(token):
     """Hybrid function that checks both Supabase and JWT tokens"""
@@ -133,6 +88,50 @@ def auth_required(f):
     
     return decorated
 
+# Signature-checked decode of the JWTs issued by create_access_token
+def verify_jwt_token(token):
+    """The user of a JWT access token signed with JWT_SECRET_KEY, or None"""
+    import jwt
+    try:
+        # Flask-JWT-Extended may issue non-string subjects, which PyJWT rejects by default
+        payload = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=["HS256"], options={"verify_sub": False})
+    except jwt.InvalidTokenError as e:
+        print(f"DEBUG: JWT verification failed: {str(e)}")
+        return None
+    if payload.get('type') != 'access' or 'sub' not in payload:
+        return None
+    return {"id": payload['sub'], "auth_type": "jwt"}
+
+def admin_user_from_token(token):
+    """
+    The user of a token whose signature was checked (by Supabase or against JWT_SECRET_KEY),
+    if they are listed in ADMIN_USER_IDS; None otherwise
+    get_user_from_token() is not enough here: it accepts JWTs without checking their signature
+    """
+    user = verify_supabase_token(token) or verify_jwt_token(token)
+    if not user:
+        return None
+    admin_ids = {user_id.strip() for user_id in Config.ADMIN_USER_IDS.split(',') if user_id.strip()}
+    return user if str(user.get('id')) in admin_ids else None
+
+# Admin-only endpoints: users listed in ADMIN_USER_IDS, with a verified token
+def admin_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({"error": "Authorization header required"}), 401
+        
+        user = admin_user_from_token(auth_header.split(' ')[1])
+        if not user:
+            return jsonify({"error": "Admin access required"}), 403
+        
+        # Make user info available to the wrapped function
+        request.user = user
+        return f(*args, **kwargs)
+    
+    return decorated
+
 # Ensure MongoDB is connected
 def ensure_mongo_connection():
     """Ensure MongoDB connection is active and return status"""
@@ -171,9 +170,10 @@ def token_debug():
         return jsonify({"error": "Invalid token from both verification methods"}), 401
     
     
-def analyze_sentiment(text):
+def analyze_sentiment(text, user_id=None, session_id=None):
     """
     Analyze the sentiment of a message using OpenAI's API
+    user_id and session_id are only recorded in the LLM ledger
     Returns a sentiment score, mood category, and potential emotional triggers
     """
     try:
@@ -190,15 +190,12 @@ def analyze_sentiment(text):
             {"role": "user", "content": text}
         ]
         
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            max_tokens=150,
-            temperature=0.3
+        response = get_gateway().complete(
+            "sentiment", messages, context={"user_id": user_id, "session_id": session_id}
         )
         
         # Extract the JSON response
-        result_text = response.choices[0].message.content.strip()
+        result_text = response["text"]
         
         # Try to parse the JSON
         try:
@@ -244,10 +241,6 @@ def process_chat():
     """Handle chat messages from users with sentiment analysis"""
     print("DEBUG: POST /chat endpoint called")
     
-    # User is available from the auth_required decorator
-    user = request.user
-    user_id = user.get('id')
-    
     # Ensure MongoDB connection
     if not ensure_mongo_connection():
         return jsonify({"error": "Database connection unavailable"}), 500
@@ -255,6 +248,23 @@ def process_chat():
     # Parse request data
     data = request.get_json() or {}
     print(f"DEBUG: Received data => {data}")
+    
+    # User is available from the auth_required decorator
+    result, status = run_chat_turn(request.user, data)
+    return jsonify(result), status
+
+def run_chat_turn(user, data, on_delta=None, origin=None):
+    """
+    Process one chat message for a user: crisis screening, sentiment, history,
+    model reply and storage. Shared by the HTTP endpoint and the WebSocket channel
+    If on_delta is given the reply is streamed and passed to it chunk by chunk, with
+    the turn's session id (created here when none was given); replies that are not
+    generated by the model are passed as one chunk
+    origin is the event subscription of the sending connection, which is not
+    sent its own message.new event
+    Returns (response dict, HTTP status)
+    """
+    user_id = user.get('id')
 
     subject_val = data.get("subject", "General")
     user_message = data.get("message")
@@ -263,11 +273,28 @@ def process_chat():
 
     # Validate input
     if not isinstance(subject_val, str):
-        return jsonify({"error": "subject must be a string"}), 422
+        return {"error": "subject must be a string"}, 422
     if not isinstance(user_message, str):
-        return jsonify({"error": "message must be a string"}), 422
+        return {"error": "message must be a string"}, 422
     if not user_message.strip():
-        return jsonify({"error": "message cannot be empty"}), 422
+        return {"error": "message cannot be empty"}, 422
+
+    # Screen for crisis language locally, before any model call
+    crisis_result = detect_crisis(user_message) if Config.CRISIS_DETECTION_ENABLED else None
+    crisis_payload = None
+    # Explicit suicidal intent is answered immediately instead of waiting for the model
+    answered_locally = bool(
+        crisis_result and crisis_result["severity"] == SEVERITY_HIGH and Config.CRISIS_SHORT_CIRCUIT
+    )
+    if crisis_result and crisis_result["detected"]:
+        print(f"DEBUG: Crisis language detected ({crisis_result['severity']}): {crisis_result['matches']}")
+    
+    # Common requests (breathing exercise, hotline numbers, booking) are answered from the
+    # local content library; never when crisis language was detected
+    intent_match = None if crisis_result and crisis_result["detected"] else route_intent(user_message)
+    if intent_match:
+        print(f"DEBUG: Answering locally for intent {intent_match['intent']} ({intent_match['method']}, "
+              f"confidence {intent_match['confidence']}, {intent_match['latency_ms']} ms)")
 
     try:
         # Create a session if one wasn't provided
@@ -288,44 +315,99 @@ def process_chat():
                 
                 mongo.db.chat_sessions.insert_one(session)
                 print(f"DEBUG: Automatically created session with ID: {session_id}")
+                publish_event(user_id, {
+                    "type": "session.created",
+                    "session_id": session_id,
+                    "title": session["title"],
+                    "created_at": session["created_at"].isoformat()
+                })
             except Exception as e:
                 print(f"DEBUG: Error auto-creating session: {str(e)}")
                 # Continue anyway - the message will still be stored
         
-        # Perform sentiment analysis
-        sentiment_result = analyze_sentiment(user_message)
-        print(f"DEBUG: Sentiment analysis result: {sentiment_result}")
+        # Attach crisis resources and offer the emergency alert
+        if crisis_result and crisis_result["detected"]:
+            # Import locally to avoid circular imports (emergency imports auth)
+            from emergency import build_crisis_payload
+            crisis_payload = build_crisis_payload(crisis_result, user_id)
         
         # Fetch previous messages for this session if provided
         conversation_history = []
+        previous_messages = []
         if session_id:
             try:
                 # Convert user_id to string for consistency in querying
                 user_id_str = str(user_id)
-                # Get previous messages for this session, ordered by timestamp
-                previous_messages = list(mongo.db.chats.find(
-                    {"user_id": user_id_str, "session_id": session_id}
-                ).sort("timestamp", 1))
+                # Update the session's last activity timestamp; its message count tells
+                # whether the cached context (from the history read or the last turn) is current
+                session_doc = mongo.db.chat_sessions.find_one_and_update(
+                    {"user_id": user_id_str, "session_id": session_id},
+                    {"$set": {"updated_at": datetime.utcnow()}},
+                    projection={"message_count": 1}
+                )
+                cached_messages = None
+                if session_doc is not None and "message_count" in session_doc:
+                    cached_messages = get_context(user_id_str, session_id, session_doc["message_count"])
+                
+                if cached_messages is not None:
+                    previous_messages = cached_messages
+                else:
+                    # Get previous messages for this session, ordered by timestamp
+                    # (including the archived part if the session was idle long enough to be archived)
+                    previous_messages = session_chats(user_id_str, session_id)
+                    store_context(user_id_str, session_id, previous_messages)
                 
                 # Add messages to conversation history
                 for msg in previous_messages:
                     conversation_history.append({"role": "user", "content": msg["message"]})
                     conversation_history.append({"role": "assistant", "content": msg["response"]})
                 
-                print(f"DEBUG: Found {len(previous_messages)} previous messages in this session")
-                
-                # Update the session's last activity timestamp
-                mongo.db.chat_sessions.update_one(
-                    {"user_id": user_id_str, "session_id": session_id},
-                    {"$set": {"updated_at": datetime.utcnow()}}
-                )
+                print(f"DEBUG: Found {len(previous_messages)} previous messages in this session"
+                      f"{' (cached)' if cached_messages is not None else ''}")
             except Exception as e:
                 print(f"DEBUG: Error retrieving conversation history: {str(e)}")
                 # Continue anyway even if we can't get history
 
+        # Perform sentiment analysis when the sampling policy asks for it
+        # (skipped for messages answered locally)
+        if answered_locally:
+            # Not a model score: flagged so it stays out of mood tracking and sentiment sampling
+            sentiment_result = {"score": -5.0, "mood": "very_sad", "factors": [],
+                                "source": "crisis_detector", "local": True}
+        else:
+            should_score, policy_reason, last_sentiment = decide_sentiment(
+                user_message,
+                previous_messages,
+                crisis=bool(crisis_result and crisis_result["detected"])
+            )
+            if should_score:
+                sentiment_result = analyze_sentiment(user_message, user_id=user_id, session_id=session_id)
+            else:
+                sentiment_result = inherit_sentiment(last_sentiment, policy_reason)
+            print(f"DEBUG: Sentiment policy: {'scored' if should_score else 'skipped'} ({policy_reason})")
+        print(f"DEBUG: Sentiment analysis result: {sentiment_result}")
+
+        # Recall relevant exchanges from the user's earlier sessions
+        memory_snippets = []
+        if Config.CHAT_MEMORY_ENABLED and not answered_locally and not intent_match:
+            try:
+                memory_snippets = retrieve_memories(user_id, user_message, exclude_session=session_id)
+                print(f"DEBUG: Retrieved {len(memory_snippets)} memory snippets from earlier sessions")
+            except Exception as e:
+                print(f"DEBUG: Error retrieving chat memory: {str(e)}")
+                # Continue anyway, memory is only extra context
+
         # Build the messages array for OpenAI
         messages = [{"role": "system", "content": Config.MENTAL_HEALTH_SYSTEM_PROMPT}]
         
+        # Make sure the model follows the crisis guidance when risk language was detected
+        if crisis_payload:
+            messages.append({"role": "system", "content": "The user's latest message contains possible self-harm or crisis language. Respond with warmth, prioritize their safety, and gently encourage them to use the crisis resources shown in the app or to contact emergency services or someone they trust."})
+        
+        # Add notes from earlier sessions before the current conversation
+        if memory_snippets:
+            messages.append(build_memory_prompt(memory_snippets))
+        
         # Add conversation history if we have it
         if conversation_history:
             messages.extend(conversation_history)
@@ -336,17 +418,66 @@ def process_chat():
         print(f"DEBUG: Sending {len(messages)} messages to OpenAI")
         
         # Make the API call to OpenAI with the full conversation context
-        try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                max_tokens=800,
-                temperature=0.7
+        routing = None
+        if answered_locally:
+            from emergency import get_crisis_reply
+            gpt_response = get_crisis_reply(crisis_result["language"])
+            if on_delta:
+                on_delta(gpt_response, session_id)
+        elif intent_match:
+            gpt_response = intent_match["reply"]
+            if on_delta:
+                on_delta(gpt_response, session_id)
+        else:
+            # Pick the model tier and token limit for this message
+            routing, tier_overrides = choose_model_tier(
+                user_message,
+                session_depth=len(previous_messages),
+                crisis=bool(crisis_result and crisis_result["detected"]),
+                language=crisis_result["language"] if crisis_result else None
             )
-            gpt_response = response.choices[0].message.content.strip()
-        except Exception as openai_err:
-            print(f"DEBUG: OpenAI API error: {str(openai_err)}")
-            return jsonify({"error": f"Error from AI service: {str(openai_err)}"}), 503
+            print(f"DEBUG: Model routing: {routing['tier']} ({routing['reason']}) -> {routing['model']}")
+            call_context = {"user_id": user_id, "session_id": session_id, "tier": routing["tier"]}
+            try:
+                started = time.monotonic()
+                first_token_ms = None
+                completion_tokens = None
+                # Time spent handing deltas to the socket is not the model's
+                delivery_seconds = 0.0
+                if on_delta:
+                    # Stream the reply to the caller as the model produces it
+                    gpt_response = ""
+                    for delta in get_gateway().stream("chat", messages, context=call_context, **tier_overrides):
+                        if first_token_ms is None:
+                            first_token_ms = (time.monotonic() - started) * 1000
+                        gpt_response += delta
+                        delivered = time.monotonic()
+                        on_delta(delta, session_id)
+                        delivery_seconds += time.monotonic() - delivered
+                    gpt_response = gpt_response.strip()
+                else:
+                    response = get_gateway().complete("chat", messages, context=call_context, **tier_overrides)
+                    gpt_response = response["text"]
+                    completion_tokens = (response.get("usage") or {}).get("completion_tokens")
+                generation_ms = (time.monotonic() - started - delivery_seconds) * 1000
+                completion_tokens = completion_tokens or estimate_tokens(gpt_response)
+                routing["latency_ms"] = round(generation_ms, 1)
+                if first_token_ms is not None:
+                    routing["first_token_ms"] = round(first_token_ms, 1)
+                # Judged per output token, so long replies do not make a tier look slow; a
+                # streamed reply's wait for its first token is judged on its own
+                record_tier_latency(routing["tier"], first_token_ms=first_token_ms,
+                                    ms_per_token=(generation_ms - (first_token_ms or 0)) / max(completion_tokens, 1))
+            except Exception as openai_err:
+                print(f"DEBUG: OpenAI API error: {str(openai_err)}")
+                # Never leave a user in crisis without resources because the AI service failed
+                if crisis_payload:
+                    from emergency import get_crisis_reply
+                    gpt_response = get_crisis_reply(crisis_result["language"])
+                    if on_delta:
+                        on_delta(gpt_response, session_id)
+                else:
+                    return {"error": f"Error from AI service: {str(openai_err)}"}, 503
 
         # Store chat in MongoDB, now including session_id and sentiment
         chat_document = {
@@ -358,6 +489,17 @@ def process_chat():
             "session_id": session_id,  # Always include session_id now
             "sentiment": sentiment_result  # Add sentiment analysis result
         }
+        if crisis_payload:
+            chat_document["crisis"] = crisis_payload
+        if routing:
+            chat_document["routing"] = routing
+        if intent_match:
+            chat_document["intent"] = {
+                "name": intent_match["intent"],
+                "confidence": intent_match["confidence"],
+                "method": intent_match["method"],
+                "language": intent_match["language"]
+            }
 
         print(f"DEBUG: Storing in MongoDB: {chat_document}")
         
@@ -373,6 +515,12 @@ def process_chat():
                 {"session_id": session_id, "user_id": str(user_id)},
                 {"$inc": {"message_count": 1}}
             )
+            
+            # Keep the cached session context in step with the stored messages
+            append_context(user_id, session_id, chat_document)
+            
+            # Make the exchange available to future sessions
+            remember_exchange(user_id, session_id, user_message, gpt_response)
         except Exception as mongo_err:
             print(f"DEBUG: MongoDB storage error: {str(mongo_err)}")
             # Try using client directly if available
@@ -387,24 +535,19 @@ def process_chat():
                     print(f"DEBUG: Direct client MongoDB error: {str(client_err)}")
                     # Continue anyway so we return the response to the user
         
-            try:
-            # Store mood entry in separate collection for tracking
-                mood_entry = {
-                "user_id": str(user_id),
-                "date": datetime.utcnow().strftime('%Y-%m-%d'),
-                "mood": sentiment_result["mood"],
-                "mood_score": sentiment_result["score"],
-                "factors": sentiment_result.get("factors", []),  # Include detected factors if available
-                "source": "chat_message",
-                "message_id": str(chat_document["_id"]) if "_id" in chat_document else None,
-                "session_id": session_id,
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-        }
-                mongo.db.mood_entries.insert_one(mood_entry)
-                print(f"DEBUG: Stored mood entry: {mood_entry['mood']}")
-            except Exception as mood_err:
-                print(f"DEBUG: Error storing mood entry: {str(mood_err)}")
+        try:
+            # Store the detected mood for tracking (coalesced per session and day);
+            # placeholder sentiments from the crisis short-circuit are not moods
+            if not sentiment_result.get("local"):
+                record_chat_mood(
+                    user_id,
+                    session_id,
+                    sentiment_result,
+                    message_id=str(chat_document["_id"]) if "_id" in chat_document else None
+                )
+                print(f"DEBUG: Stored mood entry: {sentiment_result['mood']}")
+        except Exception as mood_err:
+            print(f"DEBUG: Error storing mood entry: {str(mood_err)}")
             # Continue anyway, non-critical
         
         # Only store in Supabase if using Supabase auth
@@ -435,12 +578,16 @@ def process_chat():
         # Format the MongoDB document timestamp for JSON response
         if "timestamp" in chat_document and isinstance(chat_document["timestamp"], datetime):
             chat_document["timestamp"] = chat_document["timestamp"].isoformat()
+        
+        # Push the new message and session activity to the user's other open connections
+        publish_event(user_id, {"type": "message.new", "session_id": session_id, "chat": chat_document}, exclude=origin)
+        publish_event(user_id, {"type": "session.updated", "session_id": session_id, "updated_at": chat_document["timestamp"]})
             
-        return jsonify(chat_document), 200
+        return chat_document, 200
     except Exception as e:
         print(f"DEBUG: Unexpected error in chat endpoint: {str(e)}")
         traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 
 @chat_bp.route('/chat/sessions', methods=['POST'])
 @auth_required
@@ -501,6 +648,12 @@ def create_session():
         response['updated_at'] = response['updated_at'].isoformat()
         
         print(f"DEBUG: Successfully created new session with ID: {session_id}")
+        publish_event(user_id, {
+            "type": "session.created",
+            "session_id": session_id,
+            "title": title,
+            "created_at": response['created_at']
+        })
         return jsonify(response), 201
         
     except Exception as e:
@@ -539,6 +692,8 @@ def get_user_sessions():
                     session['created_at'] = session['created_at'].isoformat()
                 if 'updated_at' in session and isinstance(session['updated_at'], datetime):
                     session['updated_at'] = session['updated_at'].isoformat()
+                if 'archived_at' in session and isinstance(session['archived_at'], datetime):
+                    session['archived_at'] = session['archived_at'].isoformat()
                 formatted_sessions.append(session)
             
             print(f"DEBUG: Found {len(formatted_sessions)} sessions in chat_sessions collection")
@@ -619,13 +774,11 @@ def get_chat_history():
     user_id_str = str(user_id)
     
     try:
-        # Prepare query filter
-        query_filter = {"user_id": user_id_str}
+        # Query the database, rehydrating archived sessions
         if session_id:
-            query_filter["session_id"] = session_id
-        
-        # Query the database
-        chats_cursor = mongo.db.chats.find(query_filter).sort("timestamp", 1)
+            chats_cursor = session_chats(user_id_str, session_id)
+        else:
+            chats_cursor = user_chats(user_id_str)
         chat_history = []
         
         for chat in chats_cursor:
@@ -656,11 +809,10 @@ def get_session_history(session_id):
         # Convert user_id to string for MongoDB query consistency
         user_id_str = str(user_id)
         
-        # Get all messages for this session
-        chats_cursor = mongo.db.chats.find({
-            "user_id": user_id_str,
-            "session_id": session_id
-        }).sort("timestamp", 1)
+        # Get all messages for this session (rehydrated from the archive if needed)
+        chats_cursor = session_chats(user_id_str, session_id)
+        # The next chat turn in this session reuses what was just read
+        store_context(user_id_str, session_id, chats_cursor)
         
         chat_history = []
         for chat in chats_cursor:
@@ -717,6 +869,9 @@ def update_session_title(session_id):
         if result.matched_count == 0:
             return jsonify({"error": "Session not found or not authorized"}), 404
         
+        invalidate_context(user_id_str, session_id)
+        publish_event(user_id, {"type": "session.updated", "session_id": session_id, "title": new_title})
+        
         return jsonify({
             "success": True,
             "session_id": session_id,
@@ -758,6 +913,8 @@ def get_session_details(session_id):
             session['created_at'] = session['created_at'].isoformat()
         if 'updated_at' in session and isinstance(session['updated_at'], datetime):
             session['updated_at'] = session['updated_at'].isoformat()
+        if 'archived_at' in session and isinstance(session['archived_at'], datetime):
+            session['archived_at'] = session['archived_at'].isoformat()
         
         return jsonify(session), 200
     except Exception as e:
@@ -807,6 +964,18 @@ def login():
         
     return jsonify({"msg": "Invalid email or password"}), 401
 
+def session_query(user_id_str, session_ids):
+    """
+    chat_sessions filter for a user's sessions by id; sessions stored with their id
+    as the document _id (an ObjectId) instead of a session_id field match too
+    """
+    session_ids = list(session_ids)
+    clauses = [{"session_id": {"$in": session_ids}}]
+    object_ids = [ObjectId(session_id) for session_id in session_ids if ObjectId.is_valid(session_id)]
+    if object_ids:
+        clauses.append({"_id": {"$in": object_ids}})
+    return {"user_id": user_id_str, "$or": clauses}
+
 # Add this endpoint to your auth.py file where the other chat_bp routes are defined
 
 @chat_bp.route('/chat/sessions/<session_id>', methods=['DELETE'])
@@ -825,24 +994,11 @@ def delete_chat_session(session_id):
         # Convert user_id to string for MongoDB query consistency
         user_id_str = str(user_id)
         
-        # Delete the session from the chat_sessions collection
-        session_result = mongo.db.chat_sessions.delete_one({
-            "user_id": user_id_str,
-            "session_id": session_id
-        })
+        # Delete the session from the chat_sessions collection (by session_id or ObjectId _id)
+        session_result = mongo.db.chat_sessions.delete_one(session_query(user_id_str, [session_id]))
         
-        if session_result.deleted_count == 0:
-            # Try using ObjectId in case session_id is stored as an ObjectId
-            from bson.objectid import ObjectId
-            try:
-                obj_id = ObjectId(session_id)
-                session_result = mongo.db.chat_sessions.delete_one({
-                    "user_id": user_id_str,
-                    "_id": obj_id
-                })
-            except:
-                # If session_id is not a valid ObjectId, this will fail
-                pass
+        if session_result.deleted_count > 0:
+            record_tombstone(user_id_str, "chat_sessions", session_id)
         
         # Delete all chat messages associated with this session
         messages_result = mongo.db.chats.delete_many({
@@ -864,13 +1020,156 @@ def delete_chat_session(session_id):
         except:
             pass
         
+        # Archived messages go with the session
+        archived_deleted = delete_archive(user_id_str, session_id)
+        invalidate_context(user_id_str, session_id)
+        
+        # Deleted conversations must not resurface as memories
+        forget_user(user_id_str)
+        
+        publish_event(user_id, {"type": "session.deleted", "session_id": session_id})
+        
         # Return success even if nothing was deleted (idempotent)
         return jsonify({
             "success": True,
             "session_deleted": session_result.deleted_count > 0,
-            "messages_deleted": messages_result.deleted_count
+            "messages_deleted": messages_result.deleted_count + archived_deleted
         }), 200
     except Exception as e:
         print(f"DEBUG: Error deleting chat session: {str(e)}")
         traceback.print_exc()
-        return jsonify({"error": "Failed to delete chat session", "details": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": "Failed to delete chat session", "details": str(e)}), 500
+
+# Bulk operations run grouped by type, in this order
+BULK_SESSION_OPS = ("retitle", "archive", "delete")
+
+@chat_bp.route('/chat/sessions/bulk', methods=['POST'])
+@auth_required
+def bulk_session_operations():
+    """
+    Archive, delete or retitle many chat sessions in one request
+    Body: {"operations": [{"op": "delete", "session_id": "..."},
+                          {"op": "retitle", "session_id": "...", "title": "..."}, ...]}
+    Operations are grouped by type and each group runs as a few $in queries instead of
+    one round trip per session; the response has one result per operation, in order
+    """
+    # User is available from the auth_required decorator
+    user = request.user
+    user_id = user.get('id')
+    
+    # Ensure MongoDB connection
+    if not ensure_mongo_connection():
+        return jsonify({"error": "Database connection unavailable"}), 500
+    
+    data = request.get_json() or {}
+    operations = data.get('operations')
+    
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"error": "operations must be a non-empty list"}), 400
+    if len(operations) > Config.CHAT_BULK_MAX_OPERATIONS:
+        return jsonify({"error": f"At most {Config.CHAT_BULK_MAX_OPERATIONS} operations per request"}), 400
+    
+    # Validate every operation up front; invalid ones get their result and are not run
+    results = []
+    groups = {op: [] for op in BULK_SESSION_OPS}
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            results.append({"index": index, "status": "invalid", "error": "Operation must be an object"})
+            continue
+        op = operation.get('op')
+        session_id = operation.get('session_id')
+        result = {"index": index, "op": op, "session_id": session_id}
+        results.append(result)
+        if op not in groups:
+            result.update(status="invalid", error=f"op must be one of: {', '.join(BULK_SESSION_OPS)}")
+        elif not session_id or not isinstance(session_id, str):
+            result.update(status="invalid", error="Valid session_id is required")
+        elif op == "retitle" and (not operation.get('title') or not isinstance(operation.get('title'), str)):
+            result.update(status="invalid", error="Valid title is required")
+        else:
+            if op == "retitle":
+                result["title"] = operation['title']
+            groups[op].append(result)
+    
+    try:
+        # Convert user_id to string for MongoDB query consistency
+        user_id_str = str(user_id)
+        
+        requested = {result["session_id"] for group in groups.values() for result in group}
+        owned = set()
+        if requested:
+            # Matched on session_id or, like the single-session endpoints, on an ObjectId _id
+            for session in mongo.db.chat_sessions.find(session_query(user_id_str, requested), {"session_id": 1}):
+                owned.update(key for key in (session.get("session_id"), str(session["_id"])) if key in requested)
+        now = datetime.utcnow()
+        events = []
+        touched = set()
+        
+        # Retitle: one unordered bulk write for all the sessions found
+        updates = []
+        for result in groups["retitle"]:
+            if result["session_id"] not in owned:
+                result.update(status="not_found", error="Session not found or not authorized")
+                continue
+            updates.append(UpdateOne(
+                session_query(user_id_str, [result["session_id"]]),
+                {"$set": {"title": result["title"], "updated_at": now}}
+            ))
+            result["status"] = "ok"
+            touched.add(result["session_id"])
+            events.append({"type": "session.updated", "session_id": result["session_id"], "title": result["title"]})
+        if updates:
+            mongo.db.chat_sessions.bulk_write(updates, ordered=False)
+        
+        # Archive: all sessions' live messages compressed and moved together
+        to_archive = [result["session_id"] for result in groups["archive"] if result["session_id"] in owned]
+        archived = archive_sessions(user_id_str, to_archive) if to_archive else {}
+        for result in groups["archive"]:
+            if result["session_id"] not in owned:
+                result.update(status="not_found", error="Session not found or not authorized")
+                continue
+            # Sessions without live messages (already archived) or too large are left as they are
+            messages_archived = archived.get(result["session_id"], (0,))[0]
+            result.update(status="ok", archived=result["session_id"] in archived, messages_archived=messages_archived)
+            touched.add(result["session_id"])
+        
+        # Delete: idempotent like the single delete, messages of unknown sessions are removed too
+        to_delete = list(dict.fromkeys(result["session_id"] for result in groups["delete"]))
+        if to_delete:
+            message_counts = {group["_id"]: group["count"] for group in mongo.db.chats.aggregate([
+                {"$match": {"user_id": user_id_str, "session_id": {"$in": to_delete}}},
+                {"$group": {"_id": "$session_id", "count": {"$sum": 1}}}
+            ])}
+            mongo.db.chats.delete_many({
+                "user_id": user_id_str,
+                "$or": [{"session_id": {"$in": to_delete}}, {"chat_id": {"$in": to_delete}}]  # chat_id from routes.py
+            })
+            mongo.db.chat_sessions.delete_many(session_query(user_id_str, to_delete))
+            record_tombstones(user_id_str, "chat_sessions", [session_id for session_id in to_delete if session_id in owned])
+            archived_counts = delete_archives(user_id_str, to_delete)
+            
+            for result in groups["delete"]:
+                session_id = result["session_id"]
+                result.update(status="ok", session_deleted=session_id in owned,
+                              messages_deleted=message_counts.get(session_id, 0) + archived_counts.get(session_id, 0))
+            touched.update(to_delete)
+            events.extend({"type": "session.deleted", "session_id": session_id} for session_id in to_delete)
+            
+            # Deleted conversations must not resurface as memories
+            forget_user(user_id_str)
+        
+        for session_id in touched:
+            invalidate_context(user_id_str, session_id)
+        publish_events(user_id, events)
+        
+        succeeded = sum(1 for result in results if result.get("status") == "ok")
+        return jsonify({
+            "success": True,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "results": results
+        }), 200
+    except Exception as e:
+        print(f"DEBUG: Error running bulk session operations: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": "Failed to run bulk session operations", "details": str(e)}), 500
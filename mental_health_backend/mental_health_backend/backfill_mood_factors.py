@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Backfill: intern the factors of existing mood entries into the factor dictionary
+Plain entries get factor_ids from their factors. Chat aggregates have their
+factor_counts and factor_score_sums re-keyed from factor names to factor ids, merging
+names that are now one factor, and get factor_ids. Then the daily rollups of every
+user with a changed entry are rebuilt so their counters are keyed by id too
+Safe to re-run: only plain entries without factor_ids and aggregates with
+non-id counter keys are read
+Run with: python backfill_mood_factors.py [--batch-size 1000] [--dry-run]
+"""
+import argparse
+from pymongo import UpdateOne
+from mood_store import SOURCE_CHAT_SESSION, field_key
+from mood_factors import intern_factors, ensure_factor_indexes
+from mood_rollups import rebuild_user_rollups
+
+def rekey_counters(entry):
+    """factor_counts and factor_score_sums of an aggregate keyed by factor id, or None if they already are"""
+    factor_counts = entry.get("factor_counts", {})
+    factor_score_sums = entry.get("factor_score_sums", {})
+    if all(str(key).isdigit() for key in factor_counts):
+        return None
+    counts, score_sums = {}, {}
+    for key in factor_counts:
+        factor_ids = [key] if str(key).isdigit() else intern_factors([key])
+        if not factor_ids:
+            continue
+        factor_key = field_key(str(factor_ids[0]))
+        counts[factor_key] = counts.get(factor_key, 0) + factor_counts[key]
+        score_sums[factor_key] = score_sums.get(factor_key, 0.0) + factor_score_sums.get(key, 0.0)
+    return {
+        "factor_counts": counts,
+        "factor_score_sums": score_sums,
+        "factor_ids": [int(key) for key in counts],
+    }
+
+def backfill(collection, batch_size, dry_run):
+    """Returns (plain entries updated, aggregates updated, users with a changed entry)"""
+    entries = aggregates = 0
+    changed_users = set()
+    operations = []
+
+    def flush():
+        if operations and not dry_run:
+            collection.bulk_write(operations, ordered=False)
+        operations.clear()
+
+    cursor = collection.find(
+        {"source": {"$ne": SOURCE_CHAT_SESSION}, "factor_ids": {"$exists": False}},
+        {"user_id": 1, "factors": 1}
+    )
+    for entry in cursor:
+        entries += 1
+        changed_users.add(entry.get("user_id"))
+        operations.append(UpdateOne(
+            {"_id": entry["_id"]}, {"$set": {"factor_ids": intern_factors(entry.get("factors", []))}}
+        ))
+        if len(operations) >= batch_size:
+            flush()
+
+    cursor = collection.find(
+        {"source": SOURCE_CHAT_SESSION},
+        {"user_id": 1, "factor_counts": 1, "factor_score_sums": 1}
+    )
+    for entry in cursor:
+        fields = rekey_counters(entry)
+        if fields is None:
+            continue
+        aggregates += 1
+        changed_users.add(entry.get("user_id"))
+        # Only replace the counters if no chat message was added since they were read
+        operations.append(UpdateOne(
+            {"_id": entry["_id"], "factor_counts": entry.get("factor_counts", {})}, {"$set": fields}
+        ))
+        if len(operations) >= batch_size:
+            flush()
+    flush()
+    return entries, aggregates, changed_users
+
+def main():
+    parser = argparse.ArgumentParser(description='Intern the factors of existing mood entries into factor ids')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Entries updated per bulk operation (default: 1000)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Report what would change without updating entries (new factors are still added '
+                             'to the dictionary)')
+    args = parser.parse_args()
+
+    from app import app
+    from extensions import mongo
+
+    with app.app_context():
+        ensure_factor_indexes()
+        entries, aggregates, changed_users = backfill(mongo.db.mood_entries, args.batch_size, args.dry_run)
+        factors = mongo.db.mood_factors.count_documents({})
+        print(f"{'Would update' if args.dry_run else 'Updated'} {entries} entries and {aggregates} chat "
+              f"aggregates of {len(changed_users)} users; the dictionary has {factors} factors")
+        if args.dry_run:
+            return
+
+        for user_id in changed_users:
+            if user_id:
+                rebuild_user_rollups(str(user_id))
+        print(f"Rebuilt the daily rollups of {len(changed_users)} users")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the long-term chat memory index
+Measures index build time and query latency on synthetic exchanges
+Run with: python benchmark_chat_memory.py [--pairs 1000 5000 20000] [--queries 500]
+"""
+import argparse
+import random
+import time
+from chat_memory import MemoryIndex
+
+TOPICS = [
+    "exam stress university deadline sleep study revision grades professor",
+    "sister family argument parents home dinner brother apologise",
+    "anxiety panic heart racing breathing crowded bus shopping",
+    "work manager overtime burnout meeting colleague promotion",
+    "breakup relationship boyfriend girlfriend lonely weekend friends",
+    "insomnia sleep night tired morning caffeine phone screen",
+    "grief grandmother funeral memories loss mourning",
+    "moving city new job loneliness neighbours homesick",
+]
+FILLER = "i feel so today and i don't know what to do about it anymore because".split()
+
+def make_text(rng, words=25):
+    topic = rng.choice(TOPICS).split()
+    return " ".join(rng.choice(topic) if rng.random() < 0.4 else rng.choice(FILLER) for _ in range(words))
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return sorted_values[index]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the chat memory index')
+    parser.add_argument('--pairs', type=int, nargs='+', default=[1000, 5000, 20000],
+                        help='Index sizes to benchmark (default: 1000 5000 20000)')
+    parser.add_argument('--queries', type=int, default=500,
+                        help='Queries per index size (default: 500)')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for pairs in args.pairs:
+        exchanges = [(f"session_{i // 20}", make_text(rng), make_text(rng, 40)) for i in range(pairs)]
+        queries = [make_text(rng, 15) for _ in range(args.queries)]
+
+        start = time.perf_counter()
+        index = MemoryIndex()
+        for session_id, message, response in exchanges:
+            index.add(session_id, message, response)
+        index.search(queries[0], top_k=3)  # forces compaction and IDF computation
+        build_seconds = time.perf_counter() - start
+
+        latencies = []
+        for query in queries:
+            t0 = time.perf_counter()
+            index.search(query, top_k=3, exclude_session="session_0", min_score=0.15)
+            latencies.append(time.perf_counter() - t0)
+        latencies.sort()
+
+        index_bytes = index._indptr.nbytes + index._indices.nbytes + index._counts.nbytes
+        print(f"{pairs:>7} pairs | build {build_seconds * 1000:8.1f} ms | "
+              f"query p50 {percentile(latencies, 50) * 1000:6.2f} ms | "
+              f"p99 {percentile(latencies, 99) * 1000:6.2f} ms | "
+              f"index {index_bytes / 1024:8.1f} KiB")
+
+if __name__ == "__main__":
+    main()
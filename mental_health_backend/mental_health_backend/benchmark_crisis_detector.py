@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the local crisis-language detector
+Runs single-threaded, so the result is messages per second per core
+Run with: python benchmark_crisis_detector.py [--messages 200000]
+"""
+import argparse
+import random
+import time
+from crisis_detector import detect_crisis, _MATCHER
+
+# Representative chat traffic: mostly ordinary messages, a few crisis and negated ones
+SAMPLE_MESSAGES = [
+    "I had a really stressful day at work and I can't stop thinking about it",
+    "Je me sens un peu seul depuis que j'ai déménagé, comment je peux rencontrer des gens ?",
+    "أشعر بالقلق قبل الامتحانات ولا أستطيع النوم جيداً",
+    "Thanks, that breathing exercise actually helped a lot",
+    "ok",
+    "My sister and I had a fight and now she won't talk to me. I don't know what to do.",
+    "Estoy muy cansado últimamente y no tengo ganas de hacer nada",
+    "Sometimes I feel hopeless about the future",
+    "I don't want to die, I just want the pain to stop",
+    "I want to die",
+    "je n'ai plus envie de vivre",
+    "Can you give me a grounding technique? My heart is racing and I feel like something bad is going to happen at any moment, it has been like this since this morning.",
+]
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return sorted_values[index]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the crisis-language detector')
+    parser.add_argument('--messages', type=int, default=200000,
+                        help='Number of messages to scan (default: 200000)')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Random seed for the message mix (default: 42)')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [rng.choice(SAMPLE_MESSAGES) for _ in range(args.messages)]
+    avg_length = sum(len(m) for m in corpus) / len(corpus)
+
+    # Warm up
+    for message in SAMPLE_MESSAGES:
+        detect_crisis(message)
+
+    latencies = []
+    detected = 0
+    start = time.perf_counter()
+    for message in corpus:
+        t0 = time.perf_counter()
+        result = detect_crisis(message)
+        latencies.append(time.perf_counter() - t0)
+        detected += result["detected"]
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"Phrases compiled:      {_MATCHER.size}")
+    print(f"Messages scanned:      {len(corpus)} (avg {avg_length:.0f} chars)")
+    print(f"Messages flagged:      {detected}")
+    print(f"Throughput:            {len(corpus) / elapsed:,.0f} messages/s/core")
+    print(f"Latency p50:           {percentile(latencies, 50) * 1e6:.1f} µs")
+    print(f"Latency p99:           {percentile(latencies, 99) * 1e6:.1f} µs")
+    print(f"Latency max:           {latencies[-1] * 1e6:.1f} µs")
+
+if __name__ == "__main__":
+    main()
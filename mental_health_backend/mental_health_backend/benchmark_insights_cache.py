@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the insights cache hit path
+Times generation() + get() for a cached response, the work done by /api/mood/insights
+on a cache hit, with the generation kept in the worker for
+MOOD_INSIGHTS_GENERATION_TTL_SECONDS and with it read from MongoDB on every request
+Needs a real MongoDB server (the generation read is the cost being measured)
+Run with: python benchmark_insights_cache.py [--requests 2000]
+"""
+import argparse
+import time
+from config import Config
+
+USER_ID = "benchmark-insights-cache"
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def time_hits(insights_cache, requests):
+    """Latencies in ms of cache hits, and the number of generation reads that went to MongoDB"""
+    reads_before = insights_cache.cache_stats()["generation_reads"]
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        current = insights_cache.generation(USER_ID)
+        insights = insights_cache.get(USER_ID, "month", "2025-01-01", current)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if insights is None:
+            raise SystemExit("Expected a cache hit")
+    return latencies, insights_cache.cache_stats()["generation_reads"] - reads_before
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the insights cache hit path')
+    parser.add_argument('--requests', type=int, default=2000, help='Cache hits timed per setting (default: 2000)')
+    args = parser.parse_args()
+
+    from app import app
+    from extensions import mongo
+    import insights_cache
+
+    with app.app_context():
+        insights_cache.invalidate(USER_ID)
+        insights_cache.store(USER_ID, "month", "2025-01-01", {"averageMoodScore": 0}, insights_cache.generation(USER_ID))
+        ttl = Config.MOOD_INSIGHTS_GENERATION_TTL_SECONDS
+        try:
+            for label, seconds in ((f"generation kept {ttl:g}s", ttl), ("generation read every hit", 0)):
+                Config.MOOD_INSIGHTS_GENERATION_TTL_SECONDS = seconds
+                latencies, reads = time_hits(insights_cache, args.requests)
+                print(f"  {label:<26} | p50 {percentile(latencies, 50):7.3f} ms | "
+                      f"p99 {percentile(latencies, 99):7.3f} ms | MongoDB reads {reads}")
+        finally:
+            Config.MOOD_INSIGHTS_GENERATION_TTL_SECONDS = ttl
+            insights_cache.forget_user(USER_ID)
+            mongo.db.mood_cache_generations.delete_one({"_id": USER_ID})
+
+if __name__ == "__main__":
+    main()
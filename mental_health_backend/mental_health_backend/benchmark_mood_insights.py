@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the mood insights computation
+Compares the single-pass accumulation in mood_insights with the former per-factor
+rescan of every entry on synthetic data, and checks both give the same insights
+Run with: python benchmark_mood_insights.py [--entries 10000] [--factors 500] [--repeat 3]
+"""
+import argparse
+import random
+import time
+from mood_store import SOURCE_CHAT_SESSION, VALID_MOODS, summarize_entry
+from mood_insights import accumulate, build_insights
+
+MOOD_SCORES = {"very_happy": 5, "happy": 3, "neutral": 0, "sad": -3, "very_sad": -5, "anxious": -2, "angry": -4}
+
+def make_entries(rng, count, factor_count, aggregate_share=0.2):
+    """Manual entries with 0-4 factor ids, and some chat aggregates of several messages"""
+    factor_ids = list(range(1, factor_count + 1))
+    entries = []
+    for _ in range(count):
+        if rng.random() < aggregate_share:
+            messages = rng.randint(2, 12)
+            mood_counts = {}
+            factor_counts = {}
+            factor_score_sums = {}
+            score_sum = 0.0
+            for _ in range(messages):
+                mood = rng.choice(VALID_MOODS)
+                score = MOOD_SCORES[mood]
+                score_sum += score
+                mood_counts[mood] = mood_counts.get(mood, 0) + 1
+                for factor in map(str, rng.sample(factor_ids, rng.randint(0, 2))):
+                    factor_counts[factor] = factor_counts.get(factor, 0) + 1
+                    factor_score_sums[factor] = factor_score_sums.get(factor, 0.0) + score
+            entries.append({"source": SOURCE_CHAT_SESSION, "count": messages, "score_sum": score_sum,
+                            "mood_counts": mood_counts, "factor_counts": factor_counts,
+                            "factor_score_sums": factor_score_sums})
+        else:
+            mood = rng.choice(VALID_MOODS)
+            entries.append({"mood": mood, "mood_score": MOOD_SCORES[mood],
+                            "factor_ids": rng.sample(factor_ids, rng.randint(0, 4))})
+    return entries
+
+def rescan_factor_scores(entries):
+    """The former approach: for each distinct factor, scan every entry mentioning it"""
+    summaries = [summarize_entry(entry) for entry in entries]
+    factors = set()
+    for summary in summaries:
+        factors.update(summary[3])
+    scores = {}
+    for factor in factors:
+        mentioning = [summary for summary in summaries if factor in summary[3]]
+        count = sum(summary[3][factor] for summary in mentioning)
+        scores[factor] = sum(summary[4].get(factor, 0.0) for summary in mentioning) / count
+    return scores
+
+def best_of(repeat, fn):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the mood insights computation')
+    parser.add_argument('--entries', type=int, default=10000, help='Number of mood entries (default: 10000)')
+    parser.add_argument('--factors', type=int, default=500, help='Number of distinct factors (default: 500)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per approach, best is reported (default: 3)')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    entries = make_entries(random.Random(args.seed), args.entries, args.factors)
+    print(f"{len(entries)} entries, {args.factors} factors")
+
+    single_seconds, insights = best_of(args.repeat, lambda: build_insights(accumulate(entries), "year"))
+    rescan_seconds, rescan_scores = best_of(args.repeat, lambda: rescan_factor_scores(entries))
+
+    # Both approaches must agree on the per-factor averages the insights are built from
+    totals = accumulate(entries)
+    mismatches = [factor for factor, score in rescan_scores.items()
+                  if abs(totals["factor_score_sums"][factor] / totals["factor_counts"][factor] - score) > 1e-9]
+
+    print(f"  single pass      {single_seconds * 1000:9.1f} ms")
+    print(f"  per-factor scan  {rescan_seconds * 1000:9.1f} ms  ({rescan_seconds / single_seconds:.0f}x slower)")
+    print(f"  average mood {insights['averageMoodScore']}, top factor {insights['topFactors'][0]['factor']!r}, "
+          f"factor mismatches: {len(mismatches)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the mood trends computation
+Builds synthetic daily rollups over several years (with gaps and a shift in mood
+half-way), times daily_series + compute_trends, and checks the rolling averages and
+the EWMA against a plain Python loop over the days
+Run with: python benchmark_mood_trends.py [--years 5] [--repeat 5]
+"""
+import argparse
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from mood_store import DATE_FORMAT
+from mood_trends import EWMA_HALFLIFE_DAYS, compute_trends, daily_series
+
+def make_rollups(rng, start, days, entry_share=0.7):
+    """One rollup per day with entries; the mood drops by two points after the middle day"""
+    rollups = []
+    for day in range(days):
+        if rng.random() > entry_share:
+            continue
+        mean = 1.5 if day < days // 2 else -0.5
+        scores = [max(-5.0, min(5.0, rng.gauss(mean, 1.5))) for _ in range(rng.randint(1, 4))]
+        rollups.append({
+            "date": (start + timedelta(days=day)).strftime(DATE_FORMAT),
+            "count": len(scores),
+            "score_sum": sum(scores),
+            "score_sq_sum": sum(score * score for score in scores),
+        })
+    return rollups
+
+def loop_trends(rollups, start, days, window, halflife):
+    """Reference: rolling average and EWMA day by day in Python"""
+    by_day = {(datetime.strptime(rollup["date"], DATE_FORMAT) - start).days: rollup for rollup in rollups}
+    decay = 0.5 ** (1.0 / halflife)
+    rolling, ewma = [], []
+    decayed_sum = decayed_count = 0.0
+    for day in range(days):
+        rollup = by_day.get(day, {"count": 0, "score_sum": 0.0})
+        window_rollups = [by_day[d] for d in range(max(0, day - window + 1), day + 1) if d in by_day]
+        count = sum(r["count"] for r in window_rollups)
+        rolling.append(sum(r["score_sum"] for r in window_rollups) / count if count else None)
+        decayed_sum = decayed_sum * decay + rollup["score_sum"]
+        decayed_count = decayed_count * decay + rollup["count"]
+        ewma.append(decayed_sum / decayed_count if decayed_count else None)
+    return rolling, ewma
+
+def best_of(repeat, fn):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def mismatches(expected, actual):
+    return sum(1 for e, a in zip(expected, actual)
+               if (e is None) != (a is None) or (e is not None and not math.isclose(round(e, 2), a, abs_tol=0.011)))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the mood trends computation')
+    parser.add_argument('--years', type=int, default=5, help='Length of the daily series in years (default: 5)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per approach, best is reported (default: 5)')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    days = args.years * 365
+    start = datetime(2020, 1, 1)
+    start_date = start.strftime(DATE_FORMAT)
+    rollups = make_rollups(random.Random(args.seed), start, days)
+    print(f"{days} days, {len(rollups)} days with entries")
+
+    def vectorized():
+        return compute_trends(*daily_series(rollups, start_date, days), start_date)
+
+    numpy_seconds, trends = best_of(args.repeat, vectorized)
+    loop_seconds, (rolling, ewma) = best_of(
+        args.repeat, lambda: loop_trends(rollups, start, days, 30, EWMA_HALFLIFE_DAYS)
+    )
+
+    print(f"  numpy (all trends)          {numpy_seconds * 1000:9.1f} ms")
+    print(f"  python loop (rolling, ewma) {loop_seconds * 1000:9.1f} ms  ({loop_seconds / numpy_seconds:.1f}x)")
+    print(f"  rolling_30 mismatches: {mismatches(rolling, trends['series']['rolling_30'])}, "
+          f"ewma mismatches: {mismatches(ewma, trends['series']['ewma'])}")
+    print(f"  average {trends['average']}, volatility {trends['volatility']}, changepoints: "
+          + ", ".join(f"{p['date']} ({p['average_before']} -> {p['average_after']})" for p in trends['changepoints']))
+
+if __name__ == "__main__":
+    main()
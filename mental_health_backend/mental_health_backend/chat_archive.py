@@ -0,0 +1,180 @@
+"""
+Cold archive for inactive chat sessions
+Sessions with no activity for CHAT_ARCHIVE_AFTER_DAYS are moved out of the hot chats
+collection into one zlib-compressed BSON blob per session (chat_archives collection).
+The session keeps its chat_sessions document, with archived_at and the archive sizes
+added, and readers go through session_chats()/user_chats() which merge the archived
+messages back in, so archived sessions read exactly like live ones
+"""
+import zlib
+from datetime import datetime, timedelta
+import bson
+from bson.binary import Binary
+from pymongo import ASCENDING, UpdateOne
+from config import Config
+from extensions import mongo
+
+# A MongoDB document is limited to 16MB; larger sessions stay in the hot collection
+MAX_BLOB_BYTES = 15 * 1024 * 1024
+
+def _decode(archive):
+    """Messages stored in an archive document, oldest first"""
+    payload = bson.decode(zlib.decompress(archive["blob"]))
+    return payload.get("chats", [])
+
+def _merge(archived, live):
+    """Archived and live messages of the same session(s), deduplicated and in time order"""
+    merged = {chat["_id"]: chat for chat in archived}
+    for chat in live:
+        merged[chat["_id"]] = chat
+    return sorted(merged.values(), key=lambda chat: (chat.get("timestamp") or datetime.min))
+
+def session_chats(user_id_str, session_id):
+    """All messages of a session, rehydrating the archived part if there is one"""
+    live = list(mongo.db.chats.find({"user_id": user_id_str, "session_id": session_id}).sort("timestamp", 1))
+    archive = mongo.db.chat_archives.find_one({"user_id": user_id_str, "session_id": session_id})
+    if not archive:
+        return live
+    return _merge(_decode(archive), live)
+
+def user_chats(user_id_str):
+    """All messages of a user across sessions, archived ones included"""
+    live = list(mongo.db.chats.find({"user_id": user_id_str}).sort("timestamp", 1))
+    archived = []
+    for archive in mongo.db.chat_archives.find({"user_id": user_id_str}):
+        archived.extend(_decode(archive))
+    if not archived:
+        return live
+    return _merge(archived, live)
+
+def recent_archived_chats(user_id_str, limit):
+    """A user's most recent archived messages, at most limit, oldest first"""
+    archived = []
+    for archive in mongo.db.chat_archives.find({"user_id": user_id_str}, {"blob": 1}).sort("last_timestamp", -1):
+        archived.extend(_decode(archive))
+        if len(archived) >= limit:
+            break
+    return _merge(archived, [])[-limit:]
+
+def archived_sessions(user_id_str, session_ids):
+    """The subset of session_ids that have an archive"""
+    return set(mongo.db.chat_archives.distinct(
+        "session_id", {"user_id": user_id_str, "session_id": {"$in": list(session_ids)}}
+    ))
+
+def delete_archive(user_id_str, session_id):
+    """Drop a session's archive; returns the number of archived messages removed"""
+    archive = mongo.db.chat_archives.find_one_and_delete(
+        {"user_id": user_id_str, "session_id": session_id}, {"message_count": 1}
+    )
+    return archive.get("message_count", 0) if archive else 0
+
+def delete_archives(user_id_str, session_ids):
+    """Drop the archives of several sessions; returns {session_id: archived messages removed}"""
+    query = {"user_id": user_id_str, "session_id": {"$in": list(session_ids)}}
+    counts = {archive["session_id"]: archive.get("message_count", 0)
+              for archive in mongo.db.chat_archives.find(query, {"session_id": 1, "message_count": 1})}
+    if counts:
+        mongo.db.chat_archives.delete_many(query)
+    return counts
+
+def archive_session(user_id_str, session_id, level=None):
+    """
+    Move a session's live messages into its compressed archive
+    Safe to re-run after an interruption: the blob is written before the live rows
+    are deleted, and readers deduplicate on _id while both exist
+    Returns (messages archived, raw BSON bytes, compressed bytes) or None if skipped
+    """
+    return archive_sessions(user_id_str, [session_id], level=level).get(session_id)
+
+def archive_sessions(user_id_str, session_ids, level=None):
+    """
+    archive_session() for several sessions of a user in a fixed number of round trips
+    Returns {session_id: (messages archived, raw BSON bytes, compressed bytes)}; sessions
+    without live messages or too large to archive are left out
+    """
+    live_by_session = {}
+    for chat in mongo.db.chats.find(
+        {"user_id": user_id_str, "session_id": {"$in": list(session_ids)}}
+    ).sort("timestamp", 1):
+        live_by_session.setdefault(chat["session_id"], []).append(chat)
+    if not live_by_session:
+        return {}
+    existing = {archive["session_id"]: archive for archive in mongo.db.chat_archives.find(
+        {"user_id": user_id_str, "session_id": {"$in": list(live_by_session)}}
+    )}
+
+    level = Config.CHAT_ARCHIVE_COMPRESSION_LEVEL if level is None else level
+    now = datetime.utcnow()
+    results = {}
+    archive_ops = []
+    session_ops = []
+    archived_ids = []
+    for session_id, live in live_by_session.items():
+        chats = _merge(_decode(existing[session_id]), live) if session_id in existing else live
+        raw_bytes = sum(len(bson.encode(chat)) for chat in chats)
+        blob = zlib.compress(bson.encode({"chats": chats}), level)
+        if len(blob) > MAX_BLOB_BYTES:
+            print(f"DEBUG: Session {session_id} too large to archive ({len(blob)} bytes compressed)")
+            continue
+
+        key = {"user_id": user_id_str, "session_id": session_id}
+        archive_ops.append(UpdateOne(key, {"$set": {
+            "blob": Binary(blob),
+            "message_count": len(chats),
+            "raw_bytes": raw_bytes,
+            "stored_bytes": len(blob),
+            "first_timestamp": chats[0].get("timestamp"),
+            "last_timestamp": chats[-1].get("timestamp"),
+            "archived_at": now
+        }}, upsert=True))
+        session_ops.append(UpdateOne(key, {"$set": {
+            "archived_at": now, "archive_raw_bytes": raw_bytes, "archive_stored_bytes": len(blob)
+        }}))
+        archived_ids.extend(chat["_id"] for chat in live)
+        results[session_id] = (len(chats), raw_bytes, len(blob))
+
+    if archive_ops:
+        mongo.db.chat_archives.bulk_write(archive_ops, ordered=False)
+        mongo.db.chats.delete_many({"_id": {"$in": archived_ids}})
+        mongo.db.chat_sessions.bulk_write(session_ops, ordered=False)
+    return results
+
+def inactive_sessions(days=None, now=None):
+    """chat_sessions idle (no message, no history read) for more than `days` with live messages to archive"""
+    days = Config.CHAT_ARCHIVE_AFTER_DAYS if days is None else days
+    cutoff = (now or datetime.utcnow()) - timedelta(days=days)
+    return mongo.db.chat_sessions.find(
+        {
+            "updated_at": {"$lt": cutoff},
+            "$and": [
+                {"$or": [{"last_accessed": {"$exists": False}}, {"last_accessed": {"$lt": cutoff}}]},
+                # Archived sessions only come back when they got new messages since
+                {"$or": [{"archived_at": {"$exists": False}}, {"$expr": {"$gt": ["$updated_at", "$archived_at"]}}]}
+            ]
+        },
+        {"user_id": 1, "session_id": 1}
+    )
+
+def archive_report():
+    """Totals over all archives: sessions, messages, raw and stored bytes"""
+    totals = list(mongo.db.chat_archives.aggregate([
+        {"$group": {
+            "_id": None,
+            "sessions": {"$sum": 1},
+            "messages": {"$sum": "$message_count"},
+            "raw_bytes": {"$sum": "$raw_bytes"},
+            "stored_bytes": {"$sum": "$stored_bytes"}
+        }}
+    ]))
+    if not totals:
+        return {"sessions": 0, "messages": 0, "raw_bytes": 0, "stored_bytes": 0, "saved_bytes": 0}
+    report = totals[0]
+    report.pop("_id", None)
+    report["saved_bytes"] = report["raw_bytes"] - report["stored_bytes"]
+    return report
+
+def ensure_archive_indexes():
+    """One archive per session, and the inactivity scan over chat_sessions"""
+    mongo.db.chat_archives.create_index([("user_id", ASCENDING), ("session_id", ASCENDING)], unique=True)
+    mongo.db.chat_sessions.create_index([("updated_at", ASCENDING)])
@@ -0,0 +1,228 @@
+"""
+Event bus for live chat updates
+Every open WebSocket connection subscribes with the id of its user; chat and session
+changes are published here and delivered to all of that user's connections
+Events are delivered directly to connections in the publishing worker and relayed to
+the other workers through a capped MongoDB collection that each worker with open
+sockets tails (works on a standalone mongod, unlike change streams)
+Only ids and metadata are relayed: message text and session titles stay in chats and
+chat_sessions, and the receiving worker reads them back for the sockets it serves
+"""
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict, OrderedDict
+from datetime import datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+from config import Config
+from extensions import mongo
+
+# Events buffered per connection before the slowest consumers start dropping them
+MAX_PENDING_EVENTS = 256
+
+# Identifies this worker so it skips its own events when tailing the shared collection
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+# ObjectIds of different workers are not ordered like the inserts, so a reopened cursor
+# reads back this far before the last event seen and skips the ids already delivered
+RESUME_OVERLAP = timedelta(seconds=30)
+SEEN_EVENT_IDS = 10000
+
+class Subscription:
+    """Outgoing event queue of one connection"""
+    def __init__(self, user_id):
+        self.user_id = str(user_id)
+        self.events = queue.Queue(maxsize=MAX_PENDING_EVENTS)
+        self.dropped = 0
+
+    def put(self, event, block=False):
+        # Replies to the connection's own requests wait briefly for room, pushed events never block
+        try:
+            self.events.put(event, block=block, timeout=5.0 if block else None)
+        except queue.Full:
+            # A connection that cannot keep up misses events rather than blocking the publisher
+            self.dropped += 1
+
+    def get(self, timeout=None):
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+_subscribers = defaultdict(set)
+_lock = threading.Lock()
+
+def subscribe(user_id):
+    subscription = Subscription(user_id)
+    with _lock:
+        _subscribers[subscription.user_id].add(subscription)
+    return subscription
+
+def unsubscribe(subscription):
+    with _lock:
+        subscribers = _subscribers.get(subscription.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del _subscribers[subscription.user_id]
+
+def _deliver(user_id, event, exclude=None):
+    with _lock:
+        subscribers = list(_subscribers.get(str(user_id), ()))
+    for subscription in subscribers:
+        if subscription is not exclude:
+            subscription.put(event)
+
+def has_subscribers(user_id):
+    with _lock:
+        return str(user_id) in _subscribers
+
+def _relayed(event):
+    """
+    The event as written to the shared collection: message text and titles are replaced
+    by what is needed to read them back; None if it cannot be relayed that way
+    """
+    if event.get("type") == "message.new":
+        chat_id = (event.get("chat") or {}).get("_id")
+        if chat_id is None:
+            return None
+        return {"type": event["type"], "session_id": event.get("session_id"), "chat_id": str(chat_id)}
+    relayed = {key: value for key, value in event.items() if key != "title"}
+    if "title" in event:
+        relayed["has_title"] = True
+    return relayed
+
+def _hydrate(db, user_id, event):
+    """Read back what _relayed() left out; None if the chat or session is gone"""
+    event = dict(event)
+    if event.get("type") == "message.new":
+        try:
+            chat = db.chats.find_one({"_id": ObjectId(event.pop("chat_id")), "user_id": user_id})
+        except InvalidId:
+            return None
+        if chat is None:
+            return None
+        chat["_id"] = str(chat["_id"])
+        if isinstance(chat.get("timestamp"), datetime):
+            chat["timestamp"] = chat["timestamp"].isoformat()
+        event["chat"] = chat
+    elif event.pop("has_title", False):
+        session = db.chat_sessions.find_one({"user_id": user_id, "session_id": event.get("session_id")}, {"title": 1})
+        if session is None:
+            return None
+        event["title"] = session.get("title")
+    return event
+
+def _relay_documents(user_id, events):
+    now = datetime.utcnow()
+    documents = []
+    for event in events:
+        relayed = _relayed(event)
+        if relayed is not None:
+            documents.append({"user_id": str(user_id), "worker": WORKER_ID, "event": relayed, "created_at": now})
+    return documents
+
+def publish(user_id, event, exclude=None):
+    """Deliver an event to every connection of a user (optionally except the sender)"""
+    _deliver(user_id, event, exclude=exclude)
+    if not Config.CHAT_EVENTS_CROSS_WORKER:
+        return
+    try:
+        documents = _relay_documents(user_id, [event])
+        if documents:
+            mongo.db.chat_events.insert_one(documents[0])
+    except Exception as e:
+        # Other workers miss this update, clients still get it on their next fetch
+        print(f"DEBUG: Could not relay chat event to other workers: {str(e)}")
+
+def publish_many(user_id, events):
+    """Like publish() for several events of one user, relayed in a single insert"""
+    if not events:
+        return
+    for event in events:
+        _deliver(user_id, event)
+    if not Config.CHAT_EVENTS_CROSS_WORKER:
+        return
+    try:
+        documents = _relay_documents(user_id, events)
+        if documents:
+            mongo.db.chat_events.insert_many(documents)
+    except Exception as e:
+        print(f"DEBUG: Could not relay {len(events)} chat events to other workers: {str(e)}")
+
+_relay_thread = None
+_relay_lock = threading.Lock()
+
+def _ensure_events_collection(db):
+    if "chat_events" not in db.list_collection_names():
+        try:
+            db.create_collection("chat_events", capped=True, size=Config.CHAT_EVENTS_CAPPED_BYTES)
+        except CollectionInvalid:
+            pass  # Created by another worker in the meantime
+
+def _relay(db):
+    """Tail the shared events collection and deliver other workers' events to local sockets"""
+    last_seen_at = None
+    # Ids delivered recently, oldest first, so a reopened cursor does not deliver them twice
+    seen = OrderedDict()
+    while True:
+        try:
+            _ensure_events_collection(db)
+            if last_seen_at is None:
+                newest = db.chat_events.find_one(sort=[("$natural", -1)], projection={"_id": 1})
+                last_seen_at = newest["_id"].generation_time if newest else None
+                if newest:
+                    seen[newest["_id"]] = True
+            query = {}
+            if last_seen_at is not None:
+                query = {"_id": {"$gte": ObjectId.from_datetime(last_seen_at - RESUME_OVERLAP)}}
+            cursor = db.chat_events.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+            while cursor.alive:
+                for document in cursor:
+                    if document["_id"] in seen:
+                        continue
+                    seen[document["_id"]] = True
+                    if len(seen) > SEEN_EVENT_IDS:
+                        seen.popitem(last=False)
+                    last_seen_at = max(last_seen_at or document["_id"].generation_time,
+                                       document["_id"].generation_time)
+                    user_id = document["user_id"]
+                    if document.get("worker") == WORKER_ID or not has_subscribers(user_id):
+                        continue
+                    event = _hydrate(db, user_id, document["event"])
+                    if event is not None:
+                        _deliver(user_id, event)
+                if connection_count() == 0:
+                    time.sleep(1.0)
+        except PyMongoError as e:
+            print(f"DEBUG: Chat event relay error: {str(e)}")
+        # Cursor died (empty collection or error), reopen it after a short pause
+        time.sleep(1.0)
+
+def start_relay():
+    """Start tailing the shared events collection once per worker (first socket connection)"""
+    global _relay_thread
+    if not Config.CHAT_EVENTS_CROSS_WORKER or _relay_thread is not None:
+        return
+    with _relay_lock:
+        if _relay_thread is None:
+            _relay_thread = threading.Thread(target=_relay, args=(mongo.db,), daemon=True, name="chat-events-relay")
+            _relay_thread.start()
+
+def forget_user(user_id):
+    """Remove a deleted user's relayed events"""
+    try:
+        mongo.db.chat_events.delete_many({"user_id": str(user_id)})
+    except PyMongoError as e:
+        # Servers before MongoDB 5.0 cannot delete from capped collections; the events
+        # hold no message text and are overwritten as the collection wraps around
+        print(f"DEBUG: Could not remove chat events: {str(e)}")
+
+def connection_count():
+    with _lock:
+        return sum(len(subscribers) for subscribers in _subscribers.values())
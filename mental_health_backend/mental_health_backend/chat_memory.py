@@ -0,0 +1,261 @@
+"""
+Local long-term memory across chat sessions
+Past message/response pairs are embedded with hashed TF-IDF vectors (NumPy, no network)
+and kept in a compact CSR-style index per user, so the most relevant snippets from
+earlier sessions can be added to the prompt within a fixed token budget
+"""
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+from config import Config
+from extensions import mongo
+from text_utils import tokenize, estimate_tokens
+from chat_archive import archived_sessions, recent_archived_chats
+
+# Words too common to say anything about what a conversation was about
+_STOPWORDS = {
+    "the", "and", "you", "your", "that", "this", "for", "are", "was", "with", "have", "but", "not",
+    "what", "can", "just", "its", "about", "how", "feel", "like", "really", "very",
+    "les", "des", "est", "que", "qui", "pour", "pas", "une", "dans", "avec", "mais", "suis",
+    "في", "من", "على", "ان", "انا", "هذا", "ما", "لا",
+}
+
+# Characters kept from each side of an exchange when it is stored as a snippet
+SNIPPET_CHARS = 240
+
+def _hash_terms(text, dimensions):
+    """Hash the content words of a text into (unique bucket ids, counts)"""
+    mask = dimensions - 1
+    buckets = {}
+    for token in tokenize(text):
+        if len(token) > 2 and token not in _STOPWORDS:
+            bucket = zlib.crc32(token.encode('utf-8')) & mask
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+    return (np.fromiter(buckets.keys(), dtype=np.int32, count=len(buckets)),
+            np.fromiter(buckets.values(), dtype=np.float32, count=len(buckets)))
+
+def make_snippet(message, response):
+    """Compact text stored for an exchange and later injected into the prompt"""
+    def clip(text):
+        text = " ".join((text or "").split())
+        return text if len(text) <= SNIPPET_CHARS else text[:SNIPPET_CHARS].rsplit(' ', 1)[0] + "..."
+    return f"User: {clip(message)}\nAssistant: {clip(response)}"
+
+class MemoryIndex:
+    """
+    Array-backed hashed TF-IDF index for one user
+    Rows are stored CSR-style (indptr/indices/counts) and IDF is kept only for the
+    buckets that occur (vocab), so memory grows with the number of distinct words per
+    exchange rather than with the hash dimension
+    Each index has its own lock: adds and compaction hold it, scoring works on the
+    compacted arrays outside it, so searches for different users never wait on each other
+    """
+    def __init__(self, dimensions=None):
+        self.dimensions = dimensions or Config.CHAT_MEMORY_DIMENSIONS
+        self.snippets = []
+        self.session_ids = []
+        self._lock = threading.Lock()
+        self._pending_ids = []
+        self._pending_counts = []
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.empty(0, dtype=np.int32)
+        self._counts = np.empty(0, dtype=np.float32)
+        self._compacted = None
+
+    def __len__(self):
+        return len(self.snippets)
+
+    def add(self, session_id, message, response):
+        """Append one exchange; arrays are compacted lazily on the next search"""
+        ids, counts = _hash_terms(f"{message} {response}", self.dimensions)
+        with self._lock:
+            self.snippets.append(make_snippet(message, response))
+            self.session_ids.append(session_id)
+            self._pending_ids.append(ids)
+            self._pending_counts.append(counts)
+            self._compacted = None
+
+    def _compact(self):
+        """
+        (rows, indptr, vocab position of each term, term weights, row norms, vocab, vocab idf)
+        for the current rows
+        Called with the lock held; the arrays are new on every call, never updated in place
+        """
+        if self._pending_ids:
+            lengths = np.fromiter((len(ids) for ids in self._pending_ids), dtype=np.int64)
+            self._indptr = np.concatenate([self._indptr, self._indptr[-1] + np.cumsum(lengths)])
+            self._indices = np.concatenate([self._indices] + self._pending_ids)
+            self._counts = np.concatenate([self._counts] + self._pending_counts)
+            self._pending_ids = []
+            self._pending_counts = []
+
+        if self._compacted is None:
+            rows = len(self.snippets)
+            # Each row holds unique buckets, so counting a bucket's occurrences gives its document frequency
+            vocab, positions, document_frequency = np.unique(self._indices, return_inverse=True,
+                                                             return_counts=True)
+            vocab_idf = (np.log((1.0 + rows) / (1.0 + document_frequency)) + 1.0).astype(np.float32)
+            weights = np.log1p(self._counts) * vocab_idf[positions]
+            row_norms = np.sqrt(_row_sums(self._indptr, weights * weights))
+            self._compacted = (rows, self._indptr, positions, weights, row_norms, vocab, vocab_idf)
+        return self._compacted
+
+    def search(self, text, top_k=3, exclude_session=None, min_score=0.0, with_sessions=False):
+        """
+        Return up to top_k (score, snippet) pairs ranked by cosine similarity,
+        or (score, session_id, snippet) triples with with_sessions
+        """
+        query_ids, query_counts = _hash_terms(text, self.dimensions)
+        with self._lock:
+            if not self.snippets:
+                return []
+            rows, indptr, positions, weights, row_norms, vocab, vocab_idf = self._compact()
+            # Rows are only appended, so the first `rows` entries match the arrays
+            snippets = self.snippets[:rows]
+            session_ids = self.session_ids[:rows]
+        if not query_ids.size:
+            return []
+
+        # Query weights over its own buckets; buckets no row has get the IDF of a
+        # document frequency of zero
+        found = np.searchsorted(vocab, query_ids)
+        known = found < len(vocab)
+        known[known] = vocab[found[known]] == query_ids[known]
+        query_idf = np.full(len(query_ids), np.log(1.0 + rows) + 1.0, dtype=np.float32)
+        query_idf[known] = vocab_idf[found[known]]
+        query_weights = np.log1p(query_counts) * query_idf
+        query_norm = np.linalg.norm(query_weights)
+
+        # Dot product of every stored row with the query in one vectorized pass, through
+        # a query vector over the vocab (not the hash dimension)
+        query = np.zeros(len(vocab), dtype=np.float32)
+        query[found[known]] = query_weights[known]
+        dots = _row_sums(indptr, query[positions] * weights)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.where(row_norms > 0, dots / (row_norms * query_norm), 0.0)
+
+        if exclude_session is not None:
+            scores[np.asarray(session_ids, dtype=object) == exclude_session] = 0.0
+
+        candidates = np.flatnonzero(scores > min_score)
+        if not candidates.size:
+            return []
+        best = candidates[np.argsort(-scores[candidates], kind='stable')[:top_k]]
+        if with_sessions:
+            return [(float(scores[i]), session_ids[i], snippets[i]) for i in best]
+        return [(float(scores[i]), snippets[i]) for i in best]
+
+def _row_sums(indptr, values):
+    """Sum values per CSR row, handling rows with no terms"""
+    sums = np.zeros(len(indptr) - 1, dtype=np.float32)
+    non_empty = np.diff(indptr) > 0
+    if values.size:
+        sums[non_empty] = np.add.reduceat(values, indptr[:-1][non_empty])
+    return sums
+
+# Per-user indexes, bounded LRU shared by all requests in this worker
+# Values are (index, loaded_at); entries older than CHAT_MEMORY_CACHE_TTL_SECONDS are
+# rebuilt so exchanges stored by other workers show up
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+def _load_index(user_id):
+    """Build a user's index from their most recent stored exchanges, archived sessions included"""
+    index = MemoryIndex()
+    limit = Config.CHAT_MEMORY_MAX_PAIRS
+    live = list(mongo.db.chats.find(
+        {"user_id": str(user_id), "session_id": {"$exists": True}},
+        {"message": 1, "response": 1, "session_id": 1, "timestamp": 1}
+    ).sort("timestamp", -1).limit(limit))
+    # Archived sessions left the chats collection but are still the user's conversations
+    archived = recent_archived_chats(str(user_id), limit)
+    chats = {chat["_id"]: chat for chat in archived if chat.get("session_id")}
+    chats.update((chat["_id"], chat) for chat in live)
+    recent = sorted(chats.values(), key=lambda chat: chat.get("timestamp") or datetime.min)[-limit:]
+    for chat in recent:
+        index.add(chat.get("session_id"), chat.get("message", ""), chat.get("response", ""))
+    return index
+
+def get_memory_index(user_id):
+    """Return the cached index for a user, loading it on first use"""
+    key = str(user_id)
+    with _lock:
+        cached = _indexes.get(key)
+        if cached is not None and time.monotonic() - cached[1] < Config.CHAT_MEMORY_CACHE_TTL_SECONDS:
+            _indexes.move_to_end(key)
+            return cached[0]
+
+    index = _load_index(key)
+    with _lock:
+        _indexes[key] = (index, time.monotonic())
+        _indexes.move_to_end(key)
+        while len(_indexes) > Config.CHAT_MEMORY_CACHE_USERS:
+            _indexes.popitem(last=False)
+    return index
+
+def retrieve_memories(user_id, text, exclude_session=None):
+    """
+    Return snippets from earlier sessions relevant to the message,
+    limited to CHAT_MEMORY_TOP_K items and CHAT_MEMORY_TOKEN_BUDGET tokens
+    """
+    index = get_memory_index(user_id)
+    # Over-fetch so that dropping deleted sessions below still leaves enough results
+    results = index.search(
+        text,
+        top_k=Config.CHAT_MEMORY_TOP_K * 2,
+        exclude_session=exclude_session,
+        min_score=Config.CHAT_MEMORY_MIN_SCORE,
+        with_sessions=True
+    )
+    if not results:
+        return []
+
+    # The index may predate a deletion handled by another worker: never inject
+    # snippets from sessions whose messages no longer exist
+    candidates = list({session for _, session, _ in results})
+    live_sessions = set(mongo.db.chats.distinct(
+        "session_id",
+        {"user_id": str(user_id), "session_id": {"$in": candidates}}
+    ))
+    if len(live_sessions) < len(candidates):
+        # Archived sessions still exist, their messages just left the hot collection
+        live_sessions |= archived_sessions(str(user_id), set(candidates) - live_sessions)
+    results = [(score, snippet) for score, session, snippet in results if session in live_sessions]
+    results = results[:Config.CHAT_MEMORY_TOP_K]
+
+    snippets = []
+    budget = Config.CHAT_MEMORY_TOKEN_BUDGET
+    for score, snippet in results:
+        cost = estimate_tokens(snippet)
+        if cost > budget:
+            break
+        snippets.append(snippet)
+        budget -= cost
+    return snippets
+
+def remember_exchange(user_id, session_id, message, response):
+    """Add a new exchange to the user's index if it is currently loaded"""
+    with _lock:
+        cached = _indexes.get(str(user_id))
+    if cached is not None:
+        cached[0].add(session_id, message, response)
+
+def forget_user(user_id):
+    """
+    Drop a user's cached index (after deleting sessions or the account)
+    Only affects this worker; other workers filter deleted sessions in retrieve_memories
+    """
+    with _lock:
+        _indexes.pop(str(user_id), None)
+
+def build_memory_prompt(snippets):
+    """Format retrieved snippets as a system message for the chat model"""
+    joined = "\n\n".join(snippets)
+    return {
+        "role": "system",
+        "content": "Notes from the user's earlier conversations that may be relevant. "
+                   "Use them only if they help, and do not repeat them back verbatim:\n\n" + joined
+    }
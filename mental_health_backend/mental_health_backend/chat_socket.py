@@ -0,0 +1,158 @@
+"""
+WebSocket channel for chat and live session updates
+Clients authenticate once when connecting, then send chat messages over the socket,
+receive streamed replies and get pushed session-list and new-message events instead
+of polling /chat/sessions and /chat/history
+
+Protocol (JSON text frames):
+    client -> {"type": "auth", "token": "..."}   only if no token was given at connect
+    client -> {"type": "chat", "message": "...", "session_id": "...", "subject": "...", "request_id": "..."}
+    client -> {"type": "sessions"} | {"type": "history", "session_id": "..."} | {"type": "ping"}
+    server -> ready, chat.delta, chat.done, sessions, history, pong, error
+    server -> session.created, session.updated, session.deleted, message.new (pushed)
+"""
+import json
+import threading
+from datetime import datetime
+from flask import request
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
+from config import Config
+from extensions import mongo
+from auth import get_user_from_token, ensure_mongo_connection, run_chat_turn
+from chat_events import subscribe, unsubscribe, connection_count, start_relay
+from chat_archive import session_chats
+from session_context import store_context
+
+sock = Sock()
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _authenticate(ws):
+    """Resolve the user from the handshake (header or ?token=) or from a first auth frame"""
+    token = request.args.get('token')
+    auth_header = request.headers.get('Authorization')
+    if not token and auth_header and auth_header.startswith('Bearer '):
+        token = auth_header.split(' ')[1]
+
+    if not token:
+        frame = ws.receive(timeout=Config.WEBSOCKET_AUTH_TIMEOUT_SECONDS)
+        try:
+            message = json.loads(frame) if frame else {}
+        except ValueError:
+            message = {}
+        if message.get("type") == "auth":
+            token = message.get("token")
+
+    return get_user_from_token(token) if token else None
+
+def _writer(ws, subscription, closed):
+    """Single writer per connection, so replies and pushed events never interleave mid-frame"""
+    while not closed.is_set():
+        event = subscription.get(timeout=1.0)
+        if event is None:
+            continue
+        try:
+            ws.send(json.dumps(event, default=str))
+        except ConnectionClosed:
+            closed.set()
+
+def _list_sessions(user_id_str):
+    sessions = mongo.db.chat_sessions.find(
+        {"user_id": user_id_str},
+        {"session_id": 1, "title": 1, "created_at": 1, "updated_at": 1, "message_count": 1}
+    ).sort("updated_at", -1)
+    return [{
+        "session_id": session.get("session_id"),
+        "title": session.get("title", "Untitled Conversation"),
+        "created_at": _iso(session.get("created_at")),
+        "updated_at": _iso(session.get("updated_at")),
+        "message_count": session.get("message_count", 0)
+    } for session in sessions]
+
+def _session_history(user_id_str, session_id):
+    history = []
+    chats = session_chats(user_id_str, session_id)
+    # The next chat turn in this session reuses what was just read
+    store_context(user_id_str, session_id, chats)
+    for chat in chats:
+        chat["_id"] = str(chat["_id"])
+        chat["timestamp"] = _iso(chat.get("timestamp"))
+        history.append(chat)
+    return history
+
+@sock.route('/api/chat/ws')
+def chat_socket(ws):
+    """Authenticated, bidirectional chat connection for one client"""
+    if connection_count() >= Config.WEBSOCKET_MAX_CONNECTIONS:
+        ws.send(json.dumps({"type": "error", "error": "Too many open connections, try again later"}))
+        ws.close(reason=1013, message="Try again later")
+        return
+
+    user = _authenticate(ws)
+    if not user:
+        ws.send(json.dumps({"type": "error", "error": "Invalid or expired token"}))
+        ws.close(reason=1008, message="Unauthorized")
+        return
+    if not ensure_mongo_connection():
+        ws.send(json.dumps({"type": "error", "error": "Database connection unavailable"}))
+        ws.close(reason=1011, message="Database connection unavailable")
+        return
+
+    user_id_str = str(user.get('id'))
+    start_relay()
+    subscription = subscribe(user_id_str)
+    closed = threading.Event()
+    writer = threading.Thread(target=_writer, args=(ws, subscription, closed), daemon=True)
+    writer.start()
+    print(f"DEBUG: WebSocket connected for user {user_id_str} ({connection_count()} open in this worker)")
+
+    def reply(event):
+        subscription.put(event, block=True)
+
+    try:
+        reply({"type": "ready", "user_id": user_id_str})
+        while not closed.is_set():
+            frame = ws.receive(timeout=1.0)
+            if frame is None:
+                continue
+            try:
+                message = json.loads(frame)
+            except ValueError:
+                reply({"type": "error", "error": "Frames must be JSON objects"})
+                continue
+            if not isinstance(message, dict):
+                reply({"type": "error", "error": "Frames must be JSON objects"})
+                continue
+
+            message_type = message.get("type")
+            request_id = message.get("request_id")
+            try:
+                if message_type == "chat":
+                    def on_delta(delta, session_id):
+                        reply({"type": "chat.delta", "request_id": request_id,
+                               "session_id": session_id, "delta": delta})
+                    result, status = run_chat_turn(user, message, on_delta=on_delta, origin=subscription)
+                    if status == 200:
+                        reply({"type": "chat.done", "request_id": request_id, "chat": result})
+                    else:
+                        reply({"type": "error", "request_id": request_id, "status": status, **result})
+                elif message_type == "sessions":
+                    reply({"type": "sessions", "request_id": request_id, "sessions": _list_sessions(user_id_str)})
+                elif message_type == "history":
+                    reply({"type": "history", "request_id": request_id, "session_id": message.get("session_id"),
+                           "messages": _session_history(user_id_str, message.get("session_id"))})
+                elif message_type == "ping":
+                    reply({"type": "pong", "request_id": request_id})
+                else:
+                    reply({"type": "error", "request_id": request_id, "error": f"Unknown message type: {message_type}"})
+            except Exception as e:
+                print(f"DEBUG: WebSocket error handling {message_type}: {str(e)}")
+                reply({"type": "error", "request_id": request_id, "error": "Failed to process message", "details": str(e)})
+    except ConnectionClosed:
+        pass
+    finally:
+        closed.set()
+        unsubscribe(subscription)
+        print(f"DEBUG: WebSocket closed for user {user_id_str}")
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Check that the admin endpoints only accept tokens with a valid signature
+A token for an ADMIN_USER_IDS user signed with the wrong key, or not signed at all
+("alg": "none"), must be rejected; the same token signed with JWT_SECRET_KEY accepted.
+Supabase is not contacted: only the locally issued JWTs are checked
+Exits with status 1 if any case fails
+Run with: python check_admin_auth.py
+"""
+import sys
+import time
+import jwt
+from config import Config
+
+ADMIN_ID = "check-admin-auth"
+
+def token(key, algorithm="HS256", **claims):
+    now = int(time.time())
+    payload = {"sub": ADMIN_ID, "type": "access", "iat": now, "exp": now + 300, **claims}
+    return jwt.encode(payload, key, algorithm=algorithm)
+
+def main():
+    Config.ADMIN_USER_IDS = ADMIN_ID
+    import auth
+    # Stand in for the Supabase API, which rejects these tokens anyway
+    auth.verify_supabase_token = lambda token: None
+
+    # (description, token, admin accepted)
+    cases = [
+        ("signed with JWT_SECRET_KEY", token(Config.JWT_SECRET_KEY), True),
+        ("signed with another key", token("not-the-secret-key-but-long-enough-for-hs256"), False),
+        ("unsigned (alg none)", token(None, algorithm="none"), False),
+        ("expired", token(Config.JWT_SECRET_KEY, exp=int(time.time()) - 60), False),
+        ("refresh token", token(Config.JWT_SECRET_KEY, type="refresh"), False),
+    ]
+    failures = 0
+    for description, case_token, expected in cases:
+        accepted = auth.admin_user_from_token(case_token) is not None
+        status = "ok" if accepted == expected else "FAIL"
+        if status == "FAIL":
+            failures += 1
+        print(f"{status:>4} | expected {'accepted' if expected else 'rejected':>8} | "
+              f"got {'accepted' if accepted else 'rejected':>8} | {description}")
+    print(f"{len(cases) - failures}/{len(cases)} cases passed")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Regression check for the local crisis-language detector
+Pins the expected severity of known phrasings, including negated and
+non-negated cases; exits with status 1 if any case changes
+Run with: python check_crisis_detector.py
+"""
+import sys
+from crisis_detector import detect_crisis, SEVERITY_HIGH, SEVERITY_ELEVATED
+
+# (message, expected severity)
+CASES = [
+    ("I want to die", SEVERITY_HIGH),
+    ("I am not okay and want to die", SEVERITY_HIGH),
+    ("there is no hope i want to die", SEVERITY_HIGH),
+    ("I do not want to live anymore", SEVERITY_HIGH),
+    ("I do not want to be alive", SEVERITY_HIGH),
+    ("I don't want to live anymore", SEVERITY_HIGH),
+    ("I no longer want to live", SEVERITY_HIGH),
+    ("I am suicidal", SEVERITY_HIGH),
+    ("I'm suicidal", SEVERITY_HIGH),
+    ("I'm not sure why but I want to kill myself", SEVERITY_HIGH),
+    ("je n'ai plus envie de vivre", SEVERITY_HIGH),
+    ("Sometimes I feel hopeless about the future", SEVERITY_ELEVATED),
+    ("The hopelessness never goes away", SEVERITY_ELEVATED),
+    ("I'm not okay, I'm going to kill myself", SEVERITY_HIGH),
+    ("I don't want to die, I just want the pain to stop", None),
+    ("I don't really want to die", None),
+    ("I would never kill myself", None),
+    ("I don't want to kill myself", None),
+    ("I'm not going to kill myself", None),
+    ("je n'ai pas envie de mourir", None),
+    ("no quiero morir", None),
+    ("I had a stressful day at work", None),
+]
+
+def main():
+    failures = 0
+    for message, expected in CASES:
+        result = detect_crisis(message)
+        status = "ok" if result["severity"] == expected else "FAIL"
+        if status == "FAIL":
+            failures += 1
+        print(f"{status:>4} | expected {str(expected):>8} | got {str(result['severity']):>8} | {message}")
+    print(f"{len(CASES) - failures}/{len(CASES)} cases passed")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Check that the mood queries are served by indexes
+Runs explain() on the entries range query, the insights rollup read and the export
+against the configured MongoDB, and fails if a winning plan scans the collection or
+sorts in memory instead of reading an index in order; exits with status 1 if any does
+Needs a real MongoDB server (explain is not emulated by test doubles)
+Run with: python check_mood_indexes.py
+"""
+import sys
+from datetime import datetime, timedelta
+from mood_store import DATE_FORMAT, ensure_mood_indexes
+from mood_rollups import ROLLUP_FIELDS, ensure_rollup_indexes
+
+# Any user id works: the plan does not depend on the user having data
+USER_ID = "check-mood-indexes"
+
+def plan_stages(plan):
+    """Every stage name in an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+def queries(db):
+    """(name, cursor, whether the index must also provide the order) for each query to check"""
+    start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=365)
+    return [
+        ("entries (mood.get_mood_entries)",
+         db.mood_entries.find({"user_id": USER_ID, "date_at": {"$gte": start}}).sort("date_at", -1), True),
+        ("insights rollups (mood_rollups.user_rollups)",
+         db.mood_daily.find({"user_id": USER_ID, "date": {"$gte": start.strftime(DATE_FORMAT)}},
+                            ROLLUP_FIELDS).sort("date", 1), True),
+        ("insights rollup marker (mood_rollups.user_rollups)",
+         db.mood_rollup_state.find({"user_id": USER_ID}, {"_id": 1}).limit(1), False),
+        ("export (mood.export_mood_data)",
+         db.mood_entries.find({"user_id": USER_ID}).sort("date_at", 1), True),
+        ("rollup rebuild (mood_rollups.build_user_rollups)",
+         db.mood_entries.find({"user_id": USER_ID}), False),
+    ]
+
+def main():
+    from app import app
+    from extensions import mongo
+
+    failures = 0
+    with app.app_context():
+        ensure_mood_indexes()
+        ensure_rollup_indexes()
+        checks = queries(mongo.db)
+        for name, cursor, ordered in checks:
+            stages = plan_stages(cursor.explain()["queryPlanner"]["winningPlan"])
+            ok = "IXSCAN" in stages and "COLLSCAN" not in stages and not (ordered and "SORT" in stages)
+            if not ok:
+                failures += 1
+            print(f"{'ok' if ok else 'FAIL':>4} | {' > '.join(reversed(stages)):<40} | {name}")
+    print(f"{len(checks) - failures}/{len(checks)} queries use an index")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Regression check for the local-day computations of mood data
+Pins the mood day (user_timezones.local_today) of UTC instants around midnight and
+across DST transitions, including Morocco's clock change for Ramadan, and the local
+timestamps of the export; exits with status 1 if any case changes
+Run with: python check_mood_timezones.py
+"""
+import sys
+from datetime import datetime
+from mood_store import DATE_FORMAT
+from user_timezones import local_timestamp, local_today, resolve_timezone
+
+# (timezone, UTC instant, expected local mood day)
+DAY_CASES = [
+    # Europe/Paris springs forward on 2025-03-30 at 01:00 UTC, falls back on 2025-10-26 at 01:00 UTC
+    ("Europe/Paris", "2025-03-29T22:59", "2025-03-29"),
+    ("Europe/Paris", "2025-03-29T23:00", "2025-03-30"),
+    ("Europe/Paris", "2025-03-30T21:59", "2025-03-30"),
+    ("Europe/Paris", "2025-03-30T22:00", "2025-03-31"),
+    ("Europe/Paris", "2025-10-25T21:59", "2025-10-25"),
+    ("Europe/Paris", "2025-10-25T22:00", "2025-10-26"),
+    ("Europe/Paris", "2025-10-26T22:59", "2025-10-26"),
+    ("Europe/Paris", "2025-10-26T23:00", "2025-10-27"),
+    # Africa/Casablanca is UTC+1, and UTC+0 during Ramadan (2025-02-23 to 2025-04-06)
+    ("Africa/Casablanca", "2025-01-10T22:59", "2025-01-10"),
+    ("Africa/Casablanca", "2025-01-10T23:00", "2025-01-11"),
+    ("Africa/Casablanca", "2025-03-10T23:00", "2025-03-10"),
+    ("Africa/Casablanca", "2025-03-11T00:00", "2025-03-11"),
+    ("Africa/Casablanca", "2025-04-10T23:30", "2025-04-11"),
+    # America/New_York springs forward on 2025-03-09 at 07:00 UTC, falls back on 2025-11-02 at 06:00 UTC
+    ("America/New_York", "2025-03-09T04:59", "2025-03-08"),
+    ("America/New_York", "2025-03-09T05:00", "2025-03-09"),
+    ("America/New_York", "2025-03-10T03:59", "2025-03-09"),
+    ("America/New_York", "2025-03-10T04:00", "2025-03-10"),
+    ("America/New_York", "2025-11-02T05:30", "2025-11-02"),
+    ("America/New_York", "2025-11-03T04:59", "2025-11-02"),
+    ("America/New_York", "2025-11-03T05:00", "2025-11-03"),
+    # Missing or unknown timezones are UTC (DEFAULT_TIMEZONE)
+    (None, "2025-06-01T23:59", "2025-06-01"),
+    ("Not/AZone", "2025-06-02T00:00", "2025-06-02"),
+]
+
+# (timezone, UTC timestamp, expected exported timestamp)
+TIMESTAMP_CASES = [
+    ("Europe/Paris", "2025-03-30T00:30", "2025-03-30T01:30:00+01:00"),
+    ("Europe/Paris", "2025-03-30T01:30", "2025-03-30T03:30:00+02:00"),
+    ("Africa/Casablanca", "2025-03-10T23:00", "2025-03-10T23:00:00+00:00"),
+    ("America/New_York", "2025-11-02T05:30", "2025-11-02T01:30:00-04:00"),
+    ("America/New_York", "2025-11-02T06:30", "2025-11-02T01:30:00-05:00"),
+]
+
+def main():
+    failures = 0
+    for name, instant, expected in DAY_CASES:
+        got = local_today(resolve_timezone(name), datetime.fromisoformat(instant)).strftime(DATE_FORMAT)
+        status = "ok" if got == expected else "FAIL"
+        if status == "FAIL":
+            failures += 1
+        print(f"{status:>4} | {str(name):<18} | {instant} UTC -> day {got} (expected {expected})")
+    for name, instant, expected in TIMESTAMP_CASES:
+        got = local_timestamp(datetime.fromisoformat(instant), resolve_timezone(name))
+        status = "ok" if got == expected else "FAIL"
+        if status == "FAIL":
+            failures += 1
+        print(f"{status:>4} | {str(name):<18} | {instant} UTC -> {got} (expected {expected})")
+    total = len(DAY_CASES) + len(TIMESTAMP_CASES)
+    print(f"{total - failures}/{total} cases pass")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
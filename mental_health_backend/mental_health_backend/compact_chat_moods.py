@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Migration: compact per-message chat mood entries into per-session daily aggregates
+Every mood_entries document with source "chat_message" is folded into the
+(user, session, date) aggregate with $inc and then deleted, in batches
+
+Each batch is applied exactly once, even if the script dies half way:
+  1. the batch's rows are marked with a compaction_batch id
+  2. each aggregate is incremented only if it does not list that id yet,
+     and the id is recorded on it in the same update
+  3. the marked rows are deleted, then the id is removed from the aggregates
+On start, batches left marked by an interrupted run are finished first
+The daily rollups (mood_daily) need no change: rows only move within their day
+Run with: python compact_chat_moods.py [--batch-size 1000] [--dry-run]
+"""
+import argparse
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from mood_store import (
+    SOURCE_CHAT_MESSAGE, chat_aggregate_filter, chat_aggregate_update,
+    square_sum, summarize_entry, ensure_mood_indexes
+)
+
+_ROW_FIELDS = {"user_id": 1, "session_id": 1, "chat_id": 1, "date": 1, "mood": 1,
+               "mood_score": 1, "factors": 1, "factor_ids": 1, "message_id": 1}
+
+def merge_summary(total, summary):
+    """Add one entry summary to a running group summary"""
+    count, score_sum, mood_counts, factor_counts, factor_score_sums = summary
+    total[0] += count
+    total[1] += score_sum
+    for target, values in ((total[2], mood_counts), (total[3], factor_counts), (total[4], factor_score_sums)):
+        for key, value in values.items():
+            target[key] = target.get(key, 0) + value
+
+def add_row(groups, entry):
+    """Fold one per-message row into its (user, session, date) group"""
+    # The legacy chat route stored the conversation id as chat_id
+    session_id = entry.get("session_id") or entry.get("chat_id")
+    key = (entry["user_id"], session_id, entry.get("date"))
+    # Summary fields as in summarize_entry, plus the sum of squared scores
+    summary, entry_ids, _ = groups.setdefault(key, ([0, 0.0, {}, {}, {}, 0.0], [], None))
+    merge_summary(summary, summarize_entry(entry))
+    summary[5] += square_sum(entry)
+    entry_ids.append(entry["_id"])
+    groups[key] = (summary, entry_ids, entry.get("message_id"))
+
+def apply_batch(collection, batch_id, groups):
+    """Steps 2 and 3 for a batch whose rows are already marked"""
+    operations = []
+    for (user_id, session_id, date), (summary, _, last_message_id) in groups.items():
+        update = chat_aggregate_update(tuple(summary[:5]), message_id=last_message_id, score_sq_sum=summary[5],
+                                       date=date)
+        update.setdefault("$addToSet", {})["compaction_batches"] = batch_id
+        operations.append(UpdateOne(
+            {**chat_aggregate_filter(user_id, session_id, date), "compaction_batches": {"$ne": batch_id}},
+            update,
+            upsert=True
+        ))
+    try:
+        collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # A duplicate key means the aggregate already holds this batch (the $ne filter
+        # did not match, so the upsert tried to insert a second aggregate): nothing to do
+        errors = [error for error in e.details.get("writeErrors", []) if error.get("code") != 11000]
+        if errors:
+            raise
+    collection.delete_many({"compaction_batch": batch_id, "source": SOURCE_CHAT_MESSAGE})
+    collection.update_many({"compaction_batches": batch_id}, {"$pull": {"compaction_batches": batch_id}})
+
+def resume_interrupted(collection):
+    """Finish batches whose rows were marked by a run that did not complete"""
+    rows = 0
+    for batch_id in collection.distinct("compaction_batch", {"source": SOURCE_CHAT_MESSAGE}):
+        groups = {}
+        for entry in collection.find({"compaction_batch": batch_id, "source": SOURCE_CHAT_MESSAGE}, _ROW_FIELDS):
+            add_row(groups, entry)
+            rows += 1
+        apply_batch(collection, batch_id, groups)
+        print(f"Resumed interrupted batch {batch_id}")
+    return rows
+
+def flush(collection, groups, dry_run):
+    """Mark the rows of a batch, fold them into the aggregates and delete them"""
+    if not groups or dry_run:
+        return
+    batch_id = str(ObjectId())
+    collection.update_many(
+        {"_id": {"$in": [i for _, ids, _ in groups.values() for i in ids]}},
+        {"$set": {"compaction_batch": batch_id}}
+    )
+    apply_batch(collection, batch_id, groups)
+
+def compact(collection, batch_size, dry_run):
+    rows = 0 if dry_run else resume_interrupted(collection)
+    groups = {}
+    cursor = collection.find(
+        {"source": SOURCE_CHAT_MESSAGE, "compaction_batch": {"$exists": False}},
+        _ROW_FIELDS
+    ).sort([("user_id", 1), ("date", 1)])
+
+    for entry in cursor:
+        add_row(groups, entry)
+        rows += 1
+        if len(groups) >= batch_size:
+            flush(collection, groups, dry_run)
+            groups = {}
+
+    flush(collection, groups, dry_run)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description='Compact chat mood entries into per-session daily aggregates')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Aggregates written per bulk operation (default: 1000)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Count the rows that would be compacted without writing anything')
+    args = parser.parse_args()
+
+    from app import app
+    from extensions import mongo
+
+    with app.app_context():
+        collection = mongo.db.mood_entries
+        before = collection.count_documents({})
+        if not args.dry_run:
+            ensure_mood_indexes()
+        rows = compact(collection, args.batch_size, args.dry_run)
+        after = collection.count_documents({})
+        print(f"Compacted {rows} chat mood rows"
+              f"{' (dry run)' if args.dry_run else ''}: {before} -> {after} mood_entries documents")
+
+if __name__ == "__main__":
+    main()
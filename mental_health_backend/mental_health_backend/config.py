@@ -40,6 +40,171 @@ class Config:
     
     # OpenAI Config
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
+    OPENAI_API_BASE = os.environ.get('OPENAI_API_BASE', 'https://api.openai.com/v1')
+    
+    # LLM Gateway Config
+    # Provider used for every model call: 'openai' or 'fake' (deterministic, no network)
+    LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'openai')
+    LLM_POOL_SIZE = int(os.environ.get('LLM_POOL_SIZE', '20'))
+    LLM_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('LLM_CONNECT_TIMEOUT_SECONDS', '3.05'))
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '2'))
+    LLM_RETRY_BACKOFF_SECONDS = float(os.environ.get('LLM_RETRY_BACKOFF_SECONDS', '0.5'))
+    LLM_RETRY_BACKOFF_MAX_SECONDS = float(os.environ.get('LLM_RETRY_BACKOFF_MAX_SECONDS', '4'))
+    # Threads available for hedged calls; when all are busy calls run unhedged on the request thread
+    LLM_HEDGE_WORKERS = int(os.environ.get('LLM_HEDGE_WORKERS', '32'))
+    # Optional JSON overrides per feature, e.g. {"chat": {"model": "gpt-4o-mini", "hedge_after_ms": 4000}}
+    LLM_ROUTES = os.environ.get('LLM_ROUTES', '')
+    # Fake provider settings: latency is "constant:MS", "uniform:MIN:MAX" or "lognormal:MEDIAN:SIGMA"
+    LLM_FAKE_LATENCY = os.environ.get('LLM_FAKE_LATENCY', 'lognormal:800:0.5')
+    LLM_FAKE_FAILURE_RATE = float(os.environ.get('LLM_FAKE_FAILURE_RATE', '0'))
+    LLM_FAKE_SEED = int(os.environ.get('LLM_FAKE_SEED', '1234'))
+    
+    # LLM Ledger Config
+    # Every model call is recorded (tokens, cost, latency, user/session) in the llm_ledger collection
+    LLM_LEDGER_ENABLED = os.environ.get('LLM_LEDGER_ENABLED', 'True').lower() == 'true'
+    LLM_LEDGER_BATCH_SIZE = int(os.environ.get('LLM_LEDGER_BATCH_SIZE', '200'))
+    LLM_LEDGER_FLUSH_SECONDS = float(os.environ.get('LLM_LEDGER_FLUSH_SECONDS', '5'))
+    # Optional JSON prices in USD per 1K tokens, e.g. {"gpt-4o-mini": [0.00015, 0.0006]}
+    LLM_PRICES = os.environ.get('LLM_PRICES', '')
+    
+    # Admin Config
+    # Comma-separated user ids allowed to call the /api/admin endpoints
+    ADMIN_USER_IDS = os.environ.get('ADMIN_USER_IDS', '')
+    
+    # WebSocket Config
+    # Each open socket holds one server thread; keep this below the gunicorn thread count
+    # so plain HTTP requests still get served
+    WEBSOCKET_MAX_CONNECTIONS = int(os.environ.get('WEBSOCKET_MAX_CONNECTIONS', '200'))
+    WEBSOCKET_AUTH_TIMEOUT_SECONDS = float(os.environ.get('WEBSOCKET_AUTH_TIMEOUT_SECONDS', '10'))
+    WEBSOCKET_PING_INTERVAL_SECONDS = int(os.environ.get('WEBSOCKET_PING_INTERVAL_SECONDS', '25'))
+    # Relay chat events between gunicorn workers through a capped MongoDB collection
+    CHAT_EVENTS_CROSS_WORKER = os.environ.get('CHAT_EVENTS_CROSS_WORKER', 'True').lower() == 'true'
+    CHAT_EVENTS_CAPPED_BYTES = int(os.environ.get('CHAT_EVENTS_CAPPED_BYTES', str(16 * 1024 * 1024)))
+    
+    # Crisis Detection Config
+    # Every chat message is screened locally for crisis language before any model call
+    CRISIS_DETECTION_ENABLED = os.environ.get('CRISIS_DETECTION_ENABLED', 'True').lower() == 'true'
+    # Answer explicit suicidal intent immediately with crisis resources instead of waiting for the model
+    CRISIS_SHORT_CIRCUIT = os.environ.get('CRISIS_SHORT_CIRCUIT', 'True').lower() == 'true'
+    
+    # Model Routing Config
+    # Each chat turn goes to a fast, standard or deep tier depending on message length,
+    # language, crisis flags and session depth
+    MODEL_ROUTER_ENABLED = os.environ.get('MODEL_ROUTER_ENABLED', 'True').lower() == 'true'
+    # Optional JSON overrides per tier, e.g. {"deep": {"model": "gpt-4o", "max_tokens": 1200}}
+    MODEL_ROUTER_TIERS = os.environ.get('MODEL_ROUTER_TIERS', '')
+    MODEL_ROUTER_SHORT_CHARS = int(os.environ.get('MODEL_ROUTER_SHORT_CHARS', '60'))
+    MODEL_ROUTER_LONG_TOKENS = int(os.environ.get('MODEL_ROUTER_LONG_TOKENS', '150'))
+    MODEL_ROUTER_DEEP_SESSION_DEPTH = int(os.environ.get('MODEL_ROUTER_DEEP_SESSION_DEPTH', '20'))
+    # Tiers whose recent average time to first token or generation time per output token is
+    # above these are skipped for the next cheaper one (0 disables a budget)
+    MODEL_ROUTER_FIRST_TOKEN_BUDGET_MS = int(os.environ.get('MODEL_ROUTER_FIRST_TOKEN_BUDGET_MS', '4000'))
+    MODEL_ROUTER_MS_PER_TOKEN_BUDGET = float(os.environ.get('MODEL_ROUTER_MS_PER_TOKEN_BUDGET', '100'))
+    # Latency samples older than this are forgotten, so a slow tier is tried again
+    MODEL_ROUTER_LATENCY_WINDOW_SECONDS = int(os.environ.get('MODEL_ROUTER_LATENCY_WINDOW_SECONDS', '300'))
+    # Share of the turns meant for a slow tier still sent to it, to notice when it recovers
+    MODEL_ROUTER_PROBE_RATE = float(os.environ.get('MODEL_ROUTER_PROBE_RATE', '0.05'))
+    
+    # Intent Router Config
+    # Short explicit requests (breathing exercise, grounding, hotlines, booking) are answered
+    # locally from a curated content library instead of a model completion
+    INTENT_ROUTER_ENABLED = os.environ.get('INTENT_ROUTER_ENABLED', 'True').lower() == 'true'
+    # Comma-separated intents to leave to the model, e.g. "book_appointment,crisis_hotline"
+    INTENT_ROUTER_DISABLED_INTENTS = os.environ.get('INTENT_ROUTER_DISABLED_INTENTS', '')
+    INTENT_ROUTER_MIN_CONFIDENCE = float(os.environ.get('INTENT_ROUTER_MIN_CONFIDENCE', '0.5'))
+    INTENT_ROUTER_MAX_CHARS = int(os.environ.get('INTENT_ROUTER_MAX_CHARS', '120'))
+    
+    # Sentiment Sampling Config
+    # 'adaptive' only calls the model when a message is likely to change the session's mood,
+    # 'always' scores every message
+    SENTIMENT_POLICY = os.environ.get('SENTIMENT_POLICY', 'adaptive')
+    SENTIMENT_MIN_CHARS = int(os.environ.get('SENTIMENT_MIN_CHARS', '25'))
+    SENTIMENT_MAX_AGE_SECONDS = int(os.environ.get('SENTIMENT_MAX_AGE_SECONDS', '900'))
+    SENTIMENT_EVERY_N = int(os.environ.get('SENTIMENT_EVERY_N', '4'))
+    # Local pre-score difference from the last score that forces a new model call
+    SENTIMENT_SHIFT_THRESHOLD = float(os.environ.get('SENTIMENT_SHIFT_THRESHOLD', '2.5'))
+    
+    # Mood Tracking Config
+    # Fold the mood of every chat message into one entry per session and day instead of one per message
+    MOOD_COALESCE_CHAT_ENTRIES = os.environ.get('MOOD_COALESCE_CHAT_ENTRIES', 'True').lower() == 'true'
+    
+    # Mood Bulk Import Config
+    # Most entries accepted by one POST /mood/entries/bulk request
+    MOOD_BULK_MAX_ENTRIES = int(os.environ.get('MOOD_BULK_MAX_ENTRIES', '500'))
+    
+    # Delta Sync Config
+    # Most changes per collection returned by one GET /sync request
+    SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', '500'))
+    # Changes newer than this are served again on the next sync, in case an earlier write commits late
+    SYNC_OVERLAP_SECONDS = int(os.environ.get('SYNC_OVERLAP_SECONDS', '5'))
+    # Deletions are remembered this long; clients that have not synced for longer start over
+    SYNC_TOMBSTONE_DAYS = int(os.environ.get('SYNC_TOMBSTONE_DAYS', '90'))
+    
+    # Mood Export Config
+    # Entries fetched from MongoDB and written to the streamed export at a time
+    MOOD_EXPORT_BATCH_SIZE = int(os.environ.get('MOOD_EXPORT_BATCH_SIZE', '500'))
+    
+    # User Timezone Config
+    # Mood days, time ranges and exports follow user_profiles.timezone; this is used when it is unset
+    DEFAULT_TIMEZONE = os.environ.get('DEFAULT_TIMEZONE', 'UTC')
+    # Timezones kept per worker, and how long before a profile change made elsewhere is picked up
+    USER_TIMEZONE_CACHE_ENTRIES = int(os.environ.get('USER_TIMEZONE_CACHE_ENTRIES', '10000'))
+    USER_TIMEZONE_CACHE_TTL_SECONDS = int(os.environ.get('USER_TIMEZONE_CACHE_TTL_SECONDS', '600'))
+    
+    # Mood Trends Config
+    # Days covered by GET /mood/trends by default and at most
+    MOOD_TRENDS_DEFAULT_DAYS = int(os.environ.get('MOOD_TRENDS_DEFAULT_DAYS', '365'))
+    MOOD_TRENDS_MAX_DAYS = int(os.environ.get('MOOD_TRENDS_MAX_DAYS', '3650'))
+    
+    # Mood Correlation Config
+    # Days compared by GET /mood/correlation by default and at most
+    MOOD_CORRELATION_DEFAULT_DAYS = int(os.environ.get('MOOD_CORRELATION_DEFAULT_DAYS', '90'))
+    MOOD_CORRELATION_MAX_DAYS = int(os.environ.get('MOOD_CORRELATION_MAX_DAYS', '730'))
+    # Days whose manual and chat averages differ by at least this much (scores run -5..5) disagree
+    MOOD_CORRELATION_DISAGREEMENT = float(os.environ.get('MOOD_CORRELATION_DISAGREEMENT', '2.0'))
+    
+    # Mood Population Aggregates Config
+    # Days and weeks with fewer users are kept without statistics, and moods or factors
+    # reported by fewer users are left out (k-anonymity)
+    MOOD_POPULATION_MIN_USERS = int(os.environ.get('MOOD_POPULATION_MIN_USERS', '10'))
+    # Most factors kept per day or week
+    MOOD_POPULATION_TOP_FACTORS = int(os.environ.get('MOOD_POPULATION_TOP_FACTORS', '20'))
+    
+    # Mood Insights Cache Config
+    # Insights responses kept per worker until the user's mood data changes (on any worker);
+    # the TTL only bounds how long an unchanged response is kept
+    MOOD_INSIGHTS_CACHE_ENTRIES = int(os.environ.get('MOOD_INSIGHTS_CACHE_ENTRIES', '4096'))
+    MOOD_INSIGHTS_CACHE_TTL_SECONDS = int(os.environ.get('MOOD_INSIGHTS_CACHE_TTL_SECONDS', '300'))
+    # How long a worker trusts the generation it last read, i.e. how stale a response can
+    # be after a write handled by another worker (0 reads MongoDB on every request)
+    MOOD_INSIGHTS_GENERATION_TTL_SECONDS = float(os.environ.get('MOOD_INSIGHTS_GENERATION_TTL_SECONDS', '2'))
+    
+    # Session Context Cache Config
+    # Sessions whose messages are kept in memory between the history read and the next turns
+    CHAT_CONTEXT_CACHE_SESSIONS = int(os.environ.get('CHAT_CONTEXT_CACHE_SESSIONS', '1024'))
+    
+    # Chat Archive Config
+    # Sessions idle for this many days are moved to compressed per-session archives
+    # by archive_chat_sessions.py; history endpoints read them back transparently
+    CHAT_ARCHIVE_AFTER_DAYS = int(os.environ.get('CHAT_ARCHIVE_AFTER_DAYS', '60'))
+    CHAT_ARCHIVE_COMPRESSION_LEVEL = int(os.environ.get('CHAT_ARCHIVE_COMPRESSION_LEVEL', '9'))
+    
+    # Bulk Session Operations Config
+    # Most archive/delete/retitle operations accepted by one POST /chat/sessions/bulk request
+    CHAT_BULK_MAX_OPERATIONS = int(os.environ.get('CHAT_BULK_MAX_OPERATIONS', '100'))
+    
+    # Long-Term Chat Memory Config
+    # Relevant exchanges from earlier sessions are retrieved locally and added to the prompt
+    CHAT_MEMORY_ENABLED = os.environ.get('CHAT_MEMORY_ENABLED', 'True').lower() == 'true'
+    CHAT_MEMORY_TOP_K = int(os.environ.get('CHAT_MEMORY_TOP_K', '3'))
+    CHAT_MEMORY_TOKEN_BUDGET = int(os.environ.get('CHAT_MEMORY_TOKEN_BUDGET', '300'))
+    CHAT_MEMORY_MIN_SCORE = float(os.environ.get('CHAT_MEMORY_MIN_SCORE', '0.15'))
+    CHAT_MEMORY_MAX_PAIRS = int(os.environ.get('CHAT_MEMORY_MAX_PAIRS', '1000'))
+    CHAT_MEMORY_CACHE_USERS = int(os.environ.get('CHAT_MEMORY_CACHE_USERS', '256'))
+    # Cached indexes are rebuilt after this long so exchanges stored by other workers are picked up
+    CHAT_MEMORY_CACHE_TTL_SECONDS = int(os.environ.get('CHAT_MEMORY_CACHE_TTL_SECONDS', '300'))
+    # Hash space for the TF-IDF vectors, must be a power of two
+    CHAT_MEMORY_DIMENSIONS = int(os.environ.get('CHAT_MEMORY_DIMENSIONS', str(2 ** 18)))
     
     # Mental Health System Prompt
     MENTAL_HEALTH_SYSTEM_PROMPT = os.environ.get('MENTAL_HEALTH_SYSTEM_PROMPT', """You are a compassionate mental health companion designed to provide supportive, empathetic responses to people seeking emotional support.
@@ -79,6 +244,7 @@ For crisis situations, always encourage reaching out to local emergency services
             'MONGO_DBNAME': cls.MONGO_DBNAME,
             'SUPABASE_URL': cls.SUPABASE_URL,
             'OPENAI_API_KEY_SET': bool(cls.OPENAI_API_KEY),
+            'LLM_PROVIDER': cls.LLM_PROVIDER,
             'JWT_SECRET_KEY_SET': bool(cls.JWT_SECRET_KEY),
         }
         return debug_info
\ No newline at end of file
@@ -0,0 +1,217 @@
+"""
+Local crisis-language detector for incoming chat messages
+Runs an Aho-Corasick automaton over a curated multilingual phrase list so every
+message can be screened in well under a millisecond, before any network call
+"""
+from collections import deque
+from text_utils import normalize_text, detect_language
+
+# Severity levels, ordered from most to least urgent
+SEVERITY_HIGH = "high"          # explicit suicidal intent: answer immediately with crisis resources
+SEVERITY_ELEVATED = "elevated"  # self-harm or hopelessness: attach resources, keep the normal reply
+
+_SEVERITY_RANK = {SEVERITY_HIGH: 2, SEVERITY_ELEVATED: 1}
+
+# Curated phrase list per language
+# Phrases are normalized with normalize_text() before compilation, so accents,
+# apostrophes and Arabic letter variants do not matter here
+# A trailing "*" turns the phrase into a prefix match (suicid* -> suicide, suicidal, suicidaire)
+CRISIS_PHRASES = {
+    "en": {
+        SEVERITY_HIGH: [
+            "kill myself", "killing myself", "end my life", "ending my life", "end it all",
+            "take my own life", "taking my own life", "commit suicide", "i m suicidal", "am suicidal",
+            "feel suicidal", "feeling suicidal", "want to die", "wanna die", "better off dead",
+            "don't want to live", "don't want to be alive", "dont want to live", "dont want to be alive",
+            "do not want to live", "do not want to be alive", "no longer want to live",
+            "hang myself", "slit my wrists",
+            "no reason to live", "better off without me", "overdose on purpose",
+        ],
+        SEVERITY_ELEVATED: [
+            "suicid*", "hurt myself", "hurting myself", "harm myself", "self harm", "self-harm",
+            "cut myself", "cutting myself", "can't go on", "no way out", "hopeless*",
+            "nobody would miss me", "disappear forever", "give up on life",
+        ],
+    },
+    "fr": {
+        SEVERITY_HIGH: [
+            "me suicider", "me tuer", "mettre fin a mes jours", "mettre fin a ma vie",
+            "en finir avec la vie", "envie de mourir", "veux mourir", "plus envie de vivre",
+            "je suis suicidaire", "me pendre", "personne ne me regretterait",
+        ],
+        SEVERITY_ELEVATED: [
+            "me faire du mal", "me scarifier", "je n'en peux plus", "sans espoir",
+            "aucun espoir", "disparaitre pour toujours", "pensees suicidaires",
+        ],
+    },
+    "es": {
+        SEVERITY_HIGH: [
+            "quiero morir", "matarme", "suicidarme", "quitarme la vida", "no quiero vivir",
+        ],
+        SEVERITY_ELEVATED: [
+            "hacerme dano", "sin esperanza", "no puedo mas",
+        ],
+    },
+    "ar": {
+        SEVERITY_HIGH: [
+            "أريد أن أموت", "أريد الموت", "أقتل نفسي", "أنهي حياتي", "انتحار", "الانتحار",
+            "انتحر*", "لا أريد أن أعيش", "بغيت نموت", "نقتل راسي",
+        ],
+        SEVERITY_ELEVATED: [
+            "أؤذي نفسي", "فقدت الأمل", "لا أمل", "تعبت من الحياة",
+        ],
+    },
+    # Moroccan Darija written in Latin script ("Arabizi")
+    "ary": {
+        SEVERITY_HIGH: [
+            "bghit nmout", "nqtel rasi", "nqtel rassi", "n9tel rasi", "n9tel rassi",
+        ],
+        SEVERITY_ELEVATED: [
+            "ma bqa walo", "3yit mn hyati", "3yit mn l7ayat",
+        ],
+    },
+}
+
+# Words that negate a phrase when they come right before it or start the clause leading to it
+# ("I don't want to die", "je n'ai pas envie de mourir", "لا أريد أن أموت")
+# French "ne"/"n'" is deliberately absent: "je n'ai plus envie de vivre" is not a negation
+NEGATION_CUES = {
+    "not", "never", "no", "nor", "don", "doesn", "didn", "won", "wouldn", "isn", "wasn", "aren",
+    "pas", "jamais", "aucunement", "nullement",
+    "nunca", "jamas",
+    "لا", "لن", "لم", "ليس", "مش", "machi", "mashi",
+}
+
+# Tokens allowed between a negation cue and the phrase it negates: adverbs, and the
+# intent verbs and modals of the negated clause ("don t really want to kill myself",
+# "not going to kill myself", "no voy a matarme"); any other word ends the search, so a
+# cue that belongs to another part of the sentence ("not okay and want to die") is ignored
+NEGATION_FILLERS = {
+    "t", "really", "even", "just", "actually", "ever", "vraiment", "realmente",
+    "want", "wanna", "going", "gonna", "to", "will", "would", "could", "should", "might",
+    "plan", "planning", "try", "trying", "quiero", "voy", "a",
+}
+
+# How many tokens before a phrase are inspected at most, so the clause stays short
+NEGATION_WINDOW = 6
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton over normalized phrases
+    Phrases are space-padded so matches always fall on word boundaries
+    """
+    def __init__(self, phrases):
+        # phrases: iterable of (phrase, payload)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self.size = 0
+
+        for phrase, payload in phrases:
+            key = self._compile_key(phrase)
+            if key.strip():
+                self._add(key, payload)
+                self.size += 1
+        self._build_failure_links()
+
+    @staticmethod
+    def _compile_key(phrase):
+        """Normalize a phrase the same way incoming messages are normalized"""
+        prefix = phrase.endswith('*')
+        key = normalize_text(phrase.rstrip('*'))
+        return key.rstrip() if prefix else key
+
+    def _add(self, key, payload):
+        state = 0
+        for char in key:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(key), payload))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                candidate = self._goto[fail].get(char, 0)
+                self._fail[next_state] = candidate if candidate != next_state else 0
+                self._output[next_state].extend(self._output[self._fail[next_state]])
+
+    def find_all(self, text):
+        """Return (start, end, payload) for every phrase occurring in an already normalized text"""
+        goto, fail, output = self._goto, self._fail, self._output
+        matches = []
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                for length, payload in output[state]:
+                    matches.append((index - length + 1, index + 1, payload))
+        return matches
+
+def _build_matcher():
+    phrases = []
+    for language, levels in CRISIS_PHRASES.items():
+        for severity, items in levels.items():
+            for phrase in items:
+                phrases.append((phrase, {"phrase": phrase, "language": language, "severity": severity}))
+    return PhraseMatcher(phrases)
+
+# Compiled once at import time and shared by every request
+_MATCHER = _build_matcher()
+
+def _is_negated(normalized, start):
+    """Check whether a negation cue modifies the match (only fillers in between)"""
+    preceding = normalized[:start].split()
+    for token in reversed(preceding[-NEGATION_WINDOW:]):
+        if token in NEGATION_CUES:
+            return True
+        if token not in NEGATION_FILLERS:
+            return False
+    return False
+
+def detect_crisis(text):
+    """
+    Scan a message for crisis language
+    Returns a dict with 'detected', 'severity', 'language', 'matches' and 'negated'
+    """
+    normalized = normalize_text(text)
+    matches = []
+    negated = []
+    severity = None
+
+    for start, end, payload in _MATCHER.find_all(normalized):
+        if _is_negated(normalized, start):
+            negated.append(payload["phrase"])
+            continue
+        matches.append(payload)
+        if severity is None or _SEVERITY_RANK[payload["severity"]] > _SEVERITY_RANK[severity]:
+            severity = payload["severity"]
+
+    language = None
+    if matches:
+        # Prefer the language of the strongest match, falling back to script/stopword detection
+        strongest = max(matches, key=lambda m: _SEVERITY_RANK[m["severity"]])
+        language = strongest["language"]
+    else:
+        language = detect_language(text)
+
+    return {
+        "detected": bool(matches),
+        "severity": severity,
+        "language": language,
+        "matches": sorted({m["phrase"] for m in matches}),
+        "negated": sorted(set(negated))
+    }
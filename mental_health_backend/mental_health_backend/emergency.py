@@ -40,6 +40,99 @@ def send_email(email_address, subject, message):
     # sg.send(message)
     return True
 
+# Crisis resources returned with chat replies when crisis language is detected
+# Keyed by language; every list ends with the international helpline directory
+CRISIS_RESOURCES = {
+    "en": [
+        {"name": "Emergency services (Morocco)", "phone": "15 (ambulance) / 19 (police)"},
+        {"name": "Emergency services (Europe and most mobile phones)", "phone": "112"},
+        {"name": "988 Suicide & Crisis Lifeline (US/Canada)", "phone": "988"},
+    ],
+    "fr": [
+        {"name": "Services d'urgence (Maroc)", "phone": "15 (ambulance) / 19 (police)"},
+        {"name": "Numéro national de prévention du suicide (France)", "phone": "3114"},
+        {"name": "Numéro d'urgence européen", "phone": "112"},
+    ],
+    "es": [
+        {"name": "Línea de atención a la conducta suicida (España)", "phone": "024"},
+        {"name": "Número de emergencias europeo", "phone": "112"},
+    ],
+    "ar": [
+        {"name": "الإسعاف (المغرب)", "phone": "15"},
+        {"name": "الشرطة (المغرب)", "phone": "19"},
+        {"name": "الدرك الملكي (المغرب)", "phone": "177"},
+    ],
+}
+HELPLINE_DIRECTORY = {"name": "Find A Helpline (international directory)", "website": "https://findahelpline.com"}
+
+# Immediate reply used when a message shows explicit suicidal intent
+CRISIS_REPLIES = {
+    "en": "I'm really sorry you're feeling this way, and I'm glad you told me. Your safety matters most right now. "
+          "Please contact emergency services or one of the crisis lines below, or reach out to someone you trust. "
+          "If you'd like, I can alert your emergency contacts for you.",
+    "fr": "Je suis vraiment désolé que vous traversiez cela, et merci de me l'avoir dit. Votre sécurité passe avant tout. "
+          "Contactez les services d'urgence ou l'une des lignes d'écoute ci-dessous, ou une personne de confiance. "
+          "Si vous le souhaitez, je peux prévenir vos contacts d'urgence.",
+    "es": "Siento mucho que te sientas así, y gracias por contármelo. Tu seguridad es lo más importante ahora. "
+          "Contacta con los servicios de emergencia o con una de las líneas de ayuda de abajo, o con alguien de confianza. "
+          "Si quieres, puedo avisar a tus contactos de emergencia.",
+    "ar": "أنا آسف جداً لأنك تشعر بهذا، وشكراً لأنك أخبرتني. سلامتك هي الأهم الآن. "
+          "يرجى الاتصال بخدمات الطوارئ أو بأحد الأرقام أدناه، أو التحدث مع شخص تثق به. "
+          "إذا أردت، يمكنني تنبيه جهات الاتصال الخاصة بك في حالات الطوارئ.",
+}
+
+# Darija and Tamazight users get the Arabic resources and reply
+_CRISIS_LANGUAGE_FALLBACK = {"ary": "ar", "zgh": "ar"}
+
+def _crisis_language(language):
+    language = _CRISIS_LANGUAGE_FALLBACK.get(language, language)
+    return language if language in CRISIS_RESOURCES else "en"
+
+def get_crisis_resources(language="en"):
+    """Return the crisis resources for a language, always including the helpline directory"""
+    return CRISIS_RESOURCES[_crisis_language(language)] + [HELPLINE_DIRECTORY]
+
+def get_crisis_reply(language="en"):
+    """Return the immediate crisis reply for a language"""
+    return CRISIS_REPLIES[_crisis_language(language)]
+
+def build_crisis_payload(detection, user_id=None):
+    """
+    Build the crisis block attached to a chat response
+    Offers the /emergency/alert endpoint and tells the client whether alerts can be sent
+    """
+    has_contacts = False
+    if user_id is not None and hasattr(mongo, 'db') and mongo.db is not None:
+        try:
+            has_contacts = mongo.db.emergency_contacts.count_documents(
+                {"user_id": str(user_id), "notify_for": "crisis"}, limit=1
+            ) > 0
+        except Exception as e:
+            print(f"DEBUG: Error checking emergency contacts: {str(e)}")
+
+    return {
+        "detected": detection["detected"],
+        "severity": detection["severity"],
+        "language": detection["language"],
+        "matches": detection["matches"],
+        "resources": get_crisis_resources(detection["language"]),
+        "alert": {
+            "endpoint": "/api/emergency/alert",
+            "method": "POST",
+            "available": has_contacts
+        }
+    }
+
+@emergency_bp.route('/emergency/resources', methods=['GET'])
+@auth_required
+def get_emergency_resources():
+    """Get crisis resources for a language (defaults to English)"""
+    language = request.args.get('language', 'en')
+    return jsonify({
+        "language": _crisis_language(language),
+        "resources": get_crisis_resources(language)
+    }), 200
+
 @emergency_bp.route('/emergency/contacts', methods=['GET'])
 @auth_required
 def get_emergency_contacts():
@@ -251,7 +344,10 @@ def trigger_emergency_alert():
     try:
         # Convert user_id to string for MongoDB
         user_id_str = str(user_id)
-        
+
+        # Alerts offered by the chat crisis detector pass their origin along
+        data = request.get_json(silent=True) or {}
+
         # Get user details for the alert message
         user_profile = None
         try:
@@ -291,6 +387,8 @@ def trigger_emergency_alert():
             "user_id": user_id_str,
             "timestamp": datetime.utcnow(),
             "status": "initiated",
+            "source": data.get('source', 'manual'),
+            "session_id": data.get('session_id'),
             "contacts_notified": []
         }
         
@@ -0,0 +1,147 @@
+"""
+Per-user cache of /api/mood/insights responses
+Keyed by (user_id, timeRange, date): the date rolls the key over at the user's midnight,
+when the window of every time range moves. Every write to a user's mood data goes through
+mood_rollups, which calls invalidate(): it bumps the user's generation in MongoDB
+(mood_cache_generations) and drops this worker's cached responses
+Each cached response remembers the generation it was computed at, and is only served
+while that is still the user's generation. The generation read from MongoDB is kept by
+each worker for MOOD_INSIGHTS_GENERATION_TTL_SECONDS, so a cache hit usually costs no
+round trip: a write handled by this worker is seen at once, one handled by another
+worker within that TTL
+"""
+import threading
+import time
+from collections import OrderedDict
+from pymongo import ReturnDocument
+from config import Config
+from extensions import mongo
+
+# Bounded LRU of (user_id, time_range, date) -> (insights, stored_at, generation)
+_entries = OrderedDict()
+# Bounded LRU of user_id -> (generation, read_at), as last read from or written to MongoDB
+_generations = OrderedDict()
+_lock = threading.Lock()
+
+# Ages of the responses served from the cache, for the staleness metrics
+_MAX_AGE_SAMPLES = 1000
+_stats = {"hits": 0, "misses": 0, "expired": 0, "stale": 0, "invalidations": 0, "discarded": 0,
+          "generation_reads": 0}
+_hit_ages = []
+
+def _remember_generation(user_id, value):
+    with _lock:
+        # Generations only grow: a read that started before an invalidate() must not win
+        cached = _generations.get(user_id)
+        _generations[user_id] = (max(value, cached[0]) if cached else value, time.monotonic())
+        _generations.move_to_end(user_id)
+        while len(_generations) > Config.MOOD_INSIGHTS_CACHE_ENTRIES:
+            _generations.popitem(last=False)
+
+def generation(user_id):
+    """
+    Current generation of a user's mood data; pass it to get() and to store() with the
+    response computed after reading it. None if it cannot be read (nothing is cached then)
+    """
+    user_id = str(user_id)
+    with _lock:
+        cached = _generations.get(user_id)
+        if cached is not None and time.monotonic() - cached[1] < Config.MOOD_INSIGHTS_GENERATION_TTL_SECONDS:
+            return cached[0]
+        _stats["generation_reads"] += 1
+    try:
+        document = mongo.db.mood_cache_generations.find_one({"_id": user_id}, {"generation": 1})
+    except Exception as e:
+        print(f"DEBUG: Could not read the insights cache generation: {str(e)}")
+        return None
+    value = document.get("generation", 0) if document else 0
+    _remember_generation(user_id, value)
+    return value
+
+def get(user_id, time_range, date, current_generation):
+    """Cached insights for the key if computed at current_generation, or None"""
+    key = (str(user_id), time_range, date)
+    now = time.monotonic()
+    with _lock:
+        cached = _entries.get(key)
+        if cached is None or current_generation is None:
+            _stats["misses"] += 1
+            return None
+        insights, stored_at, stored_generation = cached
+        if stored_generation != current_generation:
+            # Written to by another worker since
+            del _entries[key]
+            _stats["stale"] += 1
+            _stats["misses"] += 1
+            return None
+        if now - stored_at > Config.MOOD_INSIGHTS_CACHE_TTL_SECONDS:
+            del _entries[key]
+            _stats["expired"] += 1
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        _hit_ages.append(now - stored_at)
+        if len(_hit_ages) > _MAX_AGE_SAMPLES:
+            del _hit_ages[:len(_hit_ages) - _MAX_AGE_SAMPLES]
+        return insights
+
+def store(user_id, time_range, date, insights, read_generation):
+    """Cache a response computed after reading read_generation"""
+    if read_generation is None:
+        with _lock:
+            _stats["discarded"] += 1
+        return
+    key = (str(user_id), time_range, date)
+    with _lock:
+        _entries[key] = (insights, time.monotonic(), read_generation)
+        _entries.move_to_end(key)
+        while len(_entries) > Config.MOOD_INSIGHTS_CACHE_ENTRIES:
+            _entries.popitem(last=False)
+
+def _drop(user_id):
+    with _lock:
+        for key in [key for key in _entries if key[0] == user_id]:
+            del _entries[key]
+
+def invalidate(user_id):
+    """
+    Mark every cached response of a user as stale, in all workers (after any change to
+    their mood data); called after the write, so a response read before it is never served
+    """
+    user_id = str(user_id)
+    document = mongo.db.mood_cache_generations.find_one_and_update(
+        {"_id": user_id},
+        {"$inc": {"generation": 1}, "$set": {"user_id": user_id}},
+        projection={"generation": 1}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    # This worker sees its own writes at once, whatever the generation TTL
+    _remember_generation(user_id, document["generation"])
+    _drop(user_id)
+    with _lock:
+        _stats["invalidations"] += 1
+
+def forget_user(user_id):
+    """Drop a deleted user's cached responses from this worker (their generation is deleted with their data)"""
+    _drop(str(user_id))
+    with _lock:
+        _generations.pop(str(user_id), None)
+
+def cache_stats():
+    """Hit rate and age of the responses served from the cache since this worker started"""
+    with _lock:
+        stats = dict(_stats)
+        ages = sorted(_hit_ages)
+        stats["entries"] = len(_entries)
+    lookups = stats["hits"] + stats["misses"]
+
+    def percentile(pct):
+        return ages[min(len(ages) - 1, int(len(ages) * pct / 100))] if ages else 0.0
+
+    return {
+        **stats,
+        "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+        "hit_age_seconds": {"p50": percentile(50), "p95": percentile(95), "max": ages[-1] if ages else 0.0},
+        "ttl_seconds": Config.MOOD_INSIGHTS_CACHE_TTL_SECONDS,
+        "generation_ttl_seconds": Config.MOOD_INSIGHTS_GENERATION_TTL_SECONDS,
+    }
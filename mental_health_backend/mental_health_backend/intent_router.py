@@ -0,0 +1,301 @@
+"""
+Local intent router for common chat requests
+Short, explicit requests ("give me a breathing exercise", "crisis hotline", "how do I
+book an appointment") are recognised locally with keyword rules backed by a small
+hashed bag-of-words nearest-neighbour model, and answered from the localized content
+library below instead of a model completion
+Intents can be switched off one by one with INTENT_ROUTER_DISABLED_INTENTS
+"""
+import re
+import threading
+import time
+import zlib
+from collections import deque
+import numpy as np
+from config import Config
+from crisis_detector import NEGATION_CUES
+from text_utils import normalize_text, tokenize, detect_language
+
+INTENT_BREATHING = "breathing_exercise"
+INTENT_GROUNDING = "grounding_technique"
+INTENT_HOTLINE = "crisis_hotline"
+INTENT_APPOINTMENT = "book_appointment"
+INTENTS = [INTENT_BREATHING, INTENT_GROUNDING, INTENT_HOTLINE, INTENT_APPOINTMENT]
+
+# Keyword rules, matched against normalize_text() output (lowercase, no accents, Arabic letters folded)
+INTENT_RULES = {
+    INTENT_BREATHING: [
+        r"\bbreathing (exercise|technique|exercice)s?\b", r"\bhelp me (to )?breathe\b", r"\bbox breathing\b",
+        r"\b(exercice|technique)s? de respiration\b", r"\baide moi a respirer\b",
+        r"\bejercicios? de respiracion\b", r"\btecnicas? de respiracion\b",
+        r"\bتمارين التنفس\b", r"\bتمرين تنفس\b", r"\bتمرين التنفس\b",
+    ],
+    INTENT_GROUNDING: [
+        r"\bgrounding (exercise|technique)s?\b", r"\b5 4 3 2 1\b", r"\bground myself\b",
+        r"\b(exercice|technique)s? d ancrage\b", r"\bm ancrer\b",
+        r"\b(ejercicio|tecnica)s? de (anclaje|grounding)\b",
+        r"\bتمرين التاريض\b", r"\bتقنيه التاريض\b",
+    ],
+    INTENT_HOTLINE: [
+        r"\b(crisis|suicide|help|support) (hotline|line|number)s?\b", r"\bhotline (number|list)s?\b",
+        r"\bemergency numbers?\b",
+        r"\bligne d (ecoute|urgence)\b", r"\bnumero d urgence\b", r"\bnumero de prevention\b",
+        r"\blinea de (ayuda|crisis|atencion)\b", r"\bnumero de emergencia\b",
+        r"\bرقم الطواري\b", r"\bخط المساعده\b", r"\bرقم المساعده\b",
+    ],
+    INTENT_APPOINTMENT: [
+        r"\b(book|schedule|make) (an |a )?(appointment|session|consultation)\b", r"\bhow (do|can) i book\b",
+        r"\bprendre (un )?rendez vous\b", r"\breserver (un )?(rendez vous|seance|consultation)\b",
+        r"\b(pedir|pido|reservar|reservo|agendar) (una )?(cita|consulta|sesion)\b",
+        r"\bحجز موعد\b", r"\bاحجز موعد\b",
+    ],
+}
+
+# Example requests for the vectorized model; NONE examples keep ordinary
+# conversation (feelings, stories) away from the canned answers
+_NONE = "none"
+INTENT_EXAMPLES = {
+    INTENT_BREATHING: [
+        "give me a breathing exercise", "can you teach me how to breathe to calm down",
+        "i need a breathing technique for my anxiety", "show me a calming breathing exercise",
+        "breathing exercise please", "un exercice de respiration s il te plait",
+        "comment respirer pour me calmer", "un ejercicio de respiracion por favor", "تمرين تنفس من فضلك",
+    ],
+    INTENT_GROUNDING: [
+        "give me a grounding technique", "how do i ground myself during a panic attack",
+        "teach me the 5 4 3 2 1 technique", "grounding exercise please",
+        "une technique d ancrage", "una tecnica de anclaje por favor",
+    ],
+    INTENT_HOTLINE: [
+        "what is the crisis hotline number", "give me a suicide hotline", "who can i call for help right now",
+        "i need an emergency number", "list of helplines", "numero d urgence s il vous plait",
+        "quel est le numero de la ligne d ecoute", "numero de la linea de ayuda", "رقم الطوارئ",
+    ],
+    INTENT_APPOINTMENT: [
+        "how do i book an appointment", "i want to schedule a session with a therapist",
+        "can i make an appointment", "book a consultation", "comment prendre rendez vous",
+        "je veux reserver une seance", "como pido una cita", "quiero reservar una consulta", "كيف احجز موعد",
+    ],
+    _NONE: [
+        "i feel sad today and i don t know why", "my boss yelled at me and i can t stop thinking about it",
+        "i had a fight with my mother", "i m so tired of everything", "thank you that helped",
+        "i tried the breathing exercise yesterday but it did not work for me",
+        "my therapist appointment went badly", "i can t sleep at night", "i feel anxious about my exams",
+        "je me sens seul", "estoy muy cansado", "انا حزين اليوم", "hello", "how are you",
+    ],
+}
+
+# Localized content library; Darija and Tamazight fall back to Arabic, anything else to English
+INTENT_CONTENT = {
+    INTENT_BREATHING: {
+        "en": "Let's try box breathing together:\n"
+              "1. Breathe in slowly through your nose for 4 seconds.\n"
+              "2. Hold your breath for 4 seconds.\n"
+              "3. Breathe out gently through your mouth for 4 seconds.\n"
+              "4. Hold again for 4 seconds.\n"
+              "Repeat for 4 to 6 rounds. If you feel light-headed, go back to breathing normally. "
+              "How do you feel afterwards?",
+        "fr": "Essayons la respiration carrée ensemble :\n"
+              "1. Inspirez lentement par le nez pendant 4 secondes.\n"
+              "2. Retenez votre souffle 4 secondes.\n"
+              "3. Expirez doucement par la bouche pendant 4 secondes.\n"
+              "4. Retenez encore 4 secondes.\n"
+              "Répétez 4 à 6 fois. Si vous avez la tête qui tourne, reprenez une respiration normale. "
+              "Comment vous sentez-vous après ?",
+        "es": "Probemos juntos la respiración cuadrada:\n"
+              "1. Inhala despacio por la nariz durante 4 segundos.\n"
+              "2. Mantén el aire 4 segundos.\n"
+              "3. Exhala suavemente por la boca durante 4 segundos.\n"
+              "4. Espera otros 4 segundos.\n"
+              "Repite de 4 a 6 veces. Si te mareas, vuelve a respirar con normalidad. ¿Cómo te sientes después?",
+        "ar": "لنجرب التنفس المربع معاً:\n"
+              "1. استنشق ببطء من أنفك لمدة 4 ثوانٍ.\n"
+              "2. احبس نفسك لمدة 4 ثوانٍ.\n"
+              "3. ازفر بهدوء من فمك لمدة 4 ثوانٍ.\n"
+              "4. انتظر 4 ثوانٍ أخرى.\n"
+              "كرر ذلك من 4 إلى 6 مرات. إذا شعرت بالدوار، عد إلى التنفس الطبيعي. كيف تشعر بعد ذلك؟",
+    },
+    INTENT_GROUNDING: {
+        "en": "Here is the 5-4-3-2-1 grounding technique. Take your time with each step:\n"
+              "- Name 5 things you can see.\n"
+              "- Name 4 things you can touch.\n"
+              "- Name 3 things you can hear.\n"
+              "- Name 2 things you can smell.\n"
+              "- Name 1 thing you can taste.\n"
+              "Notice your feet on the floor as you go. Would you like to tell me what you noticed?",
+        "fr": "Voici la technique d'ancrage 5-4-3-2-1. Prenez votre temps à chaque étape :\n"
+              "- Nommez 5 choses que vous voyez.\n"
+              "- Nommez 4 choses que vous pouvez toucher.\n"
+              "- Nommez 3 choses que vous entendez.\n"
+              "- Nommez 2 choses que vous sentez.\n"
+              "- Nommez 1 chose que vous goûtez.\n"
+              "Sentez vos pieds sur le sol pendant l'exercice. Voulez-vous me dire ce que vous avez remarqué ?",
+        "es": "Esta es la técnica de anclaje 5-4-3-2-1. Tómate tu tiempo en cada paso:\n"
+              "- Nombra 5 cosas que puedas ver.\n"
+              "- Nombra 4 cosas que puedas tocar.\n"
+              "- Nombra 3 cosas que puedas oír.\n"
+              "- Nombra 2 cosas que puedas oler.\n"
+              "- Nombra 1 cosa que puedas saborear.\n"
+              "Nota tus pies en el suelo mientras lo haces. ¿Quieres contarme qué notaste?",
+        "ar": "إليك تقنية التأريض 5-4-3-2-1. خذ وقتك في كل خطوة:\n"
+              "- اذكر 5 أشياء تراها.\n"
+              "- اذكر 4 أشياء يمكنك لمسها.\n"
+              "- اذكر 3 أشياء تسمعها.\n"
+              "- اذكر شيئين يمكنك شمهما.\n"
+              "- اذكر شيئاً واحداً يمكنك تذوقه.\n"
+              "لاحظ قدميك على الأرض أثناء التمرين. هل تريد أن تخبرني بما لاحظته؟",
+    },
+    INTENT_HOTLINE: {
+        "en": "If you are in danger or thinking about harming yourself, please reach out now:",
+        "fr": "Si vous êtes en danger ou pensez à vous faire du mal, contactez dès maintenant :",
+        "es": "Si estás en peligro o piensas en hacerte daño, contacta ahora con:",
+        "ar": "إذا كنت في خطر أو تفكر في إيذاء نفسك، يرجى التواصل الآن مع:",
+    },
+    INTENT_APPOINTMENT: {
+        "en": "You can book an appointment from the Appointments tab: choose a date and time, add a note "
+              "about what you'd like to talk about, and confirm. You'll get a confirmation email. "
+              "Is there anything you'd like to prepare for the session?",
+        "fr": "Vous pouvez prendre rendez-vous depuis l'onglet Rendez-vous : choisissez une date et une heure, "
+              "ajoutez une note sur ce dont vous voulez parler, puis confirmez. Vous recevrez un e-mail de "
+              "confirmation. Voulez-vous préparer quelque chose pour la séance ?",
+        "es": "Puedes reservar una cita desde la pestaña Citas: elige fecha y hora, añade una nota sobre lo que "
+              "quieres hablar y confirma. Recibirás un correo de confirmación. ¿Quieres preparar algo para la sesión?",
+        "ar": "يمكنك حجز موعد من قسم المواعيد: اختر التاريخ والوقت، وأضف ملاحظة عما تريد التحدث عنه، ثم أكد الحجز. "
+              "ستصلك رسالة تأكيد بالبريد الإلكتروني. هل هناك شيء تريد التحضير له قبل الجلسة؟",
+    },
+}
+
+_LANGUAGE_FALLBACK = {"ary": "ar", "zgh": "ar"}
+
+# Rule matches are trusted as much as a very close model match
+RULE_CONFIDENCE = 0.95
+# The best intent must beat the runner-up (including "none") by this much
+MODEL_MARGIN = 0.15
+_DIMENSIONS = 2 ** 12
+
+_COMPILED_RULES = {intent: [re.compile(pattern) for pattern in patterns] for intent, patterns in INTENT_RULES.items()}
+
+def _features(text):
+    """Hashed, L2-normalized unigram and bigram counts"""
+    tokens = tokenize(text)
+    vector = np.zeros(_DIMENSIONS, dtype=np.float32)
+    for term in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+        vector[zlib.crc32(term.encode('utf-8')) & (_DIMENSIONS - 1)] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def _build_examples():
+    labels = list(INTENT_EXAMPLES)
+    rows, owners = [], []
+    for position, label in enumerate(labels):
+        for example in INTENT_EXAMPLES[label]:
+            rows.append(_features(example))
+            owners.append(position)
+    return labels, np.stack(rows), np.array(owners)
+
+_LABELS, _EXAMPLE_MATRIX, _EXAMPLE_OWNERS = _build_examples()
+
+def _label_scores(text):
+    """Best cosine similarity to the examples of each label (nearest neighbour)"""
+    similarities = _EXAMPLE_MATRIX @ _features(text)
+    scores = np.zeros(len(_LABELS), dtype=np.float32)
+    np.maximum.at(scores, _EXAMPLE_OWNERS, similarities)
+    return scores
+
+# Per-worker counters for the deflection rate and classification latency
+_stats_lock = threading.Lock()
+_stats = {"messages": 0, "deflected": {}}
+_latencies_ms = deque(maxlen=5000)
+
+def _record(intent, elapsed_ms):
+    with _stats_lock:
+        _stats["messages"] += 1
+        if intent:
+            _stats["deflected"][intent] = _stats["deflected"].get(intent, 0) + 1
+        _latencies_ms.append(elapsed_ms)
+
+def router_stats():
+    """Deflection rate and classification latency since this worker started"""
+    with _stats_lock:
+        messages = _stats["messages"]
+        deflected = dict(_stats["deflected"])
+        latencies = sorted(_latencies_ms)
+    total = sum(deflected.values())
+
+    def percentile(pct):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * pct / 100))] if latencies else 0.0
+
+    return {
+        "messages": messages,
+        "deflected": total,
+        "deflection_rate": total / messages if messages else 0.0,
+        "by_intent": deflected,
+        "latency_ms": {"p50": percentile(50), "p95": percentile(95), "p99": percentile(99)},
+    }
+
+def enabled_intents():
+    disabled = {name.strip() for name in Config.INTENT_ROUTER_DISABLED_INTENTS.split(',') if name.strip()}
+    return [intent for intent in INTENTS if intent not in disabled]
+
+def classify(text):
+    """
+    Classify a message without any network call
+    Returns {"intent", "confidence", "method"} for a confident match on an enabled intent, else None
+    """
+    if not text or len(text.strip()) > Config.INTENT_ROUTER_MAX_CHARS:
+        return None
+    tokens = tokenize(text)
+    # "I don't want a breathing exercise" is conversation, not a request
+    if any(token in NEGATION_CUES for token in tokens):
+        return None
+
+    allowed = enabled_intents()
+    normalized = normalize_text(text)
+    scores = _label_scores(text)
+    none_score = float(scores[_LABELS.index(_NONE)])
+    for intent in allowed:
+        if any(rule.search(normalized) for rule in _COMPILED_RULES[intent]):
+            # A keyword inside a story ("my therapist says breathing exercises help when
+            # I'm sad") reads more like conversation than like the request itself
+            if none_score > float(scores[_LABELS.index(intent)]):
+                return None
+            return {"intent": intent, "confidence": RULE_CONFIDENCE, "method": "rule"}
+
+    order = np.argsort(scores)[::-1]
+    best, runner_up = order[0], order[1]
+    intent, confidence = _LABELS[best], float(scores[best])
+    if intent == _NONE or intent not in allowed:
+        return None
+    if confidence < Config.INTENT_ROUTER_MIN_CONFIDENCE or confidence - float(scores[runner_up]) < MODEL_MARGIN:
+        return None
+    return {"intent": intent, "confidence": round(confidence, 3), "method": "model"}
+
+def get_intent_reply(intent, language="en"):
+    """Localized canned reply for an intent"""
+    language = _LANGUAGE_FALLBACK.get(language, language)
+    content = INTENT_CONTENT[intent]
+    reply = content.get(language, content["en"])
+    if intent == INTENT_HOTLINE:
+        # Import locally to avoid circular imports (emergency imports auth)
+        from emergency import get_crisis_resources
+        lines = [f"- {item['name']}: {item.get('phone') or item.get('website')}" for item in get_crisis_resources(language)]
+        reply = reply + "\n" + "\n".join(lines)
+    return reply
+
+def route(text):
+    """
+    Try to answer a chat message locally
+    Returns {"intent", "confidence", "method", "language", "reply", "latency_ms"} or None
+    """
+    if not Config.INTENT_ROUTER_ENABLED:
+        return None
+    started = time.perf_counter()
+    match = classify(text)
+    if match:
+        match["language"] = detect_language(text)
+        match["reply"] = get_intent_reply(match["intent"], match["language"])
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _record(match["intent"] if match else None, elapsed_ms)
+    if match:
+        match["latency_ms"] = round(elapsed_ms, 3)
+    return match
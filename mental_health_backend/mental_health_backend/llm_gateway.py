@@ -0,0 +1,575 @@
+"""
+Gateway for every LLM call made by the backend
+Owns a pooled keep-alive HTTP client, per-call deadlines, retries with jitter,
+optional hedged requests and per-feature model routing
+A deterministic fake provider makes it possible to load-test without network
+"""
+import atexit
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import requests
+from requests.adapters import HTTPAdapter
+from config import Config
+from text_utils import estimate_tokens
+
+# Route used for a feature that has no entry of its own
+DEFAULT_ROUTE = {
+    "model": "gpt-3.5-turbo",
+    "max_tokens": 800,
+    "temperature": 0.7,
+    "timeout": 30.0,         # overall deadline for the call in seconds, retries included
+    "hedge_after_ms": 0,     # 0 disables hedging
+}
+
+# Per-feature routing, overridable with the LLM_ROUTES environment variable (JSON)
+DEFAULT_ROUTES = {
+    "chat": {"model": "gpt-3.5-turbo", "max_tokens": 800, "temperature": 0.7, "timeout": 30.0},
+    "sentiment": {"model": "gpt-3.5-turbo", "max_tokens": 150, "temperature": 0.3, "timeout": 10.0,
+                  "hedge_after_ms": 2000},
+    "title": {"model": "gpt-3.5-turbo", "max_tokens": 20, "temperature": 0.3, "timeout": 10.0},
+}
+
+# HTTP statuses worth retrying
+_RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+# Callables notified with a record of every finished call (see add_listener)
+_listeners = []
+
+def add_listener(listener):
+    """
+    Register a callable that receives one dict per finished complete()/stream() call:
+    feature, model, requested_model, provider, status ("ok" or "error"), error,
+    prompt_tokens, completion_tokens, tokens_estimated, latency_ms, attempts, hedged,
+    hedges (extra hedge requests fired), kind and the caller's context (user_id, session_id...)
+    kind is "call" for the record of the call itself, billed for the provider request whose
+    reply was returned (or streamed) to the caller. Every other provider request the call
+    sent is recorded on its own, since the provider bills it too: "failed_attempt" for an
+    attempt that failed, "lost_race" for the slower request of a hedged attempt
+    Listeners run on the calling or a hedging thread and must be quick
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+def _notify(record):
+    for listener in _listeners:
+        try:
+            listener(record)
+        except Exception as e:
+            print(f"DEBUG: LLM call listener failed: {str(e)}")
+
+class LLMError(Exception):
+    """Raised when a model call fails; retryable errors are retried until the deadline"""
+    def __init__(self, message, retryable=False, status=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status = status
+
+class OpenAIProvider:
+    """Chat completions over a pooled requests session (keep-alive, no per-request clients)"""
+    name = "openai"
+
+    def __init__(self, api_key, api_base, pool_size=20, connect_timeout=3.05):
+        self.api_key = api_key
+        self.url = api_base.rstrip('/') + "/chat/completions"
+        self.connect_timeout = connect_timeout
+        self.session = requests.Session()
+        # Retries are handled by the gateway, not by urllib3
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        })
+
+    def complete(self, request, timeout):
+        body = {
+            "model": request["model"],
+            "messages": request["messages"],
+            "max_tokens": request["max_tokens"],
+            "temperature": request["temperature"],
+        }
+        try:
+            response = self.session.post(
+                self.url,
+                data=json.dumps(body),
+                timeout=(min(self.connect_timeout, timeout), timeout)
+            )
+        except requests.Timeout as e:
+            raise LLMError(f"OpenAI request timed out: {str(e)}", retryable=True)
+        except requests.ConnectionError as e:
+            raise LLMError(f"OpenAI connection error: {str(e)}", retryable=True)
+
+        if response.status_code != 200:
+            raise LLMError(
+                f"OpenAI returned {response.status_code}: {response.text[:200]}",
+                retryable=response.status_code in _RETRYABLE_STATUSES,
+                status=response.status_code
+            )
+
+        data = response.json()
+        usage = data.get("usage") or {}
+        return {
+            "text": data["choices"][0]["message"]["content"].strip(),
+            "model": data.get("model", request["model"]),
+            "usage": {
+                "prompt_tokens": usage.get("prompt_tokens"),
+                "completion_tokens": usage.get("completion_tokens"),
+            },
+        }
+
+    def stream(self, request, timeout):
+        """
+        Yield content deltas from a streamed chat completion (server-sent events)
+        The read timeout only bounds each read, so the whole stream is checked against timeout here
+        """
+        deadline = time.monotonic() + timeout
+        body = {
+            "model": request["model"],
+            "messages": request["messages"],
+            "max_tokens": request["max_tokens"],
+            "temperature": request["temperature"],
+            "stream": True,
+        }
+        try:
+            response = self.session.post(
+                self.url,
+                data=json.dumps(body),
+                timeout=(min(self.connect_timeout, timeout), timeout),
+                stream=True
+            )
+        except requests.Timeout as e:
+            raise LLMError(f"OpenAI request timed out: {str(e)}", retryable=True)
+        except requests.ConnectionError as e:
+            raise LLMError(f"OpenAI connection error: {str(e)}", retryable=True)
+
+        with response:
+            if response.status_code != 200:
+                raise LLMError(
+                    f"OpenAI returned {response.status_code}: {response.text[:200]}",
+                    retryable=response.status_code in _RETRYABLE_STATUSES,
+                    status=response.status_code
+                )
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if time.monotonic() > deadline:
+                        raise LLMError("OpenAI stream exceeded its deadline", retryable=True)
+                    if not line or not line.startswith("data:"):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == "[DONE]":
+                        break
+                    choices = json.loads(payload).get("choices") or [{}]
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        yield delta
+            except (requests.RequestException, ValueError) as e:
+                raise LLMError(f"OpenAI stream interrupted: {str(e)}", retryable=True)
+
+    def close(self):
+        self.session.close()
+
+class FakeProvider:
+    """
+    Deterministic local provider for load tests and offline development
+    Latency is drawn from a configurable distribution seeded by the request content,
+    so the same request always takes the same time and returns the same text
+    Distributions: "constant:MS", "uniform:MIN_MS:MAX_MS", "lognormal:MEDIAN_MS:SIGMA"
+    """
+    name = "fake"
+
+    def __init__(self, latency="lognormal:800:0.5", failure_rate=0.0, seed=1234):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.seed = seed
+        kind, *params = latency.split(':')
+        self._kind = kind
+        self._params = [float(p) for p in params]
+        if kind not in ("constant", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {latency}")
+
+    def _rng(self, request):
+        digest = hashlib.sha256(json.dumps(request["messages"], sort_keys=True).encode('utf-8')).hexdigest()
+        return random.Random(f"{self.seed}:{digest}:{request.get('attempt', 0)}:{request.get('hedge', False)}")
+
+    def sample_latency(self, rng):
+        """Latency in seconds for one call"""
+        if self._kind == "constant":
+            return self._params[0] / 1000.0
+        if self._kind == "uniform":
+            return rng.uniform(self._params[0], self._params[1]) / 1000.0
+        median, sigma = self._params
+        return rng.lognormvariate(0.0, sigma) * median / 1000.0
+
+    def complete(self, request, timeout):
+        rng = self._rng(request)
+        latency = self.sample_latency(rng)
+        if latency > timeout:
+            time.sleep(timeout)
+            raise LLMError("Fake provider timed out", retryable=True)
+        time.sleep(latency)
+        if rng.random() < self.failure_rate:
+            raise LLMError("Fake provider failure", retryable=True, status=503)
+        return self._reply(request, rng)
+
+    def stream(self, request, timeout):
+        """Yield the reply word by word: a third of the latency before the first word, the rest spread out"""
+        rng = self._rng(request)
+        latency = self.sample_latency(rng)
+        if latency * 0.3 > timeout:
+            time.sleep(timeout)
+            raise LLMError("Fake provider timed out", retryable=True)
+        time.sleep(latency * 0.3)
+        if rng.random() < self.failure_rate:
+            raise LLMError("Fake provider failure", retryable=True, status=503)
+        words = self._reply(request, rng)["text"].split(' ')
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(latency * 0.7 / len(words))
+            yield word if i == 0 else ' ' + word
+
+    def _reply(self, request, rng):
+        if request.get("feature") == "sentiment":
+            score = rng.randint(-5, 5)
+            mood = ["very_sad", "sad", "anxious", "neutral", "happy", "very_happy"][min(5, (score + 5) // 2)]
+            text = json.dumps({"score": score, "mood": mood, "factors": []})
+        else:
+            text = "Thank you for sharing that with me. How has this been affecting you day to day?"
+
+        prompt_chars = sum(len(m.get("content", "")) for m in request["messages"])
+        return {
+            "text": text,
+            "model": f"fake-{request['model']}",
+            "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(text) // 4},
+        }
+
+    def close(self):
+        pass
+
+class LLMGateway:
+    """Routes, retries and optionally hedges calls to a provider"""
+
+    def __init__(self, provider, routes=None, max_retries=2, backoff=0.5, backoff_max=4.0, workers=32):
+        self.provider = provider
+        self.routes = routes if routes is not None else DEFAULT_ROUTES
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        # Used only for hedged calls, so a slow primary request does not block the hedge
+        # Work is only submitted when a thread is free, it never queues behind other calls
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-hedge")
+        self._slots = threading.BoundedSemaphore(workers)
+
+    def route(self, feature):
+        """Resolve the model settings for a feature"""
+        return {**DEFAULT_ROUTE, **self.routes.get(feature, {})}
+
+    def _prepare(self, feature, messages, timeout, overrides):
+        route = self.route(feature)
+        route.update({k: v for k, v in overrides.items() if v is not None})
+        deadline = time.monotonic() + (timeout or route["timeout"])
+        request = {
+            "feature": feature,
+            "model": route["model"],
+            "messages": messages,
+            "max_tokens": route["max_tokens"],
+            "temperature": route["temperature"],
+        }
+        return route, request, deadline
+
+    def _backoff(self, attempt, deadline):
+        # Exponential backoff with full jitter, never sleeping past the deadline
+        sleep_for = random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+        sleep_for = min(sleep_for, deadline - time.monotonic())
+        if sleep_for > 0:
+            time.sleep(sleep_for)
+
+    def _record(self, request, started, attempts, context, text=None, usage=None, model=None,
+                hedged=False, hedges=0, error=None, kind="call"):
+        """Listener record for a finished call; token counts are estimated locally when missing"""
+        usage = usage or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        estimated = prompt_tokens is None or (completion_tokens is None and text is not None)
+        if prompt_tokens is None:
+            prompt_tokens = sum(estimate_tokens(m.get("content", "")) for m in request["messages"])
+        if completion_tokens is None:
+            completion_tokens = estimate_tokens(text) if text else 0
+        return {
+            "feature": request["feature"],
+            "model": model or request["model"],
+            "requested_model": request["model"],
+            "provider": self.provider.name,
+            "status": "error" if error else "ok",
+            "error": str(error)[:200] if error else None,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_estimated": estimated,
+            "latency_ms": round((time.monotonic() - started) * 1000, 1),
+            "attempts": attempts,
+            "hedged": hedged,
+            "hedges": hedges,
+            "kind": kind,
+            "context": context or {},
+        }
+
+    def _extra(self, request, started, attempt, context, result=None, error=None, text=None):
+        """
+        Record of a provider request whose outcome was not returned to the caller
+        A request rejected with an HTTP status is not billed; one that timed out or was
+        cut off may have been, so its prompt (and any streamed text) is estimated
+        """
+        if result is not None:
+            return self._record(request, started, attempt + 1, context, text=result["text"],
+                                usage=result.get("usage"), model=result.get("model"), kind="lost_race")
+        billed = None if getattr(error, 'status', None) is None else {"prompt_tokens": 0, "completion_tokens": 0}
+        return self._record(request, started, attempt + 1, context, text=text, usage=billed,
+                            error=error or "no reply", kind="failed_attempt")
+
+    def _report_later(self, future, request, started, attempt, context):
+        """Record a provider request of a hedged attempt once it finishes, if it was not the one returned"""
+        def done(finished):
+            try:
+                _notify(self._extra(request, started, attempt, context, result=finished.result()))
+            except LLMError as e:
+                _notify(self._extra(request, started, attempt, context, error=e))
+            except Exception as e:
+                _notify(self._extra(request, started, attempt, context, error=LLMError(str(e))))
+        future.add_done_callback(done)
+
+    def complete(self, feature, messages, timeout=None, context=None, **overrides):
+        """
+        Run a chat completion for a feature and return a dict with
+        text, model, usage, latency_ms, attempts, hedged and provider
+        context (user_id, session_id...) is only passed on to the call listeners
+        Raises LLMError once retries or the deadline are exhausted
+        """
+        route, request, deadline = self._prepare(feature, messages, timeout, overrides)
+
+        started = time.monotonic()
+        last_error = None
+        hedges = 0
+        attempts = 0
+        # Failed attempts are recorded on their own, so a failed call itself is billed nothing
+        unbilled = {"prompt_tokens": 0, "completion_tokens": 0}
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            attempts = attempt + 1
+
+            def report_later(future, attempt=attempt):
+                self._report_later(future, request, started, attempt, context)
+
+            try:
+                result, hedged, fired = self._attempt({**request, "attempt": attempt}, remaining,
+                                                      route["hedge_after_ms"], report_later)
+                hedges += fired
+                result.update({
+                    "latency_ms": round((time.monotonic() - started) * 1000, 1),
+                    "attempts": attempts,
+                    "hedged": hedged,
+                    "provider": self.provider.name,
+                })
+                _notify(self._record(request, started, attempts, context, text=result["text"],
+                                     usage=result.get("usage"), model=result.get("model"),
+                                     hedged=hedged, hedges=hedges))
+                return result
+            except LLMError as e:
+                last_error = e
+                hedges += getattr(e, 'hedges', 0)
+                print(f"DEBUG: LLM call for {feature} failed (attempt {attempt + 1}): {str(e)}")
+                if not getattr(e, 'reported_later', False):
+                    _notify(self._extra(request, started, attempt, context, error=e))
+                if not e.retryable:
+                    _notify(self._record(request, started, attempts, context, usage=unbilled, hedges=hedges, error=e))
+                    raise
+            if attempt < self.max_retries:
+                self._backoff(attempt, deadline)
+
+        _notify(self._record(request, started, attempts, context, usage=unbilled, hedges=hedges,
+                             error=last_error or "deadline exceeded"))
+        raise LLMError(f"LLM call for {feature} failed: {str(last_error) if last_error else 'deadline exceeded'}",
+                       retryable=False, status=getattr(last_error, 'status', None))
+
+    def stream(self, feature, messages, timeout=None, context=None, **overrides):
+        """
+        Yield the reply for a feature in text chunks as the provider produces them
+        Failures before the first chunk are retried like complete(); once text has
+        been yielded an error is raised to the caller instead
+        Streamed replies carry no usage, so listeners get locally estimated token counts
+        """
+        route, request, deadline = self._prepare(feature, messages, timeout, overrides)
+
+        started = time.monotonic()
+        last_error = None
+        attempts = 0
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            attempts = attempt + 1
+            chunks = []
+            try:
+                for chunk in self.provider.stream({**request, "attempt": attempt}, remaining):
+                    # Providers only bound each read, so a slow trickle is cut off here
+                    if time.monotonic() > deadline:
+                        raise LLMError("LLM stream exceeded its deadline", retryable=False)
+                    chunks.append(chunk)
+                    yield chunk
+                _notify(self._record(request, started, attempts, context, text="".join(chunks)))
+                return
+            except GeneratorExit:
+                # The caller stopped reading; what was produced so far was still paid for
+                _notify(self._record(request, started, attempts, context, text="".join(chunks)))
+                raise
+            except LLMError as e:
+                last_error = e
+                print(f"DEBUG: LLM stream for {feature} failed (attempt {attempt + 1}): {str(e)}")
+                if chunks or not e.retryable:
+                    _notify(self._record(request, started, attempts, context, text="".join(chunks), error=e))
+                    raise
+                _notify(self._extra(request, started, attempt, context, error=e))
+            if attempt < self.max_retries:
+                self._backoff(attempt, deadline)
+
+        _notify(self._record(request, started, attempts, context, usage={"prompt_tokens": 0, "completion_tokens": 0},
+                             error=last_error or "deadline exceeded"))
+        raise LLMError(f"LLM stream for {feature} failed: {str(last_error) if last_error else 'deadline exceeded'}",
+                       retryable=False, status=getattr(last_error, 'status', None))
+
+    def _submit(self, request, timeout):
+        """Run a provider call on the hedging pool, or return None if every thread is busy"""
+        if not self._slots.acquire(blocking=False):
+            return None
+        try:
+            future = self._executor.submit(self.provider.complete, request, timeout)
+        except RuntimeError:
+            self._slots.release()
+            return None
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _attempt(self, request, timeout, hedge_after_ms, report_later=None):
+        """
+        One attempt, with a second identical request fired if the first is slow
+        Returns (result, whether the hedge won, number of hedge requests fired)
+        The calls run on the hedging pool so the caller can return as soon as either
+        finishes; when the pool is saturated the call runs on the caller's thread
+        without hedging instead of waiting for a free thread
+        The request whose outcome is not returned or raised is passed to report_later
+        (it may still be running), so it can be recorded when it finishes
+        """
+        if not hedge_after_ms or hedge_after_ms / 1000.0 >= timeout:
+            return self.provider.complete(request, timeout), False, 0
+
+        started = time.monotonic()
+        primary = self._submit(request, timeout)
+        if primary is None:
+            return self.provider.complete(request, timeout), False, 0
+        done, _ = wait([primary], timeout=hedge_after_ms / 1000.0)
+        if done:
+            return primary.result(), False, 0
+
+        remaining = timeout - (time.monotonic() - started)
+        hedge = self._submit({**request, "hedge": True}, remaining)
+        futures = [primary, hedge] if hedge is not None else [primary]
+        pending = set(futures)
+
+        def report_others(outcome):
+            if report_later:
+                for future in futures:
+                    if future is not outcome:
+                        report_later(future)
+
+        error = None
+        error_future = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, timeout - (time.monotonic() - started)),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                try:
+                    result = future.result()
+                except LLMError as e:
+                    error, error_future = e, future
+                    continue
+                report_others(future)
+                return result, future is hedge, int(hedge is not None)
+        report_others(error_future)
+        if error is None:
+            # Nothing finished in time: every request is recorded when it does
+            error = LLMError("LLM call timed out", retryable=True)
+            error.reported_later = True
+        error.hedges = int(hedge is not None)
+        raise error
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.provider.close()
+
+def _routes_from_config():
+    routes = {feature: dict(route) for feature, route in DEFAULT_ROUTES.items()}
+    if Config.LLM_ROUTES:
+        try:
+            for feature, route in json.loads(Config.LLM_ROUTES).items():
+                routes.setdefault(feature, {}).update(route)
+        except (ValueError, AttributeError) as e:
+            print(f"ERROR: Invalid LLM_ROUTES, using defaults: {str(e)}")
+    return routes
+
+def build_gateway():
+    """Create a gateway from the application config"""
+    if Config.LLM_PROVIDER == "fake":
+        provider = FakeProvider(
+            latency=Config.LLM_FAKE_LATENCY,
+            failure_rate=Config.LLM_FAKE_FAILURE_RATE,
+            seed=Config.LLM_FAKE_SEED
+        )
+    else:
+        provider = OpenAIProvider(
+            api_key=Config.OPENAI_API_KEY,
+            api_base=Config.OPENAI_API_BASE,
+            pool_size=Config.LLM_POOL_SIZE,
+            connect_timeout=Config.LLM_CONNECT_TIMEOUT_SECONDS
+        )
+    return LLMGateway(
+        provider,
+        routes=_routes_from_config(),
+        max_retries=Config.LLM_MAX_RETRIES,
+        backoff=Config.LLM_RETRY_BACKOFF_SECONDS,
+        backoff_max=Config.LLM_RETRY_BACKOFF_MAX_SECONDS,
+        workers=Config.LLM_HEDGE_WORKERS
+    )
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+def get_gateway():
+    """Return the process-wide gateway, creating it on first use"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = build_gateway()
+    return _gateway
+
+def set_gateway(gateway):
+    """Replace the process-wide gateway (load tests, scripts)"""
+    global _gateway
+    with _gateway_lock:
+        _gateway = gateway
+
+def close_gateway():
+    """Release pooled connections on shutdown"""
+    global _gateway
+    if _gateway is not None:
+        _gateway.close()
+        _gateway = None
+
+atexit.register(close_gateway)
@@ -0,0 +1,233 @@
+"""
+Append-only ledger of every LLM call (tokens, cost, latency, user and session)
+The gateway notifies record_call() after each call; entries are buffered in memory
+and written to the llm_ledger collection in batches by a background thread, so a
+chat turn never waits on a ledger write. usage_report() aggregates the ledger per
+day, feature and model for the admin endpoint and llm_usage_report.py
+Failed attempts and the losing request of a hedged attempt get entries of their own,
+so the ledger's cost is what the provider bills, not only what the caller received
+"""
+import atexit
+import json
+import math
+import threading
+from datetime import datetime, timedelta
+from pymongo import ASCENDING
+from config import Config
+from extensions import mongo
+
+# USD per 1K tokens (prompt, completion); versioned names match by prefix
+# ("gpt-4o-mini-2024-07-18" -> "gpt-4o-mini"). Override with LLM_PRICES (JSON)
+DEFAULT_PRICES = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4.1-mini": (0.0004, 0.0016),
+}
+
+# Entries kept in memory at most while MongoDB is unavailable; older ones are dropped
+MAX_BUFFERED = 10000
+
+def _prices_from_config():
+    prices = dict(DEFAULT_PRICES)
+    if Config.LLM_PRICES:
+        try:
+            prices.update({model: tuple(price) for model, price in json.loads(Config.LLM_PRICES).items()})
+        except (ValueError, TypeError, AttributeError) as e:
+            print(f"ERROR: Invalid LLM_PRICES, using defaults: {str(e)}")
+    return prices
+
+PRICES = _prices_from_config()
+
+def price_for(model):
+    """(prompt, completion) USD per 1K tokens for a model name, or None if unknown"""
+    if not model:
+        return None
+    if model in PRICES:
+        return PRICES[model]
+    matches = [name for name in PRICES if model.startswith(name)]
+    return PRICES[max(matches, key=len)] if matches else None
+
+def call_cost(model, prompt_tokens, completion_tokens, fallback_model=None):
+    price = price_for(model) or price_for(fallback_model)
+    if price is None:
+        return None
+    return round(prompt_tokens / 1000.0 * price[0] + completion_tokens / 1000.0 * price[1], 8)
+
+_buffer = []
+_lock = threading.Lock()
+_wake = threading.Event()
+_writer = None
+
+def record_call(record):
+    """Gateway listener: turn a call record into a ledger entry and queue it"""
+    now = datetime.utcnow()
+    context = record.get("context") or {}
+    entry = {
+        "created_at": now,
+        "day": now.strftime('%Y-%m-%d'),
+        "feature": record["feature"],
+        "model": record["model"],
+        "requested_model": record["requested_model"],
+        "provider": record["provider"],
+        "status": record["status"],
+        "prompt_tokens": record["prompt_tokens"],
+        "completion_tokens": record["completion_tokens"],
+        "tokens_estimated": record["tokens_estimated"],
+        # Models the price list does not know (fake provider) are priced like the requested one
+        "cost_usd": call_cost(record["model"], record["prompt_tokens"], record["completion_tokens"],
+                              fallback_model=record["requested_model"]),
+        "latency_ms": record["latency_ms"],
+        "attempts": record["attempts"],
+        "hedged": record["hedged"],
+        "hedges": record["hedges"],
+        # "call", or a provider request of that call whose reply was not used (see add_listener)
+        "kind": record.get("kind", "call"),
+        "user_id": str(context["user_id"]) if context.get("user_id") is not None else None,
+        "session_id": context.get("session_id"),
+    }
+    if record.get("error"):
+        entry["error"] = record["error"]
+    for key, value in context.items():
+        if key not in ("user_id", "session_id"):
+            entry[key] = value
+
+    with _lock:
+        _buffer.append(entry)
+        if len(_buffer) > MAX_BUFFERED:
+            del _buffer[:len(_buffer) - MAX_BUFFERED]
+        full = len(_buffer) >= Config.LLM_LEDGER_BATCH_SIZE
+    _start_writer()
+    if full:
+        _wake.set()
+
+def flush():
+    """Write the buffered entries in one unordered insert; returns the number written"""
+    global _buffer
+    with _lock:
+        batch, _buffer = _buffer, []
+    if not batch:
+        return 0
+    try:
+        mongo.db.llm_ledger.insert_many(batch, ordered=False)
+        return len(batch)
+    except Exception as e:
+        print(f"DEBUG: Could not write {len(batch)} LLM ledger entries, will retry: {str(e)}")
+        with _lock:
+            _buffer = (batch + _buffer)[-MAX_BUFFERED:]
+        return 0
+
+def _run():
+    while True:
+        _wake.wait(Config.LLM_LEDGER_FLUSH_SECONDS)
+        _wake.clear()
+        flush()
+
+def _start_writer():
+    global _writer
+    if _writer is not None:
+        return
+    with _lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_run, name="llm-ledger", daemon=True)
+            _writer.start()
+
+atexit.register(flush)
+
+# Fields summed per (day, feature, model) and per feature
+_SUMMED = ("calls", "errors", "extra_requests", "prompt_tokens", "completion_tokens", "cost_usd",
+           "extra_cost_usd", "hedges")
+
+# Latencies are counted in log-scale buckets by MongoDB, so a report never holds the
+# individual latencies: each bucket is LATENCY_BUCKET_GROWTH times wider than the last
+LATENCY_BUCKET_GROWTH = 1.05
+_LATENCY_BUCKET = {"$floor": {"$divide": [
+    {"$ln": {"$max": [{"$ifNull": ["$latency_ms", 1]}, 1]}}, math.log(LATENCY_BUCKET_GROWTH)
+]}}
+
+def _bucket_latency(bucket):
+    """Geometric middle of a latency bucket, in ms"""
+    return LATENCY_BUCKET_GROWTH ** (bucket + 0.5)
+
+def _percentile(histogram, pct):
+    """Percentile of a {bucket: count} latency histogram, within one bucket width"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = min(total - 1, int(total * pct / 100))
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen > rank:
+            return round(_bucket_latency(bucket), 1)
+    return None
+
+def usage_report(days=7, feature=None, now=None):
+    """
+    Ledger totals for the last `days` days
+    Returns {"since", "rows", "features"}: rows per (day, feature, model), oldest day
+    first, and totals per feature; both with calls, errors, tokens, cost and latency percentiles
+    Tokens and cost include every provider request (extra_requests and extra_cost_usd are
+    the failed attempts and lost hedges among them); calls, errors and latency count calls only
+    """
+    since = ((now or datetime.utcnow()) - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    match = {"day": {"$gte": since}}
+    if feature:
+        match["feature"] = feature
+    is_call = {"$eq": [{"$ifNull": ["$kind", "call"]}, "call"]}
+    groups = mongo.db.llm_ledger.aggregate([
+        {"$match": match},
+        # One row per latency bucket first, then per key with its bucket counts
+        {"$group": {
+            # Grouped by the routed model: streamed calls never see the provider's versioned name
+            "_id": {"day": "$day", "feature": "$feature", "model": "$requested_model",
+                    "bucket": {"$cond": [is_call, _LATENCY_BUCKET, None]}},
+            "calls": {"$sum": {"$cond": [is_call, 1, 0]}},
+            "errors": {"$sum": {"$cond": [{"$and": [is_call, {"$eq": ["$status", "error"]}]}, 1, 0]}},
+            "extra_requests": {"$sum": {"$cond": [is_call, 0, 1]}},
+            "prompt_tokens": {"$sum": "$prompt_tokens"},
+            "completion_tokens": {"$sum": "$completion_tokens"},
+            "cost_usd": {"$sum": {"$ifNull": ["$cost_usd", 0]}},
+            "extra_cost_usd": {"$sum": {"$cond": [is_call, 0, {"$ifNull": ["$cost_usd", 0]}]}},
+            "hedges": {"$sum": {"$cond": [is_call, "$hedges", 0]}},
+        }},
+        {"$group": {
+            "_id": {"day": "$_id.day", "feature": "$_id.feature", "model": "$_id.model"},
+            **{field: {"$sum": f"${field}"} for field in _SUMMED},
+            "latency_buckets": {"$push": {"bucket": "$_id.bucket", "calls": "$calls"}},
+        }},
+        {"$sort": {"_id.day": 1, "_id.feature": 1, "_id.model": 1}},
+    ])
+
+    def summary(total, histogram):
+        total["cost_usd"] = round(total["cost_usd"], 6)
+        total["extra_cost_usd"] = round(total["extra_cost_usd"], 6)
+        total["latency_ms"] = {"p50": _percentile(histogram, 50), "p95": _percentile(histogram, 95),
+                               "p99": _percentile(histogram, 99)}
+        return total
+
+    rows = []
+    features = {}
+    for group in groups:
+        histogram = {}
+        for item in group.pop("latency_buckets"):
+            if item["bucket"] is not None and item["calls"]:
+                histogram[int(item["bucket"])] = histogram.get(int(item["bucket"]), 0) + item["calls"]
+        key = group.pop("_id")
+        total, feature_histogram = features.setdefault(key["feature"], (
+            {"feature": key["feature"], **{field: 0 for field in _SUMMED}}, {}))
+        for field in _SUMMED:
+            total[field] += group[field]
+        for bucket, count in histogram.items():
+            feature_histogram[bucket] = feature_histogram.get(bucket, 0) + count
+        rows.append(summary({**key, **group}, histogram))
+
+    return {
+        "since": since,
+        "rows": rows,
+        "features": [summary(total, histogram) for total, histogram in features.values()],
+    }
+
+def ensure_ledger_indexes():
+    mongo.db.llm_ledger.create_index([("day", ASCENDING), ("feature", ASCENDING)])
+    mongo.db.llm_ledger.create_index([("user_id", ASCENDING), ("created_at", ASCENDING)])
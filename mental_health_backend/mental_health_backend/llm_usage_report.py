@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Print LLM cost, tokens and latency percentiles per feature and day from the LLM ledger
+Run with: python llm_usage_report.py [--days 7] [--feature chat] [--json]
+"""
+import argparse
+import json
+
+def format_latency(latency):
+    return " / ".join(f"{latency[p]:.0f}" if latency[p] is not None else "-" for p in ("p50", "p95", "p99"))
+
+def main():
+    parser = argparse.ArgumentParser(description='Report LLM usage from the ledger')
+    parser.add_argument('--days', type=int, default=7, help='Number of days to include, today included (default: 7)')
+    parser.add_argument('--feature', help='Only this feature (chat, sentiment, title...)')
+    parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+    args = parser.parse_args()
+
+    from app import app
+    from llm_ledger import usage_report
+
+    with app.app_context():
+        report = usage_report(days=args.days, feature=args.feature)
+
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+        return
+    if not report["rows"]:
+        print(f"No LLM calls recorded since {report['since']}")
+        return
+
+    header = f"{'day':<10} {'feature':<10} {'model':<22} {'calls':>7} {'errors':>6} {'prompt tok':>11} " \
+             f"{'compl tok':>10} {'cost $':>10} {'retry/hedge $':>13} {'latency ms p50 / p95 / p99':>28}"
+    print(header)
+    print("-" * len(header))
+    for row in report["rows"]:
+        print(f"{row['day']:<10} {row['feature']:<10} {row['model']:<22} {row['calls']:>7} {row['errors']:>6} "
+              f"{row['prompt_tokens']:>11} {row['completion_tokens']:>10} {row['cost_usd']:>10.4f} "
+              f"{row['extra_cost_usd']:>13.4f} {format_latency(row['latency_ms']):>28}")
+    print()
+    print(f"Totals since {report['since']}:")
+    for total in report["features"]:
+        print(f"{'':<10} {total['feature']:<10} {'':<22} {total['calls']:>7} {total['errors']:>6} "
+              f"{total['prompt_tokens']:>11} {total['completion_tokens']:>10} {total['cost_usd']:>10.4f} "
+              f"{total['extra_cost_usd']:>13.4f} {format_latency(total['latency_ms']):>28}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Load test for the LLM gateway using the deterministic fake provider (no network)
+Compares tail latency with and without hedging for a given latency distribution
+Run with: python loadtest_llm_gateway.py --latency lognormal:400:0.8 --hedge-after-ms 600
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from llm_gateway import LLMGateway, FakeProvider, LLMError
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return sorted_values[index]
+
+def run(args, hedge_after_ms):
+    provider = FakeProvider(latency=args.latency, failure_rate=args.failure_rate, seed=args.seed)
+    routes = {"chat": {"model": "gpt-3.5-turbo", "timeout": args.timeout, "hedge_after_ms": hedge_after_ms}}
+    gateway = LLMGateway(provider, routes=routes, max_retries=args.retries, backoff=0.05, backoff_max=0.5,
+                         workers=args.workers)
+
+    def one_call(i):
+        messages = [{"role": "user", "content": f"load test message {i}"}]
+        try:
+            return gateway.complete("chat", messages)
+        except LLMError:
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one_call, range(args.requests)))
+    elapsed = time.perf_counter() - start
+    gateway.close()
+
+    ok = [r for r in results if r]
+    latencies = sorted(r["latency_ms"] for r in ok)
+    label = f"hedge after {hedge_after_ms} ms" if hedge_after_ms else "no hedging"
+    print(f"{label:>22} | {len(ok) / elapsed:7.1f} req/s | "
+          f"p50 {percentile(latencies, 50):7.1f} ms | p95 {percentile(latencies, 95):7.1f} ms | "
+          f"p99 {percentile(latencies, 99):7.1f} ms | max {latencies[-1]:7.1f} ms | errors {len(results) - len(ok)} | "
+          f"retried {sum(1 for r in ok if r['attempts'] > 1)} | hedge wins {sum(1 for r in ok if r['hedged'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the LLM gateway with the fake provider')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency', default='lognormal:200:0.8',
+                        help='Fake latency distribution (default: lognormal:200:0.8)')
+    parser.add_argument('--failure-rate', type=float, default=0.01)
+    parser.add_argument('--timeout', type=float, default=10.0, help='Per-call deadline in seconds')
+    parser.add_argument('--retries', type=int, default=2)
+    parser.add_argument('--hedge-after-ms', type=int, default=400)
+    parser.add_argument('--workers', type=int, default=32,
+                        help='Hedging pool size, as in production (default: 32)')
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, latency {args.latency}, "
+          f"failure rate {args.failure_rate}")
+    run(args, 0)
+    if args.hedge_after_ms:
+        run(args, args.hedge_after_ms)
+
+if __name__ == "__main__":
+    main()
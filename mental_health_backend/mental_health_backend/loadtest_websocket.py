@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Load test for the chat WebSocket channel
+Opens many concurrent authenticated connections against one server, keeps them open
+with periodic pings and optionally sends chat messages, then reports how many
+connections were held and the round-trip latencies
+Start the server with a single worker to measure connections per worker, e.g.
+    GUNICORN_WORKERS=1 LLM_PROVIDER=fake python start_server.py --mode prod
+Run with: python loadtest_websocket.py --token <access token> --connections 200 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import time
+import websockets
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return sorted_values[index]
+
+async def wait_for(ws, request_id, event_type, stats):
+    """Read frames until the reply with this request_id arrives, counting pushed events"""
+    while True:
+        event = json.loads(await ws.recv())
+        if event.get("request_id") == request_id and event["type"] in (event_type, "error"):
+            return event
+        if event["type"] not in ("chat.delta",):
+            stats["pushed"] += 1
+
+async def client(i, args, stats, stop_at):
+    url = f"{args.url}?token={args.token}"
+    started = time.perf_counter()
+    try:
+        async with websockets.connect(url, open_timeout=30, max_size=2 ** 22) as ws:
+            ready = json.loads(await ws.recv())
+            if ready.get("type") != "ready":
+                stats["rejected"] += 1
+                return
+            stats["connect"].append(time.perf_counter() - started)
+            stats["open"] += 1
+            stats["peak"] = max(stats["peak"], stats["open"])
+
+            n = 0
+            try:
+                while time.perf_counter() < stop_at:
+                    await asyncio.sleep(args.interval)
+                    n += 1
+                    request_id = f"{i}-{n}"
+                    t0 = time.perf_counter()
+                    if args.chat_every and n % args.chat_every == 0:
+                        await ws.send(json.dumps({"type": "chat", "request_id": request_id,
+                                                  "message": f"load test message {i} {n}"}))
+                        event = await wait_for(ws, request_id, "chat.done", stats)
+                        stats["chat"].append(time.perf_counter() - t0)
+                    else:
+                        await ws.send(json.dumps({"type": "ping", "request_id": request_id}))
+                        event = await wait_for(ws, request_id, "pong", stats)
+                        stats["ping"].append(time.perf_counter() - t0)
+                    if event["type"] == "error":
+                        stats["errors"] += 1
+            finally:
+                stats["open"] -= 1
+    except Exception as e:
+        stats["failed"] += 1
+        if stats["failed"] <= 5:
+            print(f"Connection {i} failed: {e}")
+
+async def run(args):
+    stats = {"connect": [], "ping": [], "chat": [], "open": 0, "peak": 0,
+             "failed": 0, "rejected": 0, "errors": 0, "pushed": 0}
+    stop_at = time.perf_counter() + args.ramp + args.duration
+    tasks = []
+    for i in range(args.connections):
+        tasks.append(asyncio.create_task(client(i, args, stats, stop_at)))
+        await asyncio.sleep(args.ramp / max(1, args.connections))
+    await asyncio.gather(*tasks)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the chat WebSocket channel')
+    parser.add_argument('--url', default='ws://localhost:5000/api/chat/ws')
+    parser.add_argument('--token', required=True, help='Access token used by every connection')
+    parser.add_argument('--connections', type=int, default=200)
+    parser.add_argument('--ramp', type=float, default=10.0, help='Seconds over which connections are opened')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to hold connections after the ramp')
+    parser.add_argument('--interval', type=float, default=5.0, help='Seconds between requests per connection')
+    parser.add_argument('--chat-every', type=int, default=0,
+                        help='Send a chat message instead of a ping every N requests (0 = pings only)')
+    args = parser.parse_args()
+
+    stats = asyncio.run(run(args))
+    connect = sorted(stats["connect"])
+    ping = sorted(stats["ping"])
+    chat = sorted(stats["chat"])
+    print(f"Connections: {len(connect)}/{args.connections} held (peak {stats['peak']} open), "
+          f"{stats['rejected']} rejected, {stats['failed']} failed")
+    print(f"Connect:     p50 {percentile(connect, 50) * 1000:7.1f} ms | p99 {percentile(connect, 99) * 1000:7.1f} ms")
+    print(f"Ping RTT:    p50 {percentile(ping, 50) * 1000:7.1f} ms | p99 {percentile(ping, 99) * 1000:7.1f} ms "
+          f"({len(ping)} pings)")
+    if chat:
+        print(f"Chat turn:   p50 {percentile(chat, 50) * 1000:7.1f} ms | p99 {percentile(chat, 99) * 1000:7.1f} ms "
+              f"({len(chat)} messages)")
+    print(f"Errors:      {stats['errors']} | pushed events received: {stats['pushed']}")
+
+if __name__ == "__main__":
+    main()
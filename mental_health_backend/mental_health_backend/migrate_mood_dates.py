@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Migration: store mood entry dates as typed dates
+Every mood_entries document gets date_at (BSON date, midnight UTC) parsed from its
+client-supplied date string, and date is rewritten as YYYY-MM-DD. Entries whose date
+cannot be parsed are left as they are and marked with date_invalid so they can be
+fixed by hand. Users whose date strings changed get their daily rollups rebuilt.
+Then the typed (user_id, date_at) index replaces the string one, and a collection
+validator rejects new entries without a valid date
+Safe to re-run: only entries without date_at are read
+Run with: python migrate_mood_dates.py [--batch-size 1000] [--dry-run] [--no-validator]
+"""
+import argparse
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+from mood_store import (
+    DATE_FORMAT, LEGACY_DATE_INDEX, date_fields, parse_mood_date, ensure_mood_indexes
+)
+from mood_rollups import rebuild_user_rollups
+
+# Enforced by MongoDB on inserts and on updates of documents that already match it
+# ("moderate"), so legacy invalid entries can still be edited or deleted
+MOOD_ENTRY_VALIDATOR = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["user_id", "date", "date_at"],
+        "properties": {
+            "user_id": {"bsonType": "string"},
+            "date": {"bsonType": "string", "pattern": "^[0-9]{4}-[0-9]{2}-[0-9]{2}$"},
+            "date_at": {"bsonType": "date"},
+        },
+    }
+}
+
+def migrate(collection, batch_size, dry_run):
+    """Returns (entries converted, entries invalid, users whose date strings changed)"""
+    converted = invalid = 0
+    changed_users = set()
+    operations = []
+    cursor = collection.find(
+        {"date_at": {"$exists": False}, "date_invalid": {"$exists": False}},
+        {"user_id": 1, "date": 1}
+    )
+    for entry in cursor:
+        try:
+            fields = date_fields(parse_mood_date(entry.get("date")))
+        except ValueError:
+            invalid += 1
+            print(f"Invalid date {entry.get('date')!r} on entry {entry['_id']} (user {entry.get('user_id')})")
+            operations.append(UpdateOne({"_id": entry["_id"]}, {"$set": {"date_invalid": True}}))
+        else:
+            converted += 1
+            if fields["date"] != entry.get("date"):
+                changed_users.add(entry.get("user_id"))
+            operations.append(UpdateOne({"_id": entry["_id"]}, {"$set": fields}))
+        if len(operations) >= batch_size:
+            if not dry_run:
+                collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations and not dry_run:
+        collection.bulk_write(operations, ordered=False)
+    return converted, invalid, changed_users
+
+def main():
+    parser = argparse.ArgumentParser(description='Store mood entry dates as typed dates')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Entries updated per bulk operation (default: 1000)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Report what would change without writing anything')
+    parser.add_argument('--no-validator', action='store_true',
+                        help='Do not install the mood_entries collection validator')
+    args = parser.parse_args()
+
+    from app import app
+    from extensions import mongo
+
+    with app.app_context():
+        collection = mongo.db.mood_entries
+        converted, invalid, changed_users = migrate(collection, args.batch_size, args.dry_run)
+        print(f"{'Would convert' if args.dry_run else 'Converted'} {converted} entries to typed dates "
+              f"({DATE_FORMAT}), {invalid} with an invalid date, "
+              f"{len(changed_users)} users with reformatted dates")
+        if args.dry_run:
+            return
+
+        for user_id in changed_users:
+            if user_id:
+                rebuild_user_rollups(str(user_id))
+
+        ensure_mood_indexes()
+        if LEGACY_DATE_INDEX in collection.index_information():
+            collection.drop_index(LEGACY_DATE_INDEX)
+            print(f"Dropped index {LEGACY_DATE_INDEX}")
+
+        if not args.no_validator:
+            try:
+                mongo.db.command("collMod", "mood_entries", validator=MOOD_ENTRY_VALIDATOR,
+                                 validationLevel="moderate", validationAction="error")
+                print("Installed the mood_entries validator")
+            except OperationFailure as e:
+                # Managed clusters can restrict collMod to admins
+                print(f"Could not install the mood_entries validator: {str(e)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Per-message model routing for chat completions
+Picks a model tier (fast, standard, deep) and token limit for each chat turn from
+cheap local features: message length, detected language, crisis flags and how deep
+into the session the user is. Quick acknowledgements go to the fast tier, long or
+sensitive messages to the deep tier; a tier whose recent latency exceeds the budget
+is skipped for the next cheaper one, except for crisis messages, and long or
+deep-session messages never go below the standard tier
+Latency is judged by time to first token (streamed turns) and generation time per
+output token, which do not grow with the length of the reply. Samples older than
+MODEL_ROUTER_LATENCY_WINDOW_SECONDS are forgotten and a share of a slow tier's traffic
+still goes to it, so a tier that is fast again is routed to again
+"""
+import json
+import random
+import threading
+import time
+from config import Config
+from llm_gateway import get_gateway
+from text_utils import detect_language, estimate_tokens
+
+TIER_FAST = "fast"
+TIER_STANDARD = "standard"
+TIER_DEEP = "deep"
+TIER_ORDER = [TIER_FAST, TIER_STANDARD, TIER_DEEP]
+
+# Tier settings are applied on top of the gateway's "chat" route, so an empty tier
+# behaves exactly like the route (same model, same max_tokens)
+DEFAULT_TIERS = {
+    TIER_FAST: {"model": "gpt-4o-mini", "max_tokens": 250},
+    TIER_STANDARD: {},
+    TIER_DEEP: {"max_tokens": 1000, "timeout": 45.0},
+}
+
+# Languages the fast tier handles well; others start at the standard tier
+FAST_TIER_LANGUAGES = {"en", "fr", "es"}
+
+# Lowest tier a message may be stepped down to for latency, by routing reason;
+# the hardest messages must not end up on the weakest model
+STEP_DOWN_FLOOR = {"long": TIER_STANDARD, "deep_session": TIER_STANDARD}
+
+# Smoothing factor of the per-tier latency averages
+_LATENCY_ALPHA = 0.2
+
+# tier -> {metric: (moving average, monotonic time of the last sample)}
+_latency_lock = threading.Lock()
+_latency = {}
+
+def _tiers_from_config():
+    tiers = {tier: dict(settings) for tier, settings in DEFAULT_TIERS.items()}
+    if Config.MODEL_ROUTER_TIERS:
+        try:
+            for tier, settings in json.loads(Config.MODEL_ROUTER_TIERS).items():
+                if tier in tiers:
+                    tiers[tier].update(settings)
+        except (ValueError, AttributeError) as e:
+            print(f"ERROR: Invalid MODEL_ROUTER_TIERS, using defaults: {str(e)}")
+    return tiers
+
+TIERS = _tiers_from_config()
+
+def record_latency(tier, first_token_ms=None, ms_per_token=None, now=None):
+    """
+    Feed the observed latency of a completion back into the tier's moving averages:
+    time to first token (streamed turns only) and generation time per output token
+    """
+    now = time.monotonic() if now is None else now
+    with _latency_lock:
+        metrics = _latency.setdefault(tier, {})
+        for metric, value in (("first_token_ms", first_token_ms), ("ms_per_token", ms_per_token)):
+            if value is None:
+                continue
+            previous = metrics.get(metric)
+            # An expired average starts over instead of weighing on the new sample
+            if previous is None or now - previous[1] > Config.MODEL_ROUTER_LATENCY_WINDOW_SECONDS:
+                metrics[metric] = (value, now)
+            else:
+                metrics[metric] = (previous[0] + _LATENCY_ALPHA * (value - previous[0]), now)
+
+def tier_latency(tier, now=None):
+    """{metric: moving average} of a tier, without the metrics not sampled within the window"""
+    now = time.monotonic() if now is None else now
+    with _latency_lock:
+        metrics = dict(_latency.get(tier, {}))
+    return {metric: average for metric, (average, sampled_at) in metrics.items()
+            if now - sampled_at <= Config.MODEL_ROUTER_LATENCY_WINDOW_SECONDS}
+
+def over_budget(tier):
+    """The first metric of a tier over its budget, or None"""
+    budgets = {"first_token_ms": Config.MODEL_ROUTER_FIRST_TOKEN_BUDGET_MS,
+               "ms_per_token": Config.MODEL_ROUTER_MS_PER_TOKEN_BUDGET}
+    for metric, average in tier_latency(tier).items():
+        if budgets.get(metric) and average > budgets[metric]:
+            return metric
+    return None
+
+def choose(message, session_depth=0, crisis=False, language=None):
+    """
+    Pick the tier for one chat turn
+    session_depth is the number of earlier exchanges in the session
+    Returns a decision dict: tier, reason, overrides for the gateway and the features used
+    """
+    language = language or detect_language(message)
+    tokens = estimate_tokens(message)
+    features = {"chars": len(message), "tokens": tokens, "language": language,
+                "crisis": bool(crisis), "session_depth": session_depth}
+
+    if not Config.MODEL_ROUTER_ENABLED:
+        tier, reason = TIER_STANDARD, "disabled"
+    elif crisis:
+        tier, reason = TIER_DEEP, "crisis"
+    elif tokens >= Config.MODEL_ROUTER_LONG_TOKENS:
+        tier, reason = TIER_DEEP, "long"
+    elif session_depth >= Config.MODEL_ROUTER_DEEP_SESSION_DEPTH:
+        tier, reason = TIER_DEEP, "deep_session"
+    elif language not in FAST_TIER_LANGUAGES:
+        tier, reason = TIER_STANDARD, "language"
+    elif len(message.strip()) <= Config.MODEL_ROUTER_SHORT_CHARS:
+        tier, reason = TIER_FAST, "short"
+    else:
+        tier, reason = TIER_STANDARD, "default"
+
+    # Step down while the chosen tier is running over the latency budget; crisis
+    # messages always keep the strongest tier, long and deep-session ones stop at
+    # STEP_DOWN_FLOOR, and probes keep measuring a slow tier
+    downgraded_from = None
+    probe = False
+    floor = STEP_DOWN_FLOOR.get(reason, TIER_FAST)
+    if not crisis and Config.MODEL_ROUTER_ENABLED:
+        while TIER_ORDER.index(tier) > TIER_ORDER.index(floor):
+            if not over_budget(tier):
+                break
+            if random.random() < Config.MODEL_ROUTER_PROBE_RATE:
+                probe = True
+                break
+            downgraded_from = downgraded_from or tier
+            tier = TIER_ORDER[TIER_ORDER.index(tier) - 1]
+
+    # With routing disabled every turn uses the plain chat route
+    overrides = dict(TIERS[tier]) if Config.MODEL_ROUTER_ENABLED else {}
+    resolved = {**get_gateway().route("chat"), **overrides}
+    decision = {"tier": tier, "reason": reason, "features": features,
+                "model": resolved["model"], "max_tokens": resolved["max_tokens"]}
+    if downgraded_from:
+        decision["downgraded_from"] = downgraded_from
+    if probe:
+        decision["probe"] = True
+    return decision, overrides
@@ -1,9 +1,28 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 from extensions import mongo
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
 from auth import auth_required
+from mood_store import (
+    EXPORT_FIELDS, SOURCE_CHAT_SESSION, date_fields, ensure_entry_dates, entry_factor_ids, expand_aggregate,
+    export_row, is_aggregate, parse_mood_date
+)
+from mood_insights import accumulate, build_insights, name_factors
+from mood_factors import factor_labels, factor_names, factor_pairs, intern_factors
+from mood_rollups import apply_entry, apply_entries, summarize_rollup, user_rollups
+from mood_trends import TREND_FIELDS, compute_trends, daily_series, trend_start
+from mood_correlation import mood_correlation
+from mood_heatmap import FORMATS, HEATMAP_FIELDS, build_heatmap, heatmap_etag, year_range
+from config import Config
+from tombstones import record_tombstone
+from user_timezones import local_today, user_timezone
+import insights_cache
+import csv
+import io
+import json
 
 # Create the mood blueprint
 mood_bp = Blueprint('mood', __name__)
@@ -19,32 +38,37 @@ def get_mood_entries():
     # Get time range from query parameters
     time_range = request.args.get('timeRange', 'month')
     
-    # Calculate the start date based on time range
-    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    if time_range == 'week':
-        start_date = today - timedelta(days=7)
-    elif time_range == 'month':
-        start_date = today - timedelta(days=30)
-    elif time_range == 'year':
-        start_date = today - timedelta(days=365)
-    else:
-        start_date = today - timedelta(days=30)  # Default to month
-    
     try:
         # Convert user_id to string for consistency
         user_id_str = str(user_id)
         
+        # Calculate the start date based on time range, in days of the user's timezone
+        today = local_today(user_timezone(user_id_str))
+        if time_range == 'week':
+            start_date = today - timedelta(days=7)
+        elif time_range == 'month':
+            start_date = today - timedelta(days=30)
+        elif time_range == 'year':
+            start_date = today - timedelta(days=365)
+        else:
+            start_date = today - timedelta(days=30)  # Default to month
+        
         # Query MongoDB for mood entries within the specified time range
+        ensure_entry_dates(user_id_str)
         entries_cursor = mongo.db.mood_entries.find({
             "user_id": user_id_str,
-            "date": {"$gte": start_date.strftime('%Y-%m-%d')}
-        }).sort("date", -1)
+            "date_at": {"$gte": start_date}
+        }).sort("date_at", -1)
         
         # Format the entries for JSON response
         entries = []
         for entry in entries_cursor:
-            # Convert ObjectId to string
+            # Convert ObjectId to string; date_at is the typed copy of date
             entry["id"] = str(entry.pop("_id"))
+            entry.pop("date_at", None)
+            
+            # Chat-derived aggregates get the same mood/mood_score/factors fields as other entries
+            expand_aggregate(entry)
             
             # Convert datetime objects to ISO format strings
             if "created_at" in entry and isinstance(entry["created_at"], datetime):
@@ -59,41 +83,65 @@ def get_mood_entries():
         print(f"ERROR: Failed to fetch mood entries: {str(e)}")
         return jsonify({"error": "Failed to fetch mood entries"}), 500
 
-@mood_bp.route('/api/mood/entries', methods=['POST'])
-@auth_required
-def create_mood_entry():
-    """Create a new mood entry"""
-    # User is available from the auth_required decorator
-    user = request.user
-    user_id = user.get('id')
-    
-    # Get data from request
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "No data provided"}), 400
-    
+def validate_entry(data):
+    """
+    Check a new mood entry the way create_mood_entry does
+    Returns (fields, None) with the fields to store, or (None, error message)
+    """
     # Validate required fields
     required_fields = ["date", "mood", "mood_score", "factors"]
     for field in required_fields:
         if field not in data:
-            return jsonify({"error": f"Missing required field: {field}"}), 400
+            return None, f"Missing required field: {field}"
+    
+    # Validate date
+    try:
+        entry_day = parse_mood_date(data["date"])
+    except ValueError:
+        return None, "date must be a valid date (YYYY-MM-DD)"
     
     # Validate mood value
     valid_moods = ["very_happy", "happy", "neutral", "sad", "very_sad", "anxious", "angry"]
     if data["mood"] not in valid_moods:
-        return jsonify({"error": f"Invalid mood. Must be one of: {', '.join(valid_moods)}"}), 400
+        return None, f"Invalid mood. Must be one of: {', '.join(valid_moods)}"
     
     # Validate mood_score (should be between -5 and 5)
     try:
         mood_score = float(data["mood_score"])
         if mood_score < -5 or mood_score > 5:
-            return jsonify({"error": "mood_score must be between -5 and 5"}), 400
+            return None, "mood_score must be between -5 and 5"
     except (ValueError, TypeError):
-        return jsonify({"error": "mood_score must be a number"}), 400
+        return None, "mood_score must be a number"
     
     # Validate factors is a list
     if not isinstance(data["factors"], list):
-        return jsonify({"error": "factors must be a list"}), 400
+        return None, "factors must be a list"
+    
+    return {
+        **date_fields(entry_day),
+        "mood": data["mood"],
+        "mood_score": mood_score,
+        "factors": data["factors"],
+        "factor_ids": intern_factors(data["factors"]),
+        "notes": data.get("notes", "")
+    }, None
+
+@mood_bp.route('/api/mood/entries', methods=['POST'])
+@auth_required
+def create_mood_entry():
+    """Create a new mood entry"""
+    # User is available from the auth_required decorator
+    user = request.user
+    user_id = user.get('id')
+    
+    # Get data from request
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+    
+    fields, error = validate_entry(data)
+    if error:
+        return jsonify({"error": error}), 400
     
     try:
         # Convert user_id to string for consistency
@@ -103,11 +151,7 @@ def create_mood_entry():
         now = datetime.utcnow()
         entry = {
             "user_id": user_id_str,
-            "date": data["date"],
-            "mood": data["mood"],
-            "mood_score": mood_score,
-            "factors": data["factors"],
-            "notes": data.get("notes", ""),
+            **fields,
             "source": "manual",
             "created_at": now,
             "updated_at": now
@@ -115,10 +159,12 @@ def create_mood_entry():
         
         # Insert into MongoDB
         result = mongo.db.mood_entries.insert_one(entry)
+        apply_entry(entry)
         
         # Add the ID to the response
         entry["id"] = str(result.inserted_id)
         del entry["_id"]
+        del entry["date_at"]
         
         # Convert datetime objects to ISO format strings
         entry["created_at"] = entry["created_at"].isoformat()
@@ -129,6 +175,114 @@ def create_mood_entry():
         print(f"ERROR: Failed to create mood entry: {str(e)}")
         return jsonify({"error": "Failed to create mood entry"}), 500
 
+@mood_bp.route('/api/mood/entries/bulk', methods=['POST'])
+@auth_required
+def create_mood_entries_bulk():
+    """
+    Create many mood entries at once (offline clients replaying their queue)
+    Body: {"entries": [{"client_id": "...", "date": ..., "mood": ..., ...}, ...]}
+    Each entry is validated like a single create; valid ones are written with one
+    unordered insert. An entry whose client_id was already imported is reported as a
+    duplicate with the id of the stored entry, so a replayed queue is not imported twice
+    """
+    # User is available from the auth_required decorator
+    user = request.user
+    user_id = user.get('id')
+    
+    data = request.get_json() or {}
+    entries = data.get('entries')
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"error": "entries must be a non-empty list"}), 400
+    if len(entries) > Config.MOOD_BULK_MAX_ENTRIES:
+        return jsonify({"error": f"At most {Config.MOOD_BULK_MAX_ENTRIES} entries per request"}), 400
+    
+    # Convert user_id to string for consistency
+    user_id_str = str(user_id)
+    now = datetime.utcnow()
+    
+    # Add the factors of the whole request to the dictionary at once, so validating
+    # each entry below finds its factor ids in memory
+    intern_factors([factor for item in entries if isinstance(item, dict) and isinstance(item.get('factors'), list)
+                    for factor in item['factors']])
+    
+    # Validate every entry; duplicates inside the request itself are caught here too
+    results = []
+    documents = []
+    seen_client_ids = {}
+    for index, item in enumerate(entries):
+        result = {"index": index}
+        results.append(result)
+        if not isinstance(item, dict):
+            result.update(status="invalid", error="Entry must be an object")
+            continue
+        client_id = item.get('client_id')
+        if client_id is not None:
+            result["client_id"] = client_id
+            if not isinstance(client_id, str) or not client_id:
+                result.update(status="invalid", error="client_id must be a non-empty string")
+                continue
+            if client_id in seen_client_ids:
+                result.update(status="duplicate", duplicate_of=seen_client_ids[client_id])
+                continue
+            seen_client_ids[client_id] = index
+        fields, error = validate_entry(item)
+        if error:
+            result.update(status="invalid", error=error)
+            continue
+        document = {
+            "user_id": user_id_str,
+            **fields,
+            "source": "manual",
+            "created_at": now,
+            "updated_at": now
+        }
+        if client_id is not None:
+            document["client_id"] = client_id
+        documents.append((result, document))
+    
+    try:
+        # One unordered insert; entries whose client_id is already stored fail alone
+        # on the unique (user_id, client_id) index and the others go through
+        failed = {}
+        if documents:
+            try:
+                mongo.db.mood_entries.insert_many([document for _, document in documents], ordered=False)
+            except BulkWriteError as e:
+                for write_error in e.details.get("writeErrors", []):
+                    if write_error.get("code") != 11000:
+                        raise
+                    failed[write_error["index"]] = write_error
+        
+        created = []
+        duplicates = {}
+        for position, (result, document) in enumerate(documents):
+            if position in failed:
+                result["status"] = "duplicate"
+                duplicates[document["client_id"]] = result
+            else:
+                result.update(status="created", id=str(document["_id"]))
+                created.append(document)
+        
+        # Point duplicates at the entries stored by the earlier import
+        if duplicates:
+            for existing in mongo.db.mood_entries.find(
+                {"user_id": user_id_str, "client_id": {"$in": list(duplicates)}}, {"client_id": 1}
+            ):
+                duplicates[existing["client_id"]].update(status="duplicate", id=str(existing["_id"]))
+        
+        apply_entries(created)
+        
+        statuses = [result["status"] for result in results]
+        return jsonify({
+            "created": statuses.count("created"),
+            "duplicates": statuses.count("duplicate"),
+            "invalid": statuses.count("invalid"),
+            "results": results
+        }), 200
+    except Exception as e:
+        print(f"ERROR: Failed to import mood entries: {str(e)}")
+        return jsonify({"error": "Failed to import mood entries"}), 500
+
 @mood_bp.route('/api/mood/entries/<entry_id>', methods=['PUT'])
 @auth_required
 def update_mood_entry(entry_id):
@@ -142,6 +296,13 @@ def update_mood_entry(entry_id):
     if not data:
         return jsonify({"error": "No data provided"}), 400
     
+    # Validate date if provided
+    if "date" in data:
+        try:
+            entry_day = parse_mood_date(data["date"])
+        except ValueError:
+            return jsonify({"error": "date must be a valid date (YYYY-MM-DD)"}), 400
+    
     # Validate mood value if provided
     if "mood" in data:
         valid_moods = ["very_happy", "happy", "neutral", "sad", "very_sad", "anxious", "angry"]
@@ -181,24 +342,41 @@ def update_mood_entry(entry_id):
         if not existing_entry:
             return jsonify({"error": "Entry not found or not authorized"}), 404
         
+        # Aggregates are computed from chat messages, only their notes can be edited
+        if is_aggregate(existing_entry) and any(field in data for field in ["date", "mood", "mood_score", "factors"]):
+            return jsonify({"error": "Only notes can be updated on chat-derived entries"}), 400
+        
         # Prepare the update data
         update_data = {}
-        for field in ["date", "mood", "mood_score", "factors", "notes"]:
+        for field in ["mood", "mood_score", "factors", "notes"]:
             if field in data:
                 update_data[field] = data[field]
+        if "factors" in data:
+            update_data["factor_ids"] = intern_factors(data["factors"])
+        if "date" in data:
+            update_data.update(date_fields(entry_day))
         
         # Add updated_at timestamp
         update_data["updated_at"] = datetime.utcnow()
         
-        # Update the entry
-        mongo.db.mood_entries.update_one(
+        # Update the entry, getting back the version it replaced
+        previous_entry = mongo.db.mood_entries.find_one_and_update(
             {"_id": object_id},
-            {"$set": update_data}
+            {"$set": update_data},
+            return_document=ReturnDocument.BEFORE
         )
+        if not previous_entry:
+            return jsonify({"error": "Entry not found or not authorized"}), 404
+        
+        # Move the entry's contribution in the daily rollups when anything counted changed
+        updated_entry = {**previous_entry, **update_data}
+        if any(field in data for field in ["date", "mood", "mood_score", "factors"]):
+            apply_entry(previous_entry, sign=-1)
+            apply_entry(updated_entry)
         
-        # Get the updated entry
-        updated_entry = mongo.db.mood_entries.find_one({"_id": object_id})
         updated_entry["id"] = str(updated_entry.pop("_id"))
+        updated_entry.pop("date_at", None)
+        expand_aggregate(updated_entry)
         
         # Convert datetime objects to ISO format strings
         if "created_at" in updated_entry and isinstance(updated_entry["created_at"], datetime):
@@ -238,8 +416,11 @@ def delete_mood_entry(entry_id):
         if not existing_entry:
             return jsonify({"error": "Entry not found or not authorized"}), 404
         
-        # Delete the entry
-        mongo.db.mood_entries.delete_one({"_id": object_id})
+        # Delete the entry and take it out of its day's rollup (only once, if two deletes race)
+        deleted_entry = mongo.db.mood_entries.find_one_and_delete({"_id": object_id})
+        if deleted_entry:
+            apply_entry(deleted_entry, sign=-1)
+            record_tombstone(user_id_str, "mood_entries", object_id)
         
         return jsonify({"message": "Entry deleted successfully"}), 200
     except Exception as e:
@@ -257,204 +438,279 @@ def get_mood_insights():
     # Get time range from query parameters
     time_range = request.args.get('timeRange', 'month')
     
-    # Calculate the start date based on time range
-    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    if time_range == 'week':
-        start_date = today - timedelta(days=7)
-        period_name = "week"
-    elif time_range == 'month':
-        start_date = today - timedelta(days=30)
-        period_name = "month"
-    elif time_range == 'year':
-        start_date = today - timedelta(days=365)
-        period_name = "year"
-    else:
-        start_date = today - timedelta(days=30)  # Default to month
-        period_name = "month"
-    
     try:
         # Convert user_id to string for consistency
         user_id_str = str(user_id)
         
-        # Query MongoDB for mood entries within the specified time range
-        entries_cursor = mongo.db.mood_entries.find({
-            "user_id": user_id_str,
-            "date": {"$gte": start_date.strftime('%Y-%m-%d')}
-        })
-        
-        entries = list(entries_cursor)
-        
-        # Calculate insights
-        # 1. Average mood score
-        if entries:
-            avg_score = sum(entry["mood_score"] for entry in entries) / len(entries)
-        else:
-            avg_score = 0
-        
-        # 2. Mood distribution
-        mood_distribution = {
-            "very_happy": 0,
-            "happy": 0,
-            "neutral": 0,
-            "sad": 0,
-            "very_sad": 0,
-            "anxious": 0,
-            "angry": 0
-        }
-        
-        for entry in entries:
-            if entry["mood"] in mood_distribution:
-                mood_distribution[entry["mood"]] += 1
-        
-        # 3. Top factors
-        factor_counts = {}
-        for entry in entries:
-            for factor in entry.get("factors", []):
-                factor_counts[factor] = factor_counts.get(factor, 0) + 1
-        
-        # Sort factors by count
-        top_factors = [
-            {"factor": factor, "count": count}
-            for factor, count in sorted(factor_counts.items(), key=lambda x: x[1], reverse=True)
-        ][:10]  # Top 10 factors
-        
-        # 4. Factor analysis
-        positive_factors = []
-        negative_factors = []
-        
-        for factor, count in factor_counts.items():
-            # Calculate average mood score for entries containing this factor
-            factor_entries = [entry for entry in entries if factor in entry.get("factors", [])]
-            if factor_entries:
-                avg_factor_score = sum(entry["mood_score"] for entry in factor_entries) / len(factor_entries)
-                
-                if avg_factor_score > 0:
-                    positive_factors.append({"factor": factor, "score": avg_factor_score})
-                else:
-                    negative_factors.append({"factor": factor, "score": avg_factor_score})
-        
-        # Sort factors by score
-        positive_factors.sort(key=lambda x: x["score"], reverse=True)
-        negative_factors.sort(key=lambda x: x["score"])
-        
-        # 5. Generate recommendations based on insights
-        recommendations = []
-        
-        if entries:
-            # Add general recommendation
-            recommendations.append(f"You've tracked your mood {len(entries)} times in the past {period_name}.")
-            
-            # Add recommendation based on average mood
-            if avg_score > 2:
-                recommendations.append("Your overall mood has been very positive. Keep up the good work!")
-            elif avg_score > 0:
-                recommendations.append("Your mood has been generally positive. Continue with activities that make you feel good.")
-            elif avg_score > -2:
-                recommendations.append("Your mood has been somewhat neutral to negative. Consider incorporating more mood-boosting activities.")
-            else:
-                recommendations.append("Your mood has been quite low. Consider reaching out to a mental health professional for support.")
-            
-            # Add recommendation based on negative factors
-            if negative_factors:
-                top_negative = negative_factors[0]["factor"]
-                recommendations.append(f"'{top_negative}' seems to be associated with lower mood scores. Consider strategies to address this factor.")
-            
-            # Add recommendation based on positive factors
-            if positive_factors:
-                top_positive = positive_factors[0]["factor"]
-                recommendations.append(f"'{top_positive}' seems to be associated with higher mood scores. Try to incorporate more of this in your routine.")
+        # Calculate the start date based on time range, in days of the user's timezone
+        today = local_today(user_timezone(user_id_str))
+        if time_range == 'week':
+            start_date = today - timedelta(days=7)
+            period_name = "week"
+        elif time_range == 'month':
+            start_date = today - timedelta(days=30)
+            period_name = "month"
+        elif time_range == 'year':
+            start_date = today - timedelta(days=365)
+            period_name = "year"
         else:
-            recommendations.append("Start tracking your mood daily to get personalized insights and recommendations.")
-        
-        # Construct the insights response
-        insights = {
-            "averageMoodScore": round(avg_score, 2),
-            "moodDistribution": mood_distribution,
-            "topFactors": top_factors,
-            "factorAnalysis": {
-                "positive": positive_factors[:5],  # Top 5 positive factors
-                "negative": negative_factors[:5]   # Top 5 negative factors
-            },
-            "recommendations": recommendations
-        }
+            start_date = today - timedelta(days=30)  # Default to month
+            period_name = "month"
+        
+        # Served from the per-user cache until the user's mood data changes (the local
+        # date in the key rolls it over at the user's midnight)
+        cache_date = today.strftime('%Y-%m-%d')
+        read_generation = insights_cache.generation(user_id_str)
+        insights = insights_cache.get(user_id_str, period_name, cache_date, read_generation)
+        if insights is not None:
+            return jsonify(insights), 200
+        
+        # Read the daily rollups of the time range (one small document per day,
+        # whatever the number of entries) and fold them into totals in one pass
+        rollups = user_rollups(user_id_str, start_date.strftime('%Y-%m-%d'))
+        
+        totals = accumulate(rollups, summarize=summarize_rollup)
+        # Factor counters are keyed by factor id, shown by label
+        insights = build_insights(name_factors(totals, factor_names(totals["factor_counts"])), period_name)
+        insights_cache.store(user_id_str, period_name, cache_date, insights, read_generation)
         
         return jsonify(insights), 200
     except Exception as e:
         print(f"ERROR: Failed to generate mood insights: {str(e)}")
         return jsonify({"error": "Failed to generate mood insights"}), 500
 
+@mood_bp.route('/api/mood/trends', methods=['GET'])
+@auth_required
+def get_mood_trends():
+    """Rolling averages, EWMA, volatility, weekday seasonality and changepoints over the last ?days"""
+    # User is available from the auth_required decorator
+    user = request.user
+    user_id = user.get('id')
+    
+    try:
+        days = int(request.args.get('days', Config.MOOD_TRENDS_DEFAULT_DAYS))
+    except ValueError:
+        return jsonify({"error": "days must be an integer"}), 400
+    if days < 1 or days > Config.MOOD_TRENDS_MAX_DAYS:
+        return jsonify({"error": f"days must be between 1 and {Config.MOOD_TRENDS_MAX_DAYS}"}), 400
+    
+    try:
+        # Convert user_id to string for consistency
+        user_id_str = str(user_id)
+        
+        # One rollup per day with entries, projected to the counts and score sums,
+        # loaded into dense per-day arrays ending on the user's local today
+        start_date = trend_start(local_today(user_timezone(user_id_str)), days)
+        rollups = user_rollups(user_id_str, start_date, fields=TREND_FIELDS)
+        counts, score_sums, score_sq_sums = daily_series(rollups, start_date, days)
+        
+        return jsonify(compute_trends(counts, score_sums, score_sq_sums, start_date)), 200
+    except Exception as e:
+        print(f"ERROR: Failed to compute mood trends: {str(e)}")
+        return jsonify({"error": "Failed to compute mood trends"}), 500
+
+@mood_bp.route('/api/mood/correlation', methods=['GET'])
+@auth_required
+def get_mood_correlation():
+    """Daily manual moods paired with chat sentiment over the last ?days, their correlation and disagreement days"""
+    # User is available from the auth_required decorator
+    user = request.user
+    user_id = user.get('id')
+    
+    try:
+        days = int(request.args.get('days', Config.MOOD_CORRELATION_DEFAULT_DAYS))
+    except ValueError:
+        return jsonify({"error": "days must be an integer"}), 400
+    if days < 1 or days > Config.MOOD_CORRELATION_MAX_DAYS:
+        return jsonify({"error": f"days must be between 1 and {Config.MOOD_CORRELATION_MAX_DAYS}"}), 400
+    
+    try:
+        # Convert user_id to string for consistency
+        user_id_str = str(user_id)
+        
+        # One aggregation returns a row per day with both sources' counts and score sums
+        start_date = trend_start(local_today(user_timezone(user_id_str)), days)
+        ensure_entry_dates(user_id_str)
+        return jsonify({"days": days, **mood_correlation(user_id_str, start_date)}), 200
+    except Exception as e:
+        print(f"ERROR: Failed to compute mood correlation: {str(e)}")
+        return jsonify({"error": "Failed to compute mood correlation"}), 500
+
+@mood_bp.route('/api/mood/heatmap', methods=['GET'])
+@auth_required
+def get_mood_heatmap():
+    """Dominant mood, mean score and entry count of every day of ?year, for the calendar view"""
+    # User is available from the auth_required decorator
+    user = request.user
+    user_id = user.get('id')
+    
+    output_format = request.args.get('format', 'days')
+    if output_format not in FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(FORMATS)}"}), 400
+    
+    try:
+        # Convert user_id to string for consistency
+        user_id_str = str(user_id)
+        this_year = local_today(user_timezone(user_id_str)).year
+        try:
+            year = int(request.args.get('year', this_year))
+        except ValueError:
+            return jsonify({"error": "year must be an integer"}), 400
+        if year < 1970 or year > this_year + 1:
+            return jsonify({"error": f"year must be between 1970 and {this_year + 1}"}), 400
+        
+        # At most one rollup per day, projected to what a calendar cell needs
+        start_date, end_date = year_range(year)
+        rollups = user_rollups(user_id_str, start_date, fields=HEATMAP_FIELDS, end_date=end_date)
+        heatmap = build_heatmap(rollups, year, output_format)
+        
+        # Clients revalidate with If-None-Match and get an empty 304 when nothing changed
+        response = jsonify(heatmap)
+        response.set_etag(heatmap_etag(heatmap))
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
+    except Exception as e:
+        print(f"ERROR: Failed to build mood heatmap: {str(e)}")
+        return jsonify({"error": "Failed to build mood heatmap"}), 500
+
+@mood_bp.route('/api/mood/factors/cooccurrence', methods=['GET'])
+@auth_required
+def get_factor_cooccurrence():
+    """Factors most often mentioned together, with the average mood of those entries"""
+    # User is available from the auth_required decorator
+    user = request.user
+    user_id = user.get('id')
+
+    # Get time range from query parameters
+    time_range = request.args.get('timeRange', 'month')
+    period_days = {"week": 7, "month": 30, "year": 365}
+    period_name = time_range if time_range in period_days else "month"  # Default to month
+
+    try:
+        # Convert user_id to string for consistency
+        user_id_str = str(user_id)
+        start_date = local_today(user_timezone(user_id_str)) - timedelta(days=period_days[period_name])
+
+        # Only the factor ids and score of each entry are read; chat aggregates do not
+        # keep which factors each message mentioned together, so they are left out
+        ensure_entry_dates(user_id_str)
+        entries_cursor = mongo.db.mood_entries.find(
+            {"user_id": user_id_str, "date_at": {"$gte": start_date}, "source": {"$ne": SOURCE_CHAT_SESSION}},
+            {"_id": 0, "factor_ids": 1, "factors": 1, "mood_score": 1}
+        )
+        factor_id_lists = []
+        scores = []
+        for entry in entries_cursor:
+            factor_id_lists.append(entry_factor_ids(entry))
+            scores.append(entry.get("mood_score", 0))
+
+        pairs = factor_pairs(factor_id_lists, scores)
+        labels = factor_labels({factor_id for pair in pairs for factor_id in pair[:2]})
+        return jsonify({
+            "period": period_name,
+            "entriesAnalyzed": len(scores),
+            "pairs": [
+                {
+                    "factors": [labels.get(first, str(first)), labels.get(second, str(second))],
+                    "factorIds": [first, second],
+                    "count": count,
+                    "averageScore": round(average_score, 2)
+                }
+                for first, second, count, average_score in pairs
+            ]
+        }), 200
+    except Exception as e:
+        print(f"ERROR: Failed to compute factor co-occurrence: {str(e)}")
+        return jsonify({"error": "Failed to compute factor co-occurrence"}), 500
+
+def _export_batches(entries_cursor, tz):
+    """Fixed-schema export rows in lists of MOOD_EXPORT_BATCH_SIZE, timestamps in tz"""
+    batch = []
+    for entry in entries_cursor:
+        batch.append(export_row(entry, tz))
+        if len(batch) >= Config.MOOD_EXPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _export_csv(entries_cursor, tz):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    try:
+        for batch in _export_batches(entries_cursor, tz):
+            for row in batch:
+                # Factors go in one cell
+                if isinstance(row["factors"], list):
+                    row["factors"] = ", ".join(str(factor) for factor in row["factors"])
+                writer.writerow(row)
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+    except Exception as e:
+        # Headers are already sent, the client gets a truncated file
+        print(f"ERROR: Mood export interrupted: {str(e)}")
+    yield output.getvalue()
+
+def _export_ndjson(entries_cursor, tz):
+    try:
+        for batch in _export_batches(entries_cursor, tz):
+            yield "".join(json.dumps(row, default=str) + "\n" for row in batch)
+    except Exception as e:
+        print(f"ERROR: Mood export interrupted: {str(e)}")
+
+def _export_json(entries_cursor, tz):
+    # A JSON array, as before, written out as it is read
+    yield "["
+    separator = ""
+    try:
+        for batch in _export_batches(entries_cursor, tz):
+            for row in batch:
+                yield separator + json.dumps(row, default=str)
+                separator = ","
+    except Exception as e:
+        print(f"ERROR: Mood export interrupted: {str(e)}")
+    yield "]"
+
+# format -> (content type, file extension, row generator)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv", _export_csv),
+    "ndjson": ("application/x-ndjson", "ndjson", _export_ndjson),
+    "json": ("application/json", "json", _export_json),
+}
+
 @mood_bp.route('/api/mood/export', methods=['GET'])
 @auth_required
 def export_mood_data():
-    """Export mood data as CSV or JSON"""
+    """Export mood data as CSV, NDJSON or JSON, streamed"""
     # User is available from the auth_required decorator
     user = request.user
     user_id = user.get('id')
     
     # Get export format
-    export_format = request.args.get('format', 'csv')
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"Invalid format. Must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
     
     try:
         # Convert user_id to string for consistency
         user_id_str = str(user_id)
         
-        # Get all mood entries for this user
+        # Timestamps are exported in the user's timezone
+        tz = user_timezone(user_id_str)
+        
+        # Get all mood entries for this user, fetched from MongoDB in batches as the
+        # response is streamed, so memory stays constant whatever the history size
+        ensure_entry_dates(user_id_str)
         entries_cursor = mongo.db.mood_entries.find({
             "user_id": user_id_str
-        }).sort("date", 1)
-        
-        entries = list(entries_cursor)
-        
-        # Prepare the data for export
-        export_data = []
-        for entry in entries:
-            # Convert ObjectId to string
-            entry["id"] = str(entry.pop("_id"))
-            
-            # Convert datetime objects to ISO format strings
-            if "created_at" in entry and isinstance(entry["created_at"], datetime):
-                entry["created_at"] = entry["created_at"].isoformat()
-            if "updated_at" in entry and isinstance(entry["updated_at"], datetime):
-                entry["updated_at"] = entry["updated_at"].isoformat()
-            
-            export_data.append(entry)
+        }).sort("date_at", 1).batch_size(Config.MOOD_EXPORT_BATCH_SIZE)
         
-        if export_format.lower() == 'json':
-            # Return as JSON
-            return jsonify(export_data), 200
-        else:
-            # Return as CSV
-            import csv
-            import io
-            
-            output = io.StringIO()
-            
-            # Get all possible fields
-            fields = set()
-            for entry in export_data:
-                fields.update(entry.keys())
-            
-            # Sort fields for consistency
-            sorted_fields = sorted(list(fields))
-            
-            # Write CSV header
-            writer = csv.DictWriter(output, fieldnames=sorted_fields)
-            writer.writeheader()
-            
-            # Write data rows
-            for entry in export_data:
-                # Convert factors list to string
-                if "factors" in entry and isinstance(entry["factors"], list):
-                    entry["factors"] = ", ".join(entry["factors"])
-                writer.writerow(entry)
-            
-            # Prepare response
-            csv_data = output.getvalue()
-            response = jsonify({"data": csv_data})
-            response.headers["Content-Type"] = "text/csv"
-            response.headers["Content-Disposition"] = "attachment; filename=mood_data.csv"
-            
-            return response
+        content_type, extension, generate = EXPORT_FORMATS[export_format]
+        response = Response(stream_with_context(generate(entries_cursor, tz)), mimetype=content_type)
+        response.headers["Content-Disposition"] = f"attachment; filename=mood_data.{extension}"
+        return response
     except Exception as e:
         print(f"ERROR: Failed to export mood data: {str(e)}")
         return jsonify({"error": "Failed to export mood data"}), 500
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""
+How a user's manual moods agree with the sentiment of their chats
+One aggregation over mood_entries returns, per day, the count and score sum of the
+manual entries and of the chat-derived ones. Chat moods are read from the per-session
+daily aggregates (count and score_sum) where they exist and from legacy per-message
+entries otherwise, so each day is a single small row and no entry leaves MongoDB.
+The paired series, their correlation and the days they disagree are derived from those rows
+"""
+from datetime import datetime
+import numpy as np
+from config import Config
+from extensions import mongo
+from mood_store import DATE_FORMAT, SOURCE_CHAT_MESSAGE, SOURCE_CHAT_SESSION, SOURCE_MANUAL
+
+# Fewer days with both sources than this give no correlation
+MIN_PAIRED_DAYS = 3
+
+def daily_sources_pipeline(user_id_str, start_date):
+    """Per-day (date, manual_count, manual_sum, chat_count, chat_sum) rows from start_date on, oldest first"""
+    source = {"$ifNull": ["$source", SOURCE_MANUAL]}
+    is_aggregate = {"$eq": [source, SOURCE_CHAT_SESSION]}
+    is_chat = {"$in": [source, [SOURCE_CHAT_SESSION, SOURCE_CHAT_MESSAGE]]}
+    count = {"$cond": [is_aggregate, {"$ifNull": ["$count", 0]}, 1]}
+    score_sum = {"$cond": [is_aggregate, {"$ifNull": ["$score_sum", 0]}, {"$ifNull": ["$mood_score", 0]}]}
+    return [
+        {"$match": {"user_id": user_id_str, "date_at": {"$gte": datetime.strptime(start_date, DATE_FORMAT)}}},
+        {"$group": {
+            "_id": "$date",
+            "manual_count": {"$sum": {"$cond": [is_chat, 0, count]}},
+            "manual_sum": {"$sum": {"$cond": [is_chat, 0, score_sum]}},
+            "chat_count": {"$sum": {"$cond": [is_chat, count, 0]}},
+            "chat_sum": {"$sum": {"$cond": [is_chat, score_sum, 0]}},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+
+def _pearson(x, y):
+    if len(x) < MIN_PAIRED_DAYS or np.std(x) == 0 or np.std(y) == 0:
+        return None
+    return float(np.corrcoef(x, y)[0, 1])
+
+def _ranks(values):
+    """Ranks from 1, ties sharing their average rank"""
+    order = np.argsort(values, kind="stable")
+    ranks = np.empty(len(values))
+    ranks[order] = np.arange(1, len(values) + 1)
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse, weights=ranks)
+    return sums[inverse] / counts[inverse]
+
+def _round(value, digits=2):
+    return None if value is None else round(value, digits)
+
+def correlate(rows, disagreement_threshold=None):
+    """
+    Paired series, correlation and disagreement days for the rows of daily_sources_pipeline
+    A day is paired when it has both a manual and a chat mood; it is a disagreement day
+    when their daily averages differ by at least disagreement_threshold
+    """
+    threshold = disagreement_threshold or Config.MOOD_CORRELATION_DISAGREEMENT
+    series = []
+    for row in rows:
+        manual_count, chat_count = row["manual_count"], row["chat_count"]
+        series.append({
+            "date": row["_id"],
+            "manual": _round(row["manual_sum"] / manual_count) if manual_count else None,
+            "manualCount": manual_count,
+            "chat": _round(row["chat_sum"] / chat_count) if chat_count else None,
+            "chatCount": chat_count,
+        })
+
+    paired = [day for day in series if day["manual"] is not None and day["chat"] is not None]
+    manual = np.array([day["manual"] for day in paired], dtype=np.float64)
+    chat = np.array([day["chat"] for day in paired], dtype=np.float64)
+    differences = manual - chat
+    disagreements = [
+        {**day, "difference": _round(day["manual"] - day["chat"])}
+        for day, difference in zip(paired, differences) if abs(difference) >= threshold
+    ]
+    disagreements.sort(key=lambda day: abs(day["difference"]), reverse=True)
+
+    return {
+        "series": series,
+        "pairedDays": len(paired),
+        "manualDays": sum(1 for day in series if day["manual"] is not None),
+        "chatDays": sum(1 for day in series if day["chat"] is not None),
+        "pearson": _round(_pearson(manual, chat), 3),
+        "spearman": _round(_pearson(_ranks(manual), _ranks(chat)) if len(paired) else None, 3),
+        # Positive when users rate their mood higher than their chats sound
+        "meanDifference": _round(float(differences.mean())) if len(paired) else None,
+        "meanAbsoluteDifference": _round(float(np.abs(differences).mean())) if len(paired) else None,
+        "disagreementThreshold": threshold,
+        "agreementRate": _round(1 - len(disagreements) / len(paired), 3) if paired else None,
+        "disagreementDays": disagreements,
+    }
+
+def mood_correlation(user_id_str, start_date):
+    """Manual versus chat mood agreement for a user from start_date (YYYY-MM-DD) on"""
+    rows = mongo.db.mood_entries.aggregate(daily_sources_pipeline(user_id_str, start_date))
+    return {"start": start_date, **correlate(rows)}
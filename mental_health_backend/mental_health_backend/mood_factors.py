@@ -0,0 +1,168 @@
+"""
+Canonical dictionary of mood factors with compact integer ids
+Factors are free text, from the sentiment analysis of chat messages and from users.
+canonical_key() reduces a factor to its words (folded, singular, synonyms merged,
+function words dropped, order ignored), so "work stress", "Work Stress" and
+"stress at work" are one factor. Each canonical factor gets an integer id in the
+mood_factors collection; entries store the ids (factor_ids) and every counter
+(aggregates, daily rollups) is keyed by id, turned back into labels for display
+The dictionary is shared by all users and kept in memory by every worker once read
+"""
+import threading
+from datetime import datetime
+import numpy as np
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError
+from extensions import mongo
+from text_utils import tokenize
+
+# Words that do not change what a factor is about
+FACTOR_STOPWORDS = {
+    "a", "an", "the", "at", "of", "my", "with", "about", "in", "on", "to", "for", "from",
+    "and", "or", "due", "some", "too", "much", "very", "being", "feeling", "feel",
+}
+
+# Words folded onto the one the factor is counted under (after singularization)
+FACTOR_SYNONYMS = {
+    "job": "work", "office": "work", "career": "work", "workplace": "work", "boss": "work",
+    "coworker": "work", "colleague": "work", "deadline": "work",
+    "stressed": "stress", "stressful": "stress", "pressure": "stress", "overwhelmed": "stress",
+    "sleeping": "sleep", "insomnia": "sleep", "sleepless": "sleep",
+    "mom": "family", "mum": "family", "mother": "family", "dad": "family", "father": "family",
+    "parent": "family", "sibling": "family", "brother": "family", "sister": "family",
+    "partner": "relationship", "boyfriend": "relationship", "girlfriend": "relationship",
+    "husband": "relationship", "wife": "relationship", "spouse": "relationship",
+    "breakup": "relationship", "dating": "relationship",
+    "lonely": "loneliness", "isolation": "loneliness", "isolated": "loneliness", "alone": "loneliness",
+    "exam": "school", "study": "school", "university": "school", "college": "school", "homework": "school",
+    "finance": "money", "financial": "money", "debt": "money", "bill": "money", "rent": "money",
+    "illness": "health", "sick": "health", "sickness": "health",
+    "anxious": "anxiety", "worry": "anxiety", "worried": "anxiety", "nervous": "anxiety",
+    "friendship": "friend",
+    "workout": "exercise", "gym": "exercise", "sport": "exercise",
+}
+
+# canonical key -> id and id -> label, for every factor this worker has seen
+_ids = {}
+_labels = {}
+_lock = threading.Lock()
+
+def _singular(token):
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+def canonical_key(factor):
+    """The canonical form of a factor, or None if nothing meaningful is left"""
+    tokens = set()
+    for token in tokenize(str(factor)):
+        if token in FACTOR_STOPWORDS:
+            continue
+        token = _singular(token)
+        tokens.add(FACTOR_SYNONYMS.get(token, token))
+    return " ".join(sorted(tokens)) or None
+
+def _label(factor):
+    """How a newly seen factor is displayed: its first spelling, lowercased"""
+    return " ".join(str(factor).casefold().split())
+
+def _remember(documents):
+    with _lock:
+        for document in documents:
+            _ids[document["key"]] = document["_id"]
+            _labels[document["_id"]] = document["label"]
+
+def intern_factors(factors):
+    """
+    Integer ids of free-text factors, in order and without repeats
+    Factors not in the dictionary yet are added to it
+    """
+    labels = {}
+    for factor in factors or []:
+        if factor is None:
+            continue
+        key = canonical_key(factor)
+        if key and key not in labels:
+            labels[key] = _label(factor)
+    if not labels:
+        return []
+
+    with _lock:
+        missing = [key for key in labels if key not in _ids]
+    if missing:
+        _remember(mongo.db.mood_factors.find({"key": {"$in": missing}}))
+        with _lock:
+            missing = [key for key in missing if key not in _ids]
+    if missing:
+        # Reserve a block of ids, then insert; a worker that adds the same factor
+        # concurrently loses on the unique key and reads the other one's id back
+        counter = mongo.db.counters.find_one_and_update(
+            {"_id": "mood_factors"}, {"$inc": {"seq": len(missing)}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        first_id = counter["seq"] - len(missing) + 1
+        now = datetime.utcnow()
+        try:
+            mongo.db.mood_factors.insert_many([
+                {"_id": first_id + offset, "key": key, "label": labels[key], "created_at": now}
+                for offset, key in enumerate(missing)
+            ], ordered=False)
+        except BulkWriteError as e:
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+        _remember(mongo.db.mood_factors.find({"key": {"$in": missing}}))
+
+    with _lock:
+        return [_ids[key] for key in labels]
+
+def factor_labels(factor_ids):
+    """{id: label} for factor ids; unknown ids are left out"""
+    factor_ids = {int(factor_id) for factor_id in factor_ids}
+    with _lock:
+        missing = [factor_id for factor_id in factor_ids if factor_id not in _labels]
+    if missing:
+        _remember(mongo.db.mood_factors.find({"_id": {"$in": missing}}))
+    with _lock:
+        return {factor_id: _labels[factor_id] for factor_id in factor_ids if factor_id in _labels}
+
+def factor_names(keys):
+    """
+    {key: label} for the keys of factor counters (ids as strings)
+    Keys written before factors had ids are factor names already and map to themselves
+    """
+    labels = factor_labels(key for key in keys if str(key).isdigit())
+    return {key: labels.get(int(key), key) if str(key).isdigit() else key for key in keys}
+
+def factor_pairs(factor_id_lists, scores, limit=20):
+    """
+    The pairs of factors most often mentioned together, as (first id, second id, count,
+    average mood score), from one list of factor ids and one score per entry
+    Pairs are encoded as single integers and counted with np.unique
+    """
+    firsts, seconds, pair_scores = [], [], []
+    for factor_ids, score in zip(factor_id_lists, scores):
+        factor_ids = np.unique(np.asarray(factor_ids, dtype=np.int64))
+        if len(factor_ids) < 2:
+            continue
+        left, right = np.triu_indices(len(factor_ids), k=1)
+        firsts.append(factor_ids[left])
+        seconds.append(factor_ids[right])
+        pair_scores.append(np.full(len(left), float(score)))
+    if not firsts:
+        return []
+    first = np.concatenate(firsts)
+    second = np.concatenate(seconds)
+    width = int(second.max()) + 1
+    codes, inverse, counts = np.unique(first * width + second, return_inverse=True, return_counts=True)
+    score_sums = np.bincount(inverse, weights=np.concatenate(pair_scores))
+    top = np.argsort(-counts, kind="stable")[:limit]
+    return [
+        (int(codes[i] // width), int(codes[i] % width), int(counts[i]), float(score_sums[i] / counts[i]))
+        for i in top
+    ]
+
+def ensure_factor_indexes():
+    """One dictionary entry per canonical key"""
+    mongo.db.mood_factors.create_index([("key", ASCENDING)], unique=True)
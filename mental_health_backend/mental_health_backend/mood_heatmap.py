@@ -0,0 +1,87 @@
+"""
+Compact year calendar of a user's moods
+One small record per day with entries, read from the daily rollups (mood_daily):
+the dominant mood as an integer code (its index in VALID_MOODS), the mean score and
+the number of entries. "packed" lays the same values out as dense per-day arrays for
+the whole year. The ETag is a digest of the payload, so an unchanged calendar costs a
+304 and no body
+"""
+import hashlib
+import json
+from datetime import datetime
+from mood_store import DATE_FORMAT, VALID_MOODS
+
+FORMATS = ("days", "packed")
+
+HEATMAP_FIELDS = {"_id": 0, "date": 1, "count": 1, "score_sum": 1, "mood_counts": 1}
+
+# Code of days whose moods are all outside VALID_MOODS, and of days without entries (packed)
+UNKNOWN_MOOD = -1
+
+_MOOD_CODES = {mood: code for code, mood in enumerate(VALID_MOODS)}
+
+def year_range(year):
+    """First and last day (YYYY-MM-DD) of a year"""
+    return f"{year:04d}-01-01", f"{year:04d}-12-31"
+
+def dominant_mood(mood_counts):
+    """Code of the most frequent mood; ties go to the mood listed first in VALID_MOODS"""
+    best, best_count = UNKNOWN_MOOD, 0
+    for mood, count in mood_counts.items():
+        code = _MOOD_CODES.get(mood, UNKNOWN_MOOD)
+        if code == UNKNOWN_MOOD or count <= 0:
+            continue
+        if count > best_count or (count == best_count and code < best):
+            best, best_count = code, count
+    return best
+
+def heatmap_days(rollups):
+    """[date, mood code, mean score, count] for every rollup with entries, oldest first"""
+    days = []
+    for rollup in rollups:
+        count = rollup.get("count", 0)
+        if count <= 0:
+            continue
+        days.append([
+            rollup["date"],
+            dominant_mood(rollup.get("mood_counts", {})),
+            round(rollup.get("score_sum", 0.0) / count, 2),
+            count,
+        ])
+    return days
+
+def pack(days, year):
+    """Dense arrays with one slot per day of the year (index 0 is January 1st)"""
+    first = datetime(year, 1, 1)
+    length = (datetime(year + 1, 1, 1) - first).days
+    moods = [UNKNOWN_MOOD] * length
+    scores = [None] * length
+    counts = [0] * length
+    for date, mood, score, count in days:
+        index = (datetime.strptime(date, DATE_FORMAT) - first).days
+        if 0 <= index < length:
+            moods[index], scores[index], counts[index] = mood, score, count
+    return {"mood": moods, "score": scores, "count": counts}
+
+def build_heatmap(rollups, year, output_format="days"):
+    """The heatmap response for a year's rollups"""
+    days = heatmap_days(rollups)
+    heatmap = {
+        "year": year,
+        "format": output_format,
+        "moods": VALID_MOODS,
+        "unknownMood": UNKNOWN_MOOD,
+        "daysWithEntries": len(days),
+    }
+    if output_format == "packed":
+        heatmap["start"] = year_range(year)[0]
+        heatmap.update(pack(days, year))
+    else:
+        heatmap["fields"] = ["date", "mood", "score", "count"]
+        heatmap["days"] = days
+    return heatmap
+
+def heatmap_etag(heatmap):
+    """Digest of a heatmap response"""
+    body = json.dumps(heatmap, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(body.encode("utf-8")).hexdigest()
@@ -0,0 +1,112 @@
+"""
+Mood insights computed in a single pass over mood entries or daily rollups
+accumulate() folds every document (manual entry or chat aggregate, see mood_store, or
+mood_daily rollup, see mood_rollups) into running totals per mood and per factor, and
+build_insights() turns those totals into the /api/mood/insights response; nothing
+rescans the entries per factor
+"""
+from mood_store import VALID_MOODS, summarize_entry
+
+def empty_totals():
+    return {
+        "count": 0,
+        "score_sum": 0.0,
+        "moods": {mood: 0 for mood in VALID_MOODS},
+        "factor_counts": {},
+        "factor_score_sums": {},
+    }
+
+def accumulate(entries, totals=None, summarize=summarize_entry):
+    """
+    Add entries to running totals (a new set of totals if none is given)
+    summarize reduces a document to the summarize_entry() tuple, e.g. summarize_rollup for mood_daily
+    """
+    totals = totals or empty_totals()
+    moods = totals["moods"]
+    factor_counts = totals["factor_counts"]
+    factor_score_sums = totals["factor_score_sums"]
+    for entry in entries:
+        count, score_sum, mood_counts, entry_factor_counts, entry_factor_scores = summarize(entry)
+        totals["count"] += count
+        totals["score_sum"] += score_sum
+        for mood, mood_count in mood_counts.items():
+            if mood in moods:
+                moods[mood] += mood_count
+        for factor, factor_count in entry_factor_counts.items():
+            factor_counts[factor] = factor_counts.get(factor, 0) + factor_count
+        for factor, factor_score in entry_factor_scores.items():
+            factor_score_sums[factor] = factor_score_sums.get(factor, 0.0) + factor_score
+    return totals
+
+def name_factors(totals, names):
+    """Re-key the factor counters of totals with names[key] (see mood_factors.factor_names), merging equal names"""
+    for field in ("factor_counts", "factor_score_sums"):
+        named = {}
+        for key, value in totals[field].items():
+            name = names.get(key, key)
+            named[name] = named.get(name, 0) + value
+        totals[field] = named
+    return totals
+
+def build_insights(totals, period_name):
+    """The insights response for accumulated totals"""
+    total_count = totals["count"]
+    factor_counts = totals["factor_counts"]
+    factor_score_sums = totals["factor_score_sums"]
+
+    # 1. Average mood score
+    avg_score = totals["score_sum"] / total_count if total_count else 0
+
+    # 2. Top factors (rollup counters of deleted entries stay behind at zero)
+    top_factors = [
+        {"factor": factor, "count": count}
+        for factor, count in sorted(factor_counts.items(), key=lambda x: x[1], reverse=True)
+        if count > 0
+    ][:10]  # Top 10 factors
+
+    # 3. Factor analysis: average mood score of the entries mentioning each factor
+    positive_factors = []
+    negative_factors = []
+    for factor, count in factor_counts.items():
+        if count > 0:
+            avg_factor_score = factor_score_sums.get(factor, 0.0) / count
+            if avg_factor_score > 0:
+                positive_factors.append({"factor": factor, "score": avg_factor_score})
+            else:
+                negative_factors.append({"factor": factor, "score": avg_factor_score})
+    positive_factors.sort(key=lambda x: x["score"], reverse=True)
+    negative_factors.sort(key=lambda x: x["score"])
+
+    # 4. Recommendations based on the insights
+    recommendations = []
+    if total_count:
+        recommendations.append(f"You've tracked your mood {total_count} times in the past {period_name}.")
+
+        if avg_score > 2:
+            recommendations.append("Your overall mood has been very positive. Keep up the good work!")
+        elif avg_score > 0:
+            recommendations.append("Your mood has been generally positive. Continue with activities that make you feel good.")
+        elif avg_score > -2:
+            recommendations.append("Your mood has been somewhat neutral to negative. Consider incorporating more mood-boosting activities.")
+        else:
+            recommendations.append("Your mood has been quite low. Consider reaching out to a mental health professional for support.")
+
+        if negative_factors:
+            top_negative = negative_factors[0]["factor"]
+            recommendations.append(f"'{top_negative}' seems to be associated with lower mood scores. Consider strategies to address this factor.")
+        if positive_factors:
+            top_positive = positive_factors[0]["factor"]
+            recommendations.append(f"'{top_positive}' seems to be associated with higher mood scores. Try to incorporate more of this in your routine.")
+    else:
+        recommendations.append("Start tracking your mood daily to get personalized insights and recommendations.")
+
+    return {
+        "averageMoodScore": round(avg_score, 2),
+        "moodDistribution": dict(totals["moods"]),
+        "topFactors": top_factors,
+        "factorAnalysis": {
+            "positive": positive_factors[:5],  # Top 5 positive factors
+            "negative": negative_factors[:5]   # Top 5 negative factors
+        },
+        "recommendations": recommendations
+    }
@@ -0,0 +1,222 @@
+"""
+Population-level mood aggregates for operators
+Daily and weekly (weeks start on Monday) statistics across all users are computed
+inside MongoDB from the per-user daily rollups (mood_daily) and written to the
+mood_population collection with $merge; no mood document is loaded into Python.
+Each run only recomputes the days whose rollups changed since the previous run
+(mood_daily.updated_at), and the weeks containing them
+
+Aggregates are k-anonymous: a day or week with fewer than MOOD_POPULATION_MIN_USERS
+users is kept only as suppressed (no statistics), and a mood or factor is listed only
+if at least that many distinct users reported it in the period
+Refreshed by aggregate_mood_population.py (run it from cron), read by the admin endpoint
+"""
+from datetime import datetime, timedelta
+from pymongo import ASCENDING
+from config import Config
+from extensions import mongo
+from mood_factors import factor_names
+from mood_store import DATE_FORMAT
+
+PERIODS = ("day", "week")
+
+# Rollups written this close to the previous run are read again, in case their write
+# committed after that run looked
+OVERLAP = timedelta(minutes=5)
+
+# Days recomputed per aggregation, to keep the $in lists small; whole weeks, so no
+# week is split across two aggregations
+DATES_PER_PIPELINE = 52 * 7
+
+STATE_ID = "mood_population"
+
+def week_start(date):
+    """The Monday (YYYY-MM-DD) of the week of a YYYY-MM-DD date"""
+    day = datetime.strptime(date, DATE_FORMAT)
+    return (day - timedelta(days=day.weekday())).strftime(DATE_FORMAT)
+
+def _bucket(period):
+    if period == "day":
+        return "$date"
+    return {"$dateToString": {"format": "%Y-%m-%d", "date": {"$dateTrunc": {
+        "date": {"$dateFromString": {"dateString": "$date", "format": "%Y-%m-%d"}},
+        "unit": "week", "startOfWeek": "monday",
+    }}}}
+
+def _source_stages(period, dates):
+    return [
+        {"$match": {"date": {"$in": dates}, "count": {"$gt": 0}}},
+        {"$addFields": {"bucket": _bucket(period)}},
+    ]
+
+def totals_pipeline(period, dates, run_at, min_users=None):
+    """Users, entries and scores per period, replacing the period's document"""
+    min_users = min_users or Config.MOOD_POPULATION_MIN_USERS
+    suppressed = {"$lt": ["$users", min_users]}
+
+    def unless_suppressed(value):
+        return {"$cond": [suppressed, None, value]}
+
+    mean = {"$divide": ["$score_sum", "$entries"]}
+    return _source_stages(period, dates) + [
+        # One row per user first, so every user counts once per period
+        {"$group": {
+            "_id": {"bucket": "$bucket", "user_id": "$user_id"},
+            "count": {"$sum": "$count"},
+            "score_sum": {"$sum": "$score_sum"},
+            "score_sq_sum": {"$sum": "$score_sq_sum"},
+        }},
+        {"$group": {
+            "_id": "$_id.bucket",
+            "users": {"$sum": 1},
+            "entries": {"$sum": "$count"},
+            "score_sum": {"$sum": "$score_sum"},
+            "score_sq_sum": {"$sum": "$score_sq_sum"},
+            "user_mean_sum": {"$sum": {"$divide": ["$score_sum", "$count"]}},
+        }},
+        {"$project": {
+            "_id": {"period": period, "start": "$_id"},
+            "period": period,
+            "start": "$_id",
+            "suppressed": suppressed,
+            "users": unless_suppressed("$users"),
+            "entries": unless_suppressed("$entries"),
+            "average_score": unless_suppressed({"$round": [mean, 2]}),
+            "score_stddev": unless_suppressed({"$round": [{"$sqrt": {"$max": [0, {"$subtract": [
+                {"$divide": ["$score_sq_sum", "$entries"]}, {"$pow": [mean, 2]}
+            ]}]}}, 2]}),
+            # Average of the users' own averages, so frequent loggers do not dominate
+            "average_user_score": unless_suppressed({"$round": [{"$divide": ["$user_mean_sum", "$users"]}, 2]}),
+            "moods": [],
+            "factors": [],
+            "computed_at": {"$literal": run_at},
+        }},
+        {"$merge": {"into": "mood_population", "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+def counters_pipeline(period, dates, counts_field, target, score_sums_field=None, min_users=None, limit=None):
+    """
+    The most reported keys of a rollup counter (mood_counts, factor_counts) per period,
+    each with its count, distinct users and average score, set as `target` on the
+    period's document; keys reported by fewer than min_users users are left out
+    """
+    min_users = min_users or Config.MOOD_POPULATION_MIN_USERS
+    limit = limit or Config.MOOD_POPULATION_TOP_FACTORS
+    score = 0
+    if score_sums_field:
+        # The score sum stored under the same key as the count
+        score = {"$let": {
+            "vars": {"match": {"$arrayElemAt": [{"$filter": {
+                "input": {"$objectToArray": {"$ifNull": [f"${score_sums_field}", {}]}},
+                "cond": {"$eq": ["$$this.k", "$$counter.k"]},
+            }}, 0]}},
+            "in": {"$ifNull": ["$$match.v", 0]},
+        }}
+    return _source_stages(period, dates) + [
+        {"$project": {"bucket": 1, "user_id": 1, "item": {"$map": {
+            "input": {"$objectToArray": {"$ifNull": [f"${counts_field}", {}]}},
+            "as": "counter",
+            "in": {"k": "$$counter.k", "v": "$$counter.v", "score": score},
+        }}}},
+        {"$unwind": "$item"},
+        {"$group": {
+            "_id": {"bucket": "$bucket", "key": "$item.k", "user_id": "$user_id"},
+            "count": {"$sum": "$item.v"},
+            "score_sum": {"$sum": "$item.score"},
+        }},
+        {"$match": {"count": {"$gt": 0}}},
+        {"$group": {
+            "_id": {"bucket": "$_id.bucket", "key": "$_id.key"},
+            "users": {"$sum": 1},
+            "count": {"$sum": "$count"},
+            "score_sum": {"$sum": "$score_sum"},
+        }},
+        {"$match": {"users": {"$gte": min_users}}},
+        {"$sort": {"count": -1, "_id.key": 1}},
+        {"$group": {
+            "_id": "$_id.bucket",
+            "items": {"$push": {
+                "key": "$_id.key",
+                "count": "$count",
+                "users": "$users",
+                **({"average_score": {"$round": [{"$divide": ["$score_sum", "$count"]}, 2]}}
+                   if score_sums_field else {}),
+            }},
+        }},
+        {"$project": {"_id": {"period": period, "start": "$_id"}, target: {"$slice": ["$items", limit]}}},
+        {"$merge": {"into": "mood_population", "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}},
+    ]
+
+def changed_days(since=None):
+    """Dates (YYYY-MM-DD) with a rollup written at or after since (every date if None), oldest first"""
+    pipeline = [{"$match": {"updated_at": {"$gte": since}}}] if since else []
+    pipeline.append({"$group": {"_id": "$date"}})
+    dates = []
+    for row in mongo.db.mood_daily.aggregate(pipeline, allowDiskUse=True):
+        try:
+            datetime.strptime(str(row["_id"]), DATE_FORMAT)
+        except ValueError:
+            continue
+        dates.append(row["_id"])
+    return sorted(dates)
+
+def refresh_period(period, dates, run_at):
+    """Recompute the aggregates of a period over the given dates; returns the periods written"""
+    starts = sorted({date if period == "day" else week_start(date) for date in dates})
+    if period == "week":
+        dates = [(datetime.strptime(start, DATE_FORMAT) + timedelta(days=offset)).strftime(DATE_FORMAT)
+                 for start in starts for offset in range(7)]
+    for i in range(0, len(dates), DATES_PER_PIPELINE):
+        chunk = dates[i:i + DATES_PER_PIPELINE]
+        # Totals first: they replace the document the counters are merged into
+        mongo.db.mood_daily.aggregate(totals_pipeline(period, chunk, run_at), allowDiskUse=True)
+        mongo.db.mood_daily.aggregate(counters_pipeline(period, chunk, "mood_counts", "moods"), allowDiskUse=True)
+        mongo.db.mood_daily.aggregate(
+            counters_pipeline(period, chunk, "factor_counts", "factors", score_sums_field="factor_score_sums"),
+            allowDiskUse=True
+        )
+    # Periods left without any entry were not rewritten by this run
+    mongo.db.mood_population.delete_many({"period": period, "start": {"$in": starts}, "computed_at": {"$lt": run_at}})
+    return len(starts)
+
+def refresh(full=False, now=None):
+    """
+    Bring mood_population up to date with the rollups changed since the last run (all of
+    them if full); returns {"days", "weeks", "since"}
+    """
+    run_at = now or datetime.utcnow()
+    state = mongo.db.mood_population_state.find_one({"_id": STATE_ID})
+    since = None if full or not state else state["processed_until"] - OVERLAP
+    dates = changed_days(since)
+    result = {
+        "since": since,
+        "days": refresh_period("day", dates, run_at) if dates else 0,
+        "weeks": refresh_period("week", dates, run_at) if dates else 0,
+    }
+    mongo.db.mood_population_state.update_one(
+        {"_id": STATE_ID},
+        {"$set": {"processed_until": run_at, "last_days": result["days"], "last_weeks": result["weeks"]}},
+        upsert=True
+    )
+    return result
+
+def population_report(period="week", since=None, until=None):
+    """
+    Aggregates of a period (day or week) starting between since and until (YYYY-MM-DD),
+    oldest first; factor keys are replaced by their labels
+    """
+    query = {"period": period}
+    if since or until:
+        query["start"] = {**({"$gte": since} if since else {}), **({"$lte": until} if until else {})}
+    rows = list(mongo.db.mood_population.find(query, {"_id": 0}).sort("start", 1))
+    names = factor_names({item["key"] for row in rows for item in row.get("factors", [])})
+    for row in rows:
+        for item in row.get("factors", []):
+            item["factor"] = names.get(item["key"], item["key"])
+    state = mongo.db.mood_population_state.find_one({"_id": STATE_ID}) or {}
+    return {"period": period, "rows": rows, "processed_until": state.get("processed_until")}
+
+def ensure_population_indexes():
+    """Changed rollups by write time, and the report by period and start"""
+    mongo.db.mood_daily.create_index([("updated_at", ASCENDING)])
+    mongo.db.mood_population.create_index([("period", ASCENDING), ("start", ASCENDING)])
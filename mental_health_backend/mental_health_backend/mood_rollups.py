@@ -0,0 +1,169 @@
+"""
+Daily mood rollups
+One mood_daily document per (user_id, date) holds what the insights need from that
+day's mood entries: count, score sum, sum of squared scores, mood histogram and
+factor counts and score sums. Every write to mood_entries applies its difference to
+the day's rollup with a single $inc upsert, so insights read at most one small
+document per day instead of every entry
+Users whose rollups were never built (entries older than this module) are rebuilt
+from mood_entries on their first read, or in bulk with rebuild_mood_rollups.py
+"""
+from datetime import datetime
+from pymongo import ASCENDING, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from extensions import mongo
+from insights_cache import invalidate as invalidate_insights
+from mood_store import field_key, square_sum, summarize_entry
+
+ROLLUP_FIELDS = {
+    "_id": 0, "date": 1, "count": 1, "score_sum": 1, "score_sq_sum": 1,
+    "mood_counts": 1, "factor_counts": 1, "factor_score_sums": 1,
+}
+
+def rollup_update(summary, score_sq_sum, sign=1, now=None):
+    """$inc that adds (sign=1) or removes (sign=-1) a summary (see summarize_entry) from a rollup"""
+    count, score_sum, mood_counts, factor_counts, factor_score_sums = summary
+    inc = {
+        "count": sign * count,
+        "score_sum": sign * float(score_sum),
+        "score_sq_sum": sign * float(score_sq_sum),
+    }
+    for mood, mood_count in mood_counts.items():
+        inc[f"mood_counts.{field_key(mood)}"] = sign * mood_count
+    for factor, factor_count in factor_counts.items():
+        inc[f"factor_counts.{field_key(factor)}"] = sign * factor_count
+    for factor, factor_score in factor_score_sums.items():
+        inc[f"factor_score_sums.{field_key(factor)}"] = sign * float(factor_score)
+    return {"$inc": inc, "$set": {"updated_at": now or datetime.utcnow()}}
+
+def apply_entry(entry, sign=1):
+    """Add (sign=1) or remove (sign=-1) a mood entry from its day's rollup"""
+    if not entry.get("user_id") or not entry.get("date"):
+        return
+    day = {"user_id": str(entry["user_id"]), "date": entry["date"]}
+    mongo.db.mood_daily.update_one(
+        day,
+        rollup_update(summarize_entry(entry), square_sum(entry), sign=sign),
+        upsert=True
+    )
+    if sign < 0:
+        # The day's last entry is gone; a concurrent $inc leaves the count above zero
+        mongo.db.mood_daily.delete_one({**day, "count": {"$lte": 0}})
+    invalidate_insights(entry["user_id"])
+
+def apply_entries(entries):
+    """Add new mood entries to their days' rollups, one $inc per (user, date) in a single bulk write"""
+    days = {}
+    for entry in entries:
+        if not entry.get("user_id") or not entry.get("date"):
+            continue
+        day = days.setdefault((str(entry["user_id"]), entry["date"]), [0, 0.0, {}, {}, {}, 0.0])
+        count, score_sum, mood_counts, factor_counts, factor_score_sums = summarize_entry(entry)
+        day[0] += count
+        day[1] += score_sum
+        for target, values in ((day[2], mood_counts), (day[3], factor_counts), (day[4], factor_score_sums)):
+            for key, value in values.items():
+                target[key] = target.get(key, 0) + value
+        day[5] += square_sum(entry)
+    if not days:
+        return
+    now = datetime.utcnow()
+    mongo.db.mood_daily.bulk_write([
+        UpdateOne({"user_id": user_id, "date": date}, rollup_update(tuple(day[:5]), day[5], now=now), upsert=True)
+        for (user_id, date), day in days.items()
+    ], ordered=False)
+    for user_id in {user_id for user_id, _ in days}:
+        invalidate_insights(user_id)
+
+def summarize_rollup(rollup):
+    """A rollup in the (count, score_sum, mood_counts, factor_counts, factor_score_sums) form of summarize_entry"""
+    return (
+        rollup.get("count", 0),
+        rollup.get("score_sum", 0.0),
+        rollup.get("mood_counts", {}),
+        rollup.get("factor_counts", {}),
+        rollup.get("factor_score_sums", {}),
+    )
+
+def build_user_rollups(user_id_str):
+    """Rollup documents for a user computed from scratch from mood_entries"""
+    now = datetime.utcnow()
+    days = {}
+    for entry in mongo.db.mood_entries.find({"user_id": user_id_str}):
+        if not entry.get("date"):
+            continue
+        rollup = days.setdefault(entry["date"], {
+            "user_id": user_id_str, "date": entry["date"], "count": 0, "score_sum": 0.0, "score_sq_sum": 0.0,
+            "mood_counts": {}, "factor_counts": {}, "factor_score_sums": {}, "updated_at": now,
+        })
+        count, score_sum, mood_counts, factor_counts, factor_score_sums = summarize_entry(entry)
+        rollup["count"] += count
+        rollup["score_sum"] += score_sum
+        rollup["score_sq_sum"] += square_sum(entry)
+        for target, values in ((rollup["mood_counts"], mood_counts), (rollup["factor_counts"], factor_counts),
+                               (rollup["factor_score_sums"], factor_score_sums)):
+            for key, value in values.items():
+                key = field_key(key)
+                target[key] = target.get(key, 0) + value
+    return list(days.values())
+
+def _replace_rollups(rollups):
+    """Upsert whole rollup documents; an upsert that lost an insert race to an $inc is replayed once"""
+    requests = [ReplaceOne({"user_id": rollup["user_id"], "date": rollup["date"]}, rollup, upsert=True)
+                for rollup in rollups]
+    try:
+        mongo.db.mood_daily.bulk_write(requests, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != 11000 for error in errors):
+            raise
+        # The day's document exists now, so the replace matches it
+        mongo.db.mood_daily.bulk_write([requests[error["index"]] for error in errors], ordered=False)
+
+def rebuild_user_rollups(user_id_str):
+    """
+    Replace a user's rollups with ones recomputed from mood_entries; returns the number of days
+    Days are replaced one by one (never deleted and reinserted), so concurrent writes to
+    other days are kept; a mood written while the rebuild runs can be missed or counted
+    twice, run it again if so
+    """
+    started = datetime.utcnow()
+    rollups = build_user_rollups(user_id_str)
+    if rollups:
+        _replace_rollups(rollups)
+    # Days without entries any more, unless written to since the rebuild started
+    mongo.db.mood_daily.delete_many({
+        "user_id": user_id_str,
+        "date": {"$nin": [rollup["date"] for rollup in rollups]},
+        "updated_at": {"$not": {"$gte": started}},
+    })
+    mongo.db.mood_rollup_state.update_one(
+        {"user_id": user_id_str},
+        {"$set": {"built_at": datetime.utcnow(), "days": len(rollups)}},
+        upsert=True
+    )
+    invalidate_insights(user_id_str)
+    return len(rollups)
+
+def user_rollups(user_id_str, start_date, fields=ROLLUP_FIELDS, end_date=None):
+    """
+    A user's rollups from start_date (YYYY-MM-DD) on, up to end_date included if given,
+    building them first if they never were
+    """
+    if not mongo.db.mood_rollup_state.find_one({"user_id": user_id_str}, {"_id": 1}):
+        try:
+            rebuild_user_rollups(user_id_str)
+        except PyMongoError as e:
+            # Served from the rollups there are; the next read tries again
+            print(f"DEBUG: Could not rebuild mood rollups for {user_id_str}: {str(e)}")
+    date_range = {"$gte": start_date}
+    if end_date:
+        date_range["$lte"] = end_date
+    return mongo.db.mood_daily.find(
+        {"user_id": user_id_str, "date": date_range}, fields
+    ).sort("date", 1)
+
+def ensure_rollup_indexes():
+    """One rollup per (user, date) and one build marker per user"""
+    mongo.db.mood_daily.create_index([("user_id", ASCENDING), ("date", ASCENDING)], unique=True)
+    mongo.db.mood_rollup_state.create_index([("user_id", ASCENDING)], unique=True)
@@ -0,0 +1,284 @@
+"""
+Storage helpers for mood entries
+Chat-derived moods are coalesced into one rolling aggregate per (user, session, date)
+instead of one document per message; readers use the helpers below so that manual
+entries and aggregates are counted the same way
+"""
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, UpdateOne
+from config import Config
+from extensions import mongo
+from user_timezones import local_timestamp, local_today, user_timezone
+from mood_factors import factor_names, intern_factors
+
+# Source of manual entries, per-message chat entries (legacy) and per-session aggregates
+SOURCE_MANUAL = "manual"
+SOURCE_CHAT_MESSAGE = "chat_message"
+SOURCE_CHAT_SESSION = "chat_session"
+
+VALID_MOODS = ["very_happy", "happy", "neutral", "sad", "very_sad", "anxious", "angry"]
+
+# Mood entries keep the day as a YYYY-MM-DD string (API field "date") and as a BSON date
+# at midnight UTC ("date_at") that range queries and sorts use
+DATE_FORMAT = '%Y-%m-%d'
+EARLIEST_MOOD_DATE = datetime(1970, 1, 1)
+
+# Users whose entries all have date_at in this worker's view; bounded, then forgotten
+_dated_users = set()
+_MAX_DATED_USERS = 100000
+
+def parse_mood_date(value):
+    """
+    The day of a client-supplied mood date, as a naive datetime at midnight
+    Accepts YYYY-MM-DD, ISO timestamps (their date part is kept) and datetimes; raises
+    ValueError for anything else, and for days before 1970 or more than a day ahead
+    """
+    if isinstance(value, datetime):
+        day = value.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    elif isinstance(value, str):
+        value = value.strip()
+        day = datetime.strptime(value[:10], DATE_FORMAT)
+        if len(value) > 10:
+            # The whole timestamp must be valid, not just its date part
+            if value[10] not in ("T", " "):
+                raise ValueError(f"Invalid date: {value}")
+            datetime.fromisoformat(value)
+    else:
+        raise ValueError(f"Invalid date: {value!r}")
+    # Clients ahead of UTC can legitimately be on tomorrow's date
+    if day < EARLIEST_MOOD_DATE or day > datetime.utcnow() + timedelta(days=1):
+        raise ValueError(f"Date out of range: {day.strftime(DATE_FORMAT)}")
+    return day
+
+def date_fields(day):
+    """The date fields stored on a mood entry for a day returned by parse_mood_date"""
+    return {"date": day.strftime(DATE_FORMAT), "date_at": day}
+
+def ensure_entry_dates(user_id_str):
+    """
+    Give a user's legacy entries (stored before migrate_mood_dates.py, without date_at)
+    their typed date on first read, so queries on date_at do not miss them; entries whose
+    date cannot be parsed are marked date_invalid as the migration does
+    """
+    if user_id_str in _dated_users:
+        return
+    operations = []
+    reformatted = False
+    legacy = mongo.db.mood_entries.find(
+        {"user_id": user_id_str, "date_at": {"$exists": False}, "date_invalid": {"$exists": False}},
+        {"date": 1}
+    )
+    for entry in legacy:
+        try:
+            fields = date_fields(parse_mood_date(entry.get("date")))
+        except ValueError:
+            operations.append(UpdateOne({"_id": entry["_id"]}, {"$set": {"date_invalid": True}}))
+            continue
+        reformatted = reformatted or fields["date"] != entry.get("date")
+        operations.append(UpdateOne({"_id": entry["_id"], "date_at": {"$exists": False}}, {"$set": fields}))
+    if operations:
+        mongo.db.mood_entries.bulk_write(operations, ordered=False)
+    if reformatted:
+        # Rollups are keyed by the date string
+        from mood_rollups import rebuild_user_rollups
+        rebuild_user_rollups(user_id_str)
+    if len(_dated_users) >= _MAX_DATED_USERS:
+        _dated_users.clear()
+    _dated_users.add(user_id_str)
+
+def field_key(name):
+    """Make a factor or mood usable as a MongoDB field name (no dots, no leading $)"""
+    return str(name).replace('.', '_').lstrip('$') or "_"
+
+def chat_aggregate_update(summary, message_id=None, now=None, score_sq_sum=None, date=None):
+    """
+    $inc/$set update that folds a summary (see summarize_entry) into an aggregate
+    date (YYYY-MM-DD, as in the aggregate's filter) sets date_at when the aggregate is created
+    """
+    count, score_sum, mood_counts, factor_counts, factor_score_sums = summary
+    now = now or datetime.utcnow()
+    inc = {"count": count, "score_sum": float(score_sum)}
+    if score_sq_sum is not None:
+        inc["score_sq_sum"] = float(score_sq_sum)
+    for mood, mood_count in mood_counts.items():
+        inc[f"mood_counts.{field_key(mood)}"] = mood_count
+    for factor, factor_count in factor_counts.items():
+        inc[f"factor_counts.{field_key(factor)}"] = factor_count
+    for factor, factor_score in factor_score_sums.items():
+        inc[f"factor_score_sums.{field_key(factor)}"] = float(factor_score)
+    update = {
+        "$inc": inc,
+        "$set": {"updated_at": now},
+        "$setOnInsert": {"created_at": now},
+    }
+    factor_ids = [int(key) for key in factor_counts if str(key).isdigit()]
+    if factor_ids:
+        update["$addToSet"] = {"factor_ids": {"$each": factor_ids}}
+    if date:
+        update["$setOnInsert"]["date_at"] = datetime.strptime(date, DATE_FORMAT)
+    if message_id:
+        update["$set"]["last_message_id"] = message_id
+    return update
+
+def chat_aggregate_filter(user_id, session_id, date):
+    return {
+        "user_id": str(user_id),
+        "session_id": session_id,
+        "date": date,
+        "source": SOURCE_CHAT_SESSION,
+    }
+
+def record_chat_mood(user_id, session_id, sentiment, message_id=None):
+    """
+    Store the mood detected in a chat message
+    With MOOD_COALESCE_CHAT_ENTRIES this is a single upsert into the session's aggregate
+    for the user's local today, otherwise one document per message as before
+    """
+    # Imported here because mood_rollups builds on the helpers of this module
+    from mood_rollups import apply_entry
+    now = datetime.utcnow()
+    # The user's local day, so a late-evening message is not filed under tomorrow (UTC)
+    date = local_today(user_timezone(user_id), now).strftime(DATE_FORMAT)
+    message_entry = {
+        "user_id": str(user_id),
+        "date": date,
+        "mood": sentiment["mood"],
+        "mood_score": sentiment["score"],
+        "factors": sentiment.get("factors", []),
+        "factor_ids": intern_factors(sentiment.get("factors", [])),
+    }
+    if Config.MOOD_COALESCE_CHAT_ENTRIES:
+        mongo.db.mood_entries.update_one(
+            chat_aggregate_filter(user_id, session_id, date),
+            chat_aggregate_update(summarize_entry(message_entry), message_id=message_id, now=now,
+                                  score_sq_sum=square_sum(message_entry), date=date),
+            upsert=True
+        )
+    else:
+        mongo.db.mood_entries.insert_one({
+            **message_entry,
+            "date_at": datetime.strptime(date, DATE_FORMAT),
+            "source": SOURCE_CHAT_MESSAGE,
+            "message_id": message_id,
+            "session_id": session_id,
+            "created_at": now,
+            "updated_at": now
+        })
+    apply_entry(message_entry)
+
+def is_aggregate(entry):
+    return entry.get("source") == SOURCE_CHAT_SESSION
+
+def summarize_entry(entry):
+    """
+    Reduce any mood entry to (count, score_sum, mood_counts, factor_counts, factor_score_sums)
+    so that a plain entry counts once and an aggregate counts once per message it holds
+    """
+    if is_aggregate(entry):
+        return (
+            entry.get("count", 0),
+            entry.get("score_sum", 0.0),
+            entry.get("mood_counts", {}),
+            entry.get("factor_counts", {}),
+            entry.get("factor_score_sums", {}),
+        )
+    score = entry.get("mood_score", 0)
+    # Factor counters are keyed by factor id (see mood_factors); entries stored before
+    # factors had ids count their names as they are, like the counters of that time
+    if "factor_ids" in entry:
+        factors = {str(factor_id) for factor_id in entry["factor_ids"]}
+    else:
+        factors = {field_key(factor) for factor in entry.get("factors") or [] if factor is not None}
+    return (
+        1,
+        score,
+        {entry.get("mood"): 1},
+        {factor: 1 for factor in factors},
+        {factor: score for factor in factors},
+    )
+
+def entry_factor_ids(entry):
+    """Factor ids of a plain entry, interned from its factors if it was stored without them"""
+    if "factor_ids" in entry:
+        return entry["factor_ids"]
+    return intern_factors(entry.get("factors", []))
+
+def square_sum(entry):
+    """
+    Sum of the squared mood scores an entry stands for
+    Aggregates written before score_sq_sum was tracked count every message at their mean
+    """
+    if is_aggregate(entry):
+        if "score_sq_sum" in entry:
+            return entry["score_sq_sum"]
+        count = entry.get("count", 0)
+        return entry.get("score_sum", 0.0) ** 2 / count if count else 0.0
+    return float(entry.get("mood_score", 0)) ** 2
+
+def expand_aggregate(entry):
+    """
+    Give an aggregate the same fields as a regular entry (mood, mood_score, factors)
+    so clients can display it; the raw counters are kept alongside
+    """
+    if not is_aggregate(entry):
+        return entry
+    count = entry.get("count", 0) or 1
+    mood_counts = entry.get("mood_counts", {})
+    factor_counts = entry.get("factor_counts", {})
+    entry["mood_score"] = round(entry.get("score_sum", 0.0) / count, 2)
+    entry["mood"] = max(mood_counts, key=mood_counts.get) if mood_counts else "neutral"
+    factor_keys = sorted(factor_counts, key=factor_counts.get, reverse=True)
+    names = factor_names(factor_keys)
+    entry["factors"] = [names[key] for key in factor_keys]
+    entry["factor_ids"] = [int(key) for key in factor_keys if str(key).isdigit()]
+    return entry
+
+# Internal counters of an aggregate, not part of the exported entry
+AGGREGATE_INTERNAL_FIELDS = ["score_sum", "score_sq_sum", "mood_counts", "factor_counts", "factor_score_sums", "compaction_batches"]
+
+def export_entry(entry):
+    """Entry as exported to users: aggregates expanded, internal counters dropped"""
+    expand_aggregate(entry)
+    for field in AGGREGATE_INTERNAL_FIELDS:
+        entry.pop(field, None)
+    return entry
+
+# Columns of the mood export, in order; every row has exactly these fields
+EXPORT_FIELDS = ["id", "date", "mood", "mood_score", "factors", "notes", "source",
+                 "session_id", "count", "created_at", "updated_at"]
+
+def export_row(entry, tz=None):
+    """
+    An entry as one fixed-schema export row (see EXPORT_FIELDS); missing fields are None
+    Timestamps are in tz with their UTC offset if given, naive UTC otherwise
+    """
+    entry["id"] = str(entry.pop("_id"))
+    export_entry(entry)
+    for field in ("created_at", "updated_at"):
+        if isinstance(entry.get(field), datetime):
+            entry[field] = local_timestamp(entry[field], tz) if tz else entry[field].isoformat()
+    return {field: entry.get(field) for field in EXPORT_FIELDS}
+
+DATE_INDEX = "user_id_1_date_at_1"
+# Replaced by DATE_INDEX when dates became typed (migrate_mood_dates.py drops it)
+LEGACY_DATE_INDEX = "user_id_1_date_1"
+
+def ensure_mood_indexes():
+    """
+    One aggregate per (user, session, date), and per-user scans in date_at order: the
+    entries range query, the export and the rollup rebuild (see check_mood_indexes.py)
+    """
+    mongo.db.mood_entries.create_index([("user_id", ASCENDING), ("date_at", ASCENDING)], name=DATE_INDEX)
+    # Client ids of imported offline entries, so a replayed import is not stored twice
+    mongo.db.mood_entries.create_index(
+        [("user_id", ASCENDING), ("client_id", ASCENDING)],
+        unique=True,
+        partialFilterExpression={"client_id": {"$type": "string"}},
+        name="client_id"
+    )
+    mongo.db.mood_entries.create_index(
+        [("user_id", ASCENDING), ("session_id", ASCENDING), ("date", ASCENDING)],
+        unique=True,
+        partialFilterExpression={"source": SOURCE_CHAT_SESSION},
+        name="chat_session_aggregate"
+    )
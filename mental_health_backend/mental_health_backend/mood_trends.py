@@ -0,0 +1,187 @@
+"""
+Mood trends over long ranges, computed with NumPy
+A user's daily rollups (see mood_rollups) are loaded once into dense per-day arrays
+of entry counts, score sums and squared score sums, and every statistic is derived
+from those arrays with cumulative sums and bincounts instead of Python loops:
+rolling 7- and 30-day averages, an exponentially weighted average, rolling volatility,
+weekday seasonality and changepoints in the daily average
+Averages are weighted by entries (a day with three moods counts three times) and days
+without entries are gaps, not zeros
+"""
+import numpy as np
+from mood_store import DATE_FORMAT
+
+ROLLING_WINDOWS = (7, 30)
+VOLATILITY_WINDOW = 30
+EWMA_HALFLIFE_DAYS = 7
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+# Changepoints: segments of at least this many days with an entry, at most this many
+# changepoints, and a split must explain this many times sigma^2 * log(days) of variance
+CHANGEPOINT_MIN_SEGMENT = 14
+CHANGEPOINT_MAX = 10
+CHANGEPOINT_PENALTY = 3.0
+
+TREND_FIELDS = {"_id": 0, "date": 1, "count": 1, "score_sum": 1, "score_sq_sum": 1}
+
+def daily_series(rollups, start_date, days):
+    """
+    Dense arrays (counts, score_sums, score_sq_sums) with one slot per day from start_date
+    (YYYY-MM-DD) on; rollups outside the range are ignored
+    """
+    dates, counts, score_sums, score_sq_sums = [], [], [], []
+    for rollup in rollups:
+        dates.append(rollup["date"])
+        counts.append(rollup.get("count", 0))
+        score_sums.append(rollup.get("score_sum", 0.0))
+        score_sq_sums.append(rollup.get("score_sq_sum", 0.0))
+    series = np.zeros((3, days))
+    if dates:
+        offsets = (np.array(dates, dtype="datetime64[D]") - np.datetime64(start_date, "D")).astype(np.int64)
+        inside = (offsets >= 0) & (offsets < days)
+        values = np.array([counts, score_sums, score_sq_sums], dtype=np.float64)
+        # A (user, date) has a single rollup, but add in case a range repeats a day
+        np.add.at(series, (slice(None), offsets[inside]), values[:, inside])
+    return series[0], series[1], series[2]
+
+def _divide(numerator, denominator):
+    """numerator / denominator with NaN where the denominator is zero"""
+    result = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=result, where=denominator > 0)
+    return result
+
+def _window_sums(values, window):
+    """Sum of values over the last window days (fewer at the start) for every day"""
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    ends = np.arange(1, len(values) + 1)
+    return cumulative[ends] - cumulative[np.maximum(ends - window, 0)]
+
+def _decayed_sums(values, halflife):
+    """
+    sum over k <= t of values[k] * 0.5 ** ((t - k) / halflife) for every day t
+    Computed as a scaled cumulative sum, in blocks short enough that the scale factor
+    cannot overflow
+    """
+    decay = 0.5 ** (1.0 / halflife)
+    block = max(1, int(500 * halflife))
+    result = np.empty(len(values))
+    carry = 0.0
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        steps = np.arange(len(chunk))
+        sums = decay ** steps * (carry + np.cumsum(chunk * decay ** -steps))
+        # carry already includes the decay to the first day of this block
+        result[start:start + block] = sums
+        carry = sums[-1] * decay
+    return result
+
+def _weekday_of(start_date, days):
+    # 1970-01-01 was a Thursday (3, with Monday = 0)
+    first = int(np.datetime64(start_date, "D").astype(np.int64))
+    return (first + 3 + np.arange(days)) % 7
+
+def changepoints(daily_means, min_segment=CHANGEPOINT_MIN_SEGMENT, max_changepoints=CHANGEPOINT_MAX,
+                 penalty=CHANGEPOINT_PENALTY):
+    """
+    Indexes where the mean of a series of daily means shifts, by binary segmentation
+    Each segment's best split is found for all positions at once from cumulative sums;
+    it is kept if it reduces the squared error by more than penalty * sigma^2 * log(n),
+    with sigma estimated from day-to-day differences (robust to the shifts themselves)
+    """
+    n = len(daily_means)
+    if n < 2 * min_segment:
+        return []
+    sigma = np.median(np.abs(np.diff(daily_means))) / (0.6745 * np.sqrt(2))
+    threshold = penalty * max(sigma, 1e-6) ** 2 * np.log(n)
+    cumulative = np.concatenate(([0.0], np.cumsum(daily_means)))
+
+    found = []
+    segments = [(0, n)]
+    while segments and len(found) < max_changepoints:
+        start, end = segments.pop()
+        length = end - start
+        if length < 2 * min_segment:
+            continue
+        splits = np.arange(start + min_segment, end - min_segment + 1)
+        left = cumulative[splits] - cumulative[start]
+        right = cumulative[end] - cumulative[splits]
+        left_n = splits - start
+        right_n = end - splits
+        # Reduction of the squared error from fitting two means instead of one
+        total = cumulative[end] - cumulative[start]
+        gains = left ** 2 / left_n + right ** 2 / right_n - total ** 2 / length
+        best = int(np.argmax(gains))
+        if gains[best] > threshold:
+            split = int(splits[best])
+            found.append(split)
+            segments.extend([(start, split), (split, end)])
+    return sorted(found)
+
+def compute_trends(counts, score_sums, score_sq_sums, start_date, halflife=EWMA_HALFLIFE_DAYS):
+    """Trend series and statistics from daily arrays (see daily_series), starting on start_date"""
+    days = len(counts)
+    series = {"daily_average": _divide(score_sums, counts)}
+    for window in ROLLING_WINDOWS:
+        series[f"rolling_{window}"] = _divide(_window_sums(score_sums, window), _window_sums(counts, window))
+    series["ewma"] = _divide(_decayed_sums(score_sums, halflife), _decayed_sums(counts, halflife))
+
+    window_counts = _window_sums(counts, VOLATILITY_WINDOW)
+    window_means = _divide(_window_sums(score_sums, VOLATILITY_WINDOW), window_counts)
+    window_variance = _divide(_window_sums(score_sq_sums, VOLATILITY_WINDOW), window_counts) - window_means ** 2
+    series[f"volatility_{VOLATILITY_WINDOW}"] = np.sqrt(np.maximum(window_variance, 0.0))
+
+    total = counts.sum()
+    average = score_sums.sum() / total if total else None
+    volatility = float(np.sqrt(max(score_sq_sums.sum() / total - average ** 2, 0.0))) if total else None
+
+    weekdays = _weekday_of(start_date, days)
+    weekday_counts = np.bincount(weekdays, weights=counts, minlength=7)
+    weekday_means = _divide(np.bincount(weekdays, weights=score_sums, minlength=7), weekday_counts)
+    weekday = {
+        name: {
+            "count": int(weekday_counts[day]),
+            "average": _number(weekday_means[day]),
+            "deviation": _number(weekday_means[day] - average) if average is not None else None,
+        }
+        for day, name in enumerate(WEEKDAYS)
+    }
+
+    # Changepoints in the average of the days with entries
+    observed = np.flatnonzero(counts > 0)
+    observed_means = score_sums[observed] / counts[observed]
+    points = []
+    boundaries = [0] + changepoints(observed_means) + [len(observed)]
+    for before, split, after in zip(boundaries, boundaries[1:], boundaries[2:]):
+        points.append({
+            "date": str(np.datetime64(start_date, "D") + int(observed[split])),
+            "average_before": _number(observed_means[before:split].mean()),
+            "average_after": _number(observed_means[split:after].mean()),
+        })
+
+    return {
+        "start_date": start_date,
+        "days": days,
+        "days_with_entries": int(len(observed)),
+        "total_entries": int(total),
+        "average": _number(average),
+        "volatility": _number(volatility),
+        "ewma_halflife_days": halflife,
+        # series[name][i] is the value for start_date + i days, null without data
+        "series": {name: _numbers(values) for name, values in series.items()},
+        "weekday": weekday,
+        "changepoints": points,
+    }
+
+def _number(value):
+    if value is None or np.isnan(value):
+        return None
+    return round(float(value), 2)
+
+def _numbers(values):
+    rounded = np.round(values, 2).astype(object)
+    rounded[np.isnan(values)] = None
+    return rounded.tolist()
+
+def trend_start(today, days):
+    """First day (YYYY-MM-DD) of a range of days ending today"""
+    return (np.datetime64(today.strftime(DATE_FORMAT), "D") - (days - 1)).astype(str)
@@ -142,6 +142,13 @@ def update_profile():
             profile_data = {**existing_profile, **updates}
             mongo.db.user_profiles.insert_one(profile_data)
         
+        # A new timezone moves the user's day boundaries: drop what was computed with the old one
+        if 'timezone' in data:
+            from user_timezones import invalidate as invalidate_timezone
+            from insights_cache import invalidate as invalidate_insights
+            invalidate_timezone(user_id_str)
+            invalidate_insights(user_id_str)
+        
         # Get updated profile
         updated_profile = mongo.db.user_profiles.find_one({"user_id": user_id_str})
         
@@ -354,24 +361,46 @@ def delete_account():
         # Convert user_id to string for MongoDB
         user_id_str = str(user_id)
         
+        # Write out buffered LLM ledger entries first, so none of this user's land after the delete
+        from llm_ledger import flush as flush_ledger
+        flush_ledger()
+        
         # Delete all user data from MongoDB
         collections_to_clean = [
             'user_profiles',
             'notification_preferences',
             'mood_entries',
+            'mood_daily',
+            'mood_rollup_state',
             'chat_sessions',
             'chats',
+            'chat_archives',
             'appointments',
             'reminders',
             'emergency_contacts',
             'emergency_alerts',
             'resource_searches',
+            'sync_tombstones',
+            'llm_ledger',
+            'mood_cache_generations',
         ]
         
         for collection_name in collections_to_clean:
             if collection_name in mongo.db.list_collection_names():
                 mongo.db.get_collection(collection_name).delete_many({"user_id": user_id_str})
         
+        # Drop any cached chat memory and session context for this user
+        from chat_memory import forget_user
+        from session_context import invalidate_context
+        from insights_cache import forget_user as forget_insights
+        from user_timezones import invalidate as invalidate_timezone
+        from chat_events import forget_user as forget_chat_events
+        forget_user(user_id_str)
+        invalidate_context(user_id_str)
+        forget_insights(user_id_str)
+        invalidate_timezone(user_id_str)
+        forget_chat_events(user_id_str)
+        
         # Delete user from SQL database if using standard auth
         # For Supabase, we would call their API to delete the user
         try:
@@ -428,8 +457,9 @@ def export_user_data():
                     entry['_id'] = str(entry['_id'])
                 zf.writestr('mood_entries.json', json.dumps(mood_entries, default=str))
             
-            # Export chat data
-            chats = list(mongo.db.chats.find({"user_id": user_id_str}))
+            # Export chat data (archived sessions included)
+            from chat_archive import user_chats
+            chats = user_chats(user_id_str)
             if chats:
                 for chat in chats:
                     chat['_id'] = str(chat['_id'])
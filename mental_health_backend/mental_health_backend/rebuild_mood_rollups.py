@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Admin command: rebuild the daily mood rollups (mood_daily) from mood_entries
+Run once after deploying the rollups so existing users do not pay for the rebuild on
+their first insights request, and again to repair a user's rollups
+Run with: python rebuild_mood_rollups.py [--user USER_ID] [--dry-run]
+"""
+import argparse
+from mood_rollups import build_user_rollups, rebuild_user_rollups, ensure_rollup_indexes
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild the daily mood rollups from mood entries')
+    parser.add_argument('--user', help='Only rebuild this user (default: every user with mood entries)')
+    parser.add_argument('--dry-run', action='store_true', help='Count the rollups without writing them')
+    args = parser.parse_args()
+
+    from app import app
+    from extensions import mongo
+
+    with app.app_context():
+        if not args.dry_run:
+            ensure_rollup_indexes()
+        user_ids = [args.user] if args.user else mongo.db.mood_entries.distinct("user_id")
+        users = days = 0
+        for user_id in user_ids:
+            if args.dry_run:
+                days += len(build_user_rollups(str(user_id)))
+            else:
+                days += rebuild_user_rollups(str(user_id))
+            users += 1
+
+        entries = mongo.db.mood_entries.count_documents({"user_id": args.user} if args.user else {})
+        print(f"{'Would rebuild' if args.dry_run else 'Rebuilt'} {days} daily rollups for {users} users "
+              f"from {entries} mood entries")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Replay chat messages through the local intent router
+Reports the share of messages that would have been answered without a model call
+(deflection rate), per intent, and the classification latency
+Messages with crisis language are skipped, as in the chat route
+Run with: python replay_intent_router.py [--input chats.jsonl] [--limit 50000] [--show 20]
+"""
+import argparse
+import json
+import time
+from collections import Counter
+from config import Config
+from crisis_detector import detect_crisis
+import intent_router
+
+def load_messages(args):
+    if args.input:
+        with open(args.input, encoding='utf-8') as f:
+            return [json.loads(line).get("message", "") for line in f if line.strip()]
+
+    from app import app
+    from extensions import mongo
+    with app.app_context():
+        cursor = mongo.db.chats.find({"message": {"$type": "string"}}, {"message": 1}).sort("timestamp", -1)
+        if args.limit:
+            cursor = cursor.limit(args.limit)
+        return [chat["message"] for chat in cursor]
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return sorted_values[index]
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay chat messages through the intent router')
+    parser.add_argument('--input', help='JSONL file of chat documents (default: read the chats collection)')
+    parser.add_argument('--limit', type=int, default=50000, help='Most recent chats read from MongoDB')
+    parser.add_argument('--show', type=int, default=0, help='Print this many deflected messages for review')
+    parser.add_argument('--min-confidence', type=float, default=Config.INTENT_ROUTER_MIN_CONFIDENCE)
+    args = parser.parse_args()
+
+    Config.INTENT_ROUTER_ENABLED = True
+    Config.INTENT_ROUTER_MIN_CONFIDENCE = args.min_confidence
+
+    messages = load_messages(args)
+    if not messages:
+        print("No chat messages to replay")
+        return
+
+    intents = Counter()
+    methods = Counter()
+    latencies = []
+    crisis = 0
+    shown = 0
+    for message in messages:
+        if detect_crisis(message)["detected"]:
+            crisis += 1
+            continue
+        t0 = time.perf_counter()
+        match = intent_router.classify(message)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        if match:
+            intents[match["intent"]] += 1
+            methods[match["method"]] += 1
+            if shown < args.show:
+                print(f"  [{match['intent']} {match['method']} {match['confidence']}] {message[:100]}")
+                shown += 1
+
+    deflected = sum(intents.values())
+    latencies.sort()
+    print(f"Messages replayed:   {len(messages)} ({crisis} with crisis language skipped)")
+    print(f"Answered locally:    {deflected} ({100.0 * deflected / len(messages):.1f}% deflection)")
+    print("By intent:           " + (", ".join(f"{name}={count}" for name, count in intents.most_common()) or "-"))
+    print("By method:           " + (", ".join(f"{name}={count}" for name, count in methods.most_common()) or "-"))
+    print(f"Classify latency:    p50 {percentile(latencies, 50):.3f} ms | p95 {percentile(latencies, 95):.3f} ms | "
+          f"p99 {percentile(latencies, 99):.3f} ms")
+    print(f"Disabled intents:    {Config.INTENT_ROUTER_DISABLED_INTENTS or '-'}")
+
+if __name__ == "__main__":
+    main()
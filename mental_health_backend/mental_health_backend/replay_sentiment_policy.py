@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Replay stored chat traffic through the adaptive sentiment policy
+Chats scored on every message are treated as ground truth; the report shows how many
+LLM sentiment calls the policy would have saved and how far daily mood averages drift
+Crisis detection runs on every replayed message as it does in the live chat route:
+detected messages are always scored and high severity ones, answered locally, get the
+unscored placeholder and stay out of the daily averages
+Run with: python replay_sentiment_policy.py [--input chats.jsonl] [--every-n 4] [--min-chars 25]
+"""
+import argparse
+import json
+from collections import defaultdict, Counter
+from datetime import datetime
+from config import Config
+from crisis_detector import detect_crisis, SEVERITY_HIGH
+import sentiment_policy
+
+def load_from_file(path):
+    chats = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                chat = json.loads(line)
+                if isinstance(chat.get("timestamp"), str):
+                    chat["timestamp"] = datetime.fromisoformat(chat["timestamp"].replace('Z', ''))
+                chats.append(chat)
+    return chats
+
+def load_from_mongo(limit):
+    from app import app
+    from extensions import mongo
+    with app.app_context():
+        cursor = mongo.db.chats.find(
+            {"session_id": {"$exists": True}, "sentiment": {"$exists": True}},
+            {"user_id": 1, "session_id": 1, "message": 1, "timestamp": 1, "sentiment": 1}
+        ).sort("timestamp", 1)
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return sorted_values[index]
+
+def replay(chats):
+    """Return (calls made, messages answered locally, reason counts, daily truth sums, daily replayed sums)"""
+    sessions = defaultdict(list)
+    for chat in chats:
+        sentiment = chat.get("sentiment") or {}
+        # Only fully scored traffic can serve as ground truth
+        if sentiment.get("inherited") or not isinstance(chat.get("timestamp"), datetime):
+            continue
+        sessions[(chat.get("user_id"), chat.get("session_id"))].append(chat)
+
+    calls = 0
+    local = 0
+    reasons = Counter()
+    truth = defaultdict(lambda: [0, 0.0])
+    replayed = defaultdict(lambda: [0, 0.0])
+    for (user_id, _), session_chats in sessions.items():
+        session_chats.sort(key=lambda c: c["timestamp"])
+        history = []
+        for chat in session_chats:
+            message = chat.get("message", "")
+            crisis_result = detect_crisis(message) if Config.CRISIS_DETECTION_ENABLED else None
+            if crisis_result and crisis_result["severity"] == SEVERITY_HIGH and Config.CRISIS_SHORT_CIRCUIT:
+                # Answered locally: no model call and no mood entry, same placeholder as the chat route
+                local += 1
+                history.append({"timestamp": chat["timestamp"],
+                                "sentiment": {"score": -5.0, "mood": "very_sad", "factors": [],
+                                              "source": "crisis_detector", "local": True}})
+                continue
+
+            should_score, reason, last = sentiment_policy.decide(
+                message, history, now=chat["timestamp"], policy="adaptive",
+                crisis=bool(crisis_result and crisis_result["detected"])
+            )
+            reasons[reason] += 1
+            if should_score:
+                calls += 1
+                sentiment = chat["sentiment"]
+            else:
+                sentiment = sentiment_policy.inherit(last, reason)
+            history.append({"timestamp": chat["timestamp"], "sentiment": sentiment})
+
+            day = (user_id, chat["timestamp"].strftime('%Y-%m-%d'))
+            truth[day][0] += 1
+            truth[day][1] += float(chat["sentiment"].get("score", 0))
+            replayed[day][0] += 1
+            replayed[day][1] += float(sentiment.get("score", 0))
+    return calls, local, reasons, truth, replayed
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay chats through the sentiment sampling policy')
+    parser.add_argument('--input', help='JSONL file of chat documents (default: read the chats collection)')
+    parser.add_argument('--limit', type=int, default=0, help='Maximum chats read from MongoDB')
+    parser.add_argument('--min-chars', type=int, default=Config.SENTIMENT_MIN_CHARS)
+    parser.add_argument('--max-age-seconds', type=int, default=Config.SENTIMENT_MAX_AGE_SECONDS)
+    parser.add_argument('--every-n', type=int, default=Config.SENTIMENT_EVERY_N)
+    parser.add_argument('--shift-threshold', type=float, default=Config.SENTIMENT_SHIFT_THRESHOLD)
+    args = parser.parse_args()
+
+    Config.SENTIMENT_MIN_CHARS = args.min_chars
+    Config.SENTIMENT_MAX_AGE_SECONDS = args.max_age_seconds
+    Config.SENTIMENT_EVERY_N = args.every_n
+    Config.SENTIMENT_SHIFT_THRESHOLD = args.shift_threshold
+
+    chats = load_from_file(args.input) if args.input else load_from_mongo(args.limit)
+    calls, local, reasons, truth, replayed = replay(chats)
+    messages = sum(count for count, _ in truth.values())
+    if not messages:
+        print("No fully scored chat messages to replay")
+        return
+
+    drifts = sorted(
+        abs(replayed[day][1] / replayed[day][0] - total / count)
+        for day, (count, total) in truth.items()
+    )
+    print(f"Messages replayed:      {messages}")
+    print(f"LLM sentiment calls:    {calls} ({messages - calls} saved, {100.0 * (messages - calls) / messages:.1f}%)")
+    print(f"Answered locally:       {local} (crisis replies, not scored)")
+    print("Decisions:              " + ", ".join(f"{reason}={count}" for reason, count in reasons.most_common()))
+    print(f"User-days compared:     {len(drifts)}")
+    print(f"Daily average drift:    mean {sum(drifts) / len(drifts):.3f} | p50 {percentile(drifts, 50):.3f} | "
+          f"p95 {percentile(drifts, 95):.3f} | max {drifts[-1]:.3f} (score scale -5..5)")
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,10 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson.objectid import ObjectId
 from datetime import datetime
 from extensions import mongo
-import openai
 import json
 from auth import analyze_sentiment  # Import the sentiment analysis function
+from llm_gateway import get_gateway
+from mood_store import record_chat_mood
 
 chat_bp = Blueprint('chat', __name__)
 
@@ -45,11 +46,9 @@ def chat():
     try:
         # Get API key from config
         api_key = current_app.config.get('OPENAI_API_KEY')
-        if not api_key:
+        if not api_key and current_app.config.get('LLM_PROVIDER') != 'fake':
             return jsonify({"msg": "OpenAI API key not configured"}), 500
         
-        openai.api_key = api_key
-        
         # Perform sentiment analysis
         sentiment_result = analyze_sentiment(message)
         print(f"DEBUG: Sentiment analysis result: {sentiment_result}")
@@ -58,17 +57,13 @@ def chat():
         system_prompt = current_app.config.get('MENTAL_HEALTH_SYSTEM_PROMPT', 
             "You are a supportive mental health companion. Your goal is to provide empathetic responses.")
 
-        # Get the response from OpenAI
-        client = openai.OpenAI(api_key=api_key)
-        completion = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": message}
-            ]
-        )
+        # Get the response through the shared LLM gateway
+        completion = get_gateway().complete("chat", [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": message}
+        ])
         
-        ai_response = completion.choices[0].message.content
+        ai_response = completion["text"]
         
         # Store in MongoDB
         chat_message = {
@@ -86,21 +81,9 @@ def chat():
         
         # Update the mood table for tracking
         try:
-            # Store mood entry in separate collection for tracking
-            mood_entry = {
-                "user_id": str(current_user),
-                "date": datetime.utcnow().strftime('%Y-%m-%d'),
-                "mood": sentiment_result["mood"],
-                "mood_score": sentiment_result["score"],
-                "factors": sentiment_result.get("factors", []),  # Include detected factors if available
-                "source": "chat_message",
-                "message_id": str(chat_message["_id"]),
-                "chat_id": chat_id,
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
-            mongo.db.mood_entries.insert_one(mood_entry)
-            print(f"DEBUG: Stored mood entry: {mood_entry['mood']}")
+            # Store the detected mood for tracking (coalesced per chat and day)
+            record_chat_mood(current_user, chat_id, sentiment_result, message_id=str(chat_message["_id"]))
+            print(f"DEBUG: Stored mood entry: {sentiment_result['mood']}")
         except Exception as mood_err:
             print(f"DEBUG: Error storing mood entry: {str(mood_err)}")
             # Continue anyway, non-critical
@@ -0,0 +1,115 @@
+"""
+Adaptive sampling policy for chat sentiment analysis
+Decides per message whether the LLM sentiment call is worth making; skipped
+messages inherit the last scored sentiment of the session, flagged as inherited
+"""
+from datetime import datetime
+from config import Config
+from crisis_detector import NEGATION_CUES
+from text_utils import tokenize
+
+# Small local lexicon used for the cheap pre-score (normalized forms, see text_utils)
+POSITIVE_WORDS = {
+    "happy", "glad", "great", "good", "better", "calm", "relaxed", "grateful", "thankful", "excited",
+    "proud", "hopeful", "love", "loved", "enjoy", "enjoyed", "fine", "okay", "peaceful", "relieved",
+    "content", "joy", "fun", "amazing", "wonderful", "confident",
+    "heureux", "heureuse", "contente", "bien", "mieux", "calme", "fier", "fiere", "joie",
+    "feliz", "contento", "contenta", "mejor", "tranquilo", "tranquila", "orgulloso", "alegre",
+    "سعيد", "سعيده", "فرحان", "مرتاح", "مبسوط", "الحمد", "احسن", "هاني", "فرح",
+}
+
+NEGATIVE_WORDS = {
+    "sad", "depressed", "anxious", "anxiety", "worried", "stressed", "stress", "angry", "upset", "lonely",
+    "alone", "tired", "exhausted", "hopeless", "worthless", "scared", "afraid", "panic", "cry", "crying",
+    "hate", "awful", "terrible", "bad", "worse", "worst", "hurt", "overwhelmed", "miserable", "empty",
+    "triste", "deprime", "deprimee", "angoisse", "stresse", "stressee", "fatigue", "fatiguee", "seul",
+    "seule", "peur", "mal", "colere", "epuise", "epuisee",
+    "deprimido", "deprimida", "ansioso", "ansiosa", "estresado", "estresada", "cansado", "cansada",
+    "solo", "sola", "miedo", "enojado", "enojada", "llorar",
+    "حزين", "حزينه", "تعبان", "قلق", "خايف", "وحيد", "مكتئب", "زعفان", "مقلق", "ضايق", "مهموم",
+}
+
+# Reasons returned by decide()
+REASON_FIRST = "first"
+REASON_CRISIS = "crisis"
+REASON_CADENCE = "cadence"
+REASON_STALE = "stale"
+REASON_SHIFT = "shift"
+REASON_SHORT = "short"
+REASON_STABLE = "stable"
+REASON_ALWAYS = "always"
+
+def prescore(text):
+    """
+    Cheap local sentiment estimate from the lexicon
+    Returns (score in [-5, 5], number of sentiment words found)
+    """
+    tokens = tokenize(text)
+    positive = negative = 0
+    for i, token in enumerate(tokens):
+        polarity = 1 if token in POSITIVE_WORDS else -1 if token in NEGATIVE_WORDS else 0
+        if not polarity:
+            continue
+        # "not happy" counts as negative, "not bad" as positive
+        if any(previous in NEGATION_CUES for previous in tokens[max(0, i - 2):i]):
+            polarity = -polarity
+        if polarity > 0:
+            positive += 1
+        else:
+            negative += 1
+    hits = positive + negative
+    if not hits:
+        return 0.0, 0
+    return max(-5.0, min(5.0, 5.0 * (positive - negative) / max(hits, 2))), hits
+
+def last_scored(previous_chats):
+    """
+    Find the most recent sentiment actually produced by the model in a session
+    Inherited scores and local placeholders (crisis replies) are skipped
+    Returns (sentiment, scored_at, messages since then) or (None, None, count)
+    """
+    skipped = 0
+    for chat in reversed(previous_chats):
+        sentiment = chat.get("sentiment")
+        if sentiment and not sentiment.get("inherited") and not sentiment.get("local"):
+            return sentiment, chat.get("timestamp"), skipped
+        skipped += 1
+    return None, None, skipped
+
+def decide(text, previous_chats, now=None, crisis=False, policy=None):
+    """
+    Decide whether to run sentiment analysis for a message
+    previous_chats are the session's earlier chat documents, oldest first
+    Returns (should_score, reason, last sentiment or None)
+    """
+    policy = policy or Config.SENTIMENT_POLICY
+    now = now or datetime.utcnow()
+    last, scored_at, skipped = last_scored(previous_chats)
+
+    if policy != "adaptive":
+        return True, REASON_ALWAYS, last
+    if last is None:
+        return True, REASON_FIRST, None
+    if crisis:
+        return True, REASON_CRISIS, last
+    if Config.SENTIMENT_EVERY_N and skipped + 1 >= Config.SENTIMENT_EVERY_N:
+        return True, REASON_CADENCE, last
+    if isinstance(scored_at, datetime) and (now - scored_at).total_seconds() > Config.SENTIMENT_MAX_AGE_SECONDS:
+        return True, REASON_STALE, last
+
+    estimate, hits = prescore(text)
+    if hits and abs(estimate - float(last.get("score", 0))) >= Config.SENTIMENT_SHIFT_THRESHOLD:
+        return True, REASON_SHIFT, last
+    if len(text.strip()) < Config.SENTIMENT_MIN_CHARS:
+        return False, REASON_SHORT, last
+    return False, REASON_STABLE, last
+
+def inherit(last, reason):
+    """Sentiment stored for a skipped message: the last score, flagged as inherited"""
+    return {
+        "score": last.get("score", 0),
+        "mood": last.get("mood", "neutral"),
+        "factors": last.get("factors", []),
+        "inherited": True,
+        "policy": reason,
+    }
@@ -0,0 +1,64 @@
+"""
+Per-session context cache shared by history reads and chat turns
+Opening a session reads its whole history; the next chat turn needs the same
+messages to build the prompt. The history read stores a trimmed copy of the session
+here and each turn appends its own exchange, so the turn does not read the session
+again. Entries are checked against the session's message_count before use, so turns
+handled by another worker are never missed
+"""
+import threading
+from collections import OrderedDict
+from config import Config
+
+# Fields a chat turn needs from earlier messages (prompt, sentiment sampling)
+CONTEXT_FIELDS = ("_id", "message", "response", "timestamp", "sentiment")
+
+# Bounded LRU of (user_id, session_id) -> list of trimmed chat documents, oldest first
+_sessions = OrderedDict()
+_lock = threading.Lock()
+
+def _trim(chat):
+    return {field: chat[field] for field in CONTEXT_FIELDS if field in chat}
+
+def get_context(user_id, session_id, message_count=None):
+    """
+    Cached messages of a session, or None
+    With message_count given, an entry that does not hold exactly that many messages
+    (another worker added a turn) is dropped and None is returned
+    """
+    key = (str(user_id), session_id)
+    with _lock:
+        cached = _sessions.get(key)
+        if cached is None:
+            return None
+        if message_count is not None and len(cached) != message_count:
+            del _sessions[key]
+            return None
+        _sessions.move_to_end(key)
+        return list(cached)
+
+def store_context(user_id, session_id, chats):
+    """Cache the messages of a session as read from the database (oldest first)"""
+    key = (str(user_id), session_id)
+    with _lock:
+        _sessions[key] = [_trim(chat) for chat in chats]
+        _sessions.move_to_end(key)
+        while len(_sessions) > Config.CHAT_CONTEXT_CACHE_SESSIONS:
+            _sessions.popitem(last=False)
+
+def append_context(user_id, session_id, chat):
+    """Add a new exchange to a cached session; sessions that are not cached are left alone"""
+    with _lock:
+        cached = _sessions.get((str(user_id), session_id))
+        if cached is not None:
+            cached.append(_trim(chat))
+
+def invalidate_context(user_id, session_id=None):
+    """Drop one cached session, or every cached session of the user"""
+    user_id = str(user_id)
+    with _lock:
+        if session_id is not None:
+            _sessions.pop((user_id, session_id), None)
+            return
+        for key in [key for key in _sessions if key[0] == user_id]:
+            del _sessions[key]
@@ -57,10 +57,14 @@ def main():
         workers = os.environ.get('GUNICORN_WORKERS', '4')
         # Configure the timeout - default to 120 seconds
         timeout = os.environ.get('GUNICORN_TIMEOUT', '120')
+        # Threaded workers: every open WebSocket holds one thread, so this bounds
+        # concurrent chat connections per worker (see WEBSOCKET_MAX_CONNECTIONS)
+        threads = os.environ.get('GUNICORN_THREADS', '256')
             
         # Build the gunicorn command
         cmd = f"gunicorn app:app --bind {args.host}:{args.port} " \
-              f"--workers {workers} --timeout {timeout} --log-level info"
+              f"--workers {workers} --worker-class gthread --threads {threads} " \
+              f"--timeout {timeout} --log-level info"
         
         print(f"Starting gunicorn with command: {cmd}")
         os.system(cmd)
@@ -0,0 +1,165 @@
+"""
+Delta sync feed for mood entries, appointments and chat sessions
+GET /sync?cursor=... returns what was created or updated since the cursor, and the
+ids deleted since then (tombstones), with a new cursor. Without a cursor it returns
+everything; a client that is up to date gets empty lists back
+The cursor is an opaque token holding, per collection, the (updated_at, _id) of the
+last document delivered. A write can commit slightly after one with a later
+updated_at was read, so the cursor only moves past changes older than
+SYNC_OVERLAP_SECONDS; newer ones are served again on the next call and clients
+apply them idempotently by id
+"""
+from flask import Blueprint, request, jsonify
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from config import Config
+from extensions import mongo
+from auth import auth_required
+from mood_store import export_entry
+from tombstones import SYNCED_COLLECTIONS
+import base64
+import json
+import traceback
+
+# Create blueprint for the sync feed
+sync_bp = Blueprint('sync', __name__)
+
+CURSOR_VERSION = 1
+TOMBSTONES = "sync_tombstones"
+
+def _format(document):
+    for field, value in document.items():
+        if isinstance(value, datetime):
+            document[field] = value.isoformat()
+    return document
+
+def _format_mood_entry(entry):
+    # Same fields as GET /mood/entries
+    entry["id"] = str(entry.pop("_id"))
+    entry.pop("date_at", None)
+    return _format(export_entry(entry))
+
+def _format_appointment(appointment):
+    # Same fields as GET /appointments
+    appointment["id"] = str(appointment.pop("_id"))
+    return _format(appointment)
+
+def _format_session(session):
+    # Same fields as GET /chat/sessions; deletions are reported by session_id
+    session["_id"] = str(session["_id"])
+    return _format(session)
+
+FORMATTERS = {
+    "mood_entries": _format_mood_entry,
+    "appointments": _format_appointment,
+    "chat_sessions": _format_session,
+}
+
+def encode_cursor(positions, issued_at):
+    payload = {
+        "v": CURSOR_VERSION,
+        "t": issued_at.isoformat(),
+        "p": {name: [updated_at.isoformat(), str(last_id)] for name, (updated_at, last_id) in positions.items()},
+    }
+    token = base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode()
+    return token.rstrip("=")
+
+def decode_cursor(cursor):
+    """(positions, issued_at) from a cursor; raises ValueError if it is not one of ours"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if payload.get("v") != CURSOR_VERSION:
+            raise ValueError("Unsupported cursor version")
+        positions = {
+            name: (datetime.fromisoformat(updated_at), ObjectId(last_id))
+            for name, (updated_at, last_id) in payload["p"].items()
+            if name in SYNCED_COLLECTIONS or name == TOMBSTONES
+        }
+        return positions, datetime.fromisoformat(payload["t"])
+    except (TypeError, KeyError, AttributeError, InvalidId, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+
+def read_changes(collection, user_id_str, position, horizon, limit):
+    """
+    Documents of a user changed after position, oldest first, at most limit
+    Returns (documents, new position, whether more are waiting)
+    """
+    query = {"user_id": user_id_str}
+    if position:
+        updated_at, last_id = position
+        query["$or"] = [
+            {"updated_at": {"$gt": updated_at}},
+            {"updated_at": updated_at, "_id": {"$gt": last_id}},
+        ]
+    else:
+        query["updated_at"] = {"$exists": True}
+    documents = list(collection.find(query).sort([("updated_at", 1), ("_id", 1)]).limit(limit + 1))
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+
+    for document in documents:
+        # Past the horizon only when paging, so a long backlog always makes progress
+        if document["updated_at"] <= horizon or has_more:
+            position = (document["updated_at"], document["_id"])
+    return documents, position, has_more
+
+@sync_bp.route('/sync', methods=['GET'])
+@auth_required
+def get_changes():
+    """Mood entries, appointments and chat sessions changed or deleted since the cursor"""
+    # User is available from the auth_required decorator
+    user = request.user
+    user_id = user.get('id')
+
+    try:
+        limit = int(request.args.get('limit', Config.SYNC_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    limit = max(1, min(limit, Config.SYNC_PAGE_SIZE))
+
+    now = datetime.utcnow()
+    positions = {}
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            positions, issued_at = decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        # Deletions older than the tombstone retention are gone: start over
+        if issued_at < now - timedelta(days=Config.SYNC_TOMBSTONE_DAYS):
+            return jsonify({"reset": True}), 200
+
+    try:
+        # Convert user_id to string for consistency
+        user_id_str = str(user_id)
+        horizon = now - timedelta(seconds=Config.SYNC_OVERLAP_SECONDS)
+
+        changes = {}
+        has_more = False
+        for name in SYNCED_COLLECTIONS:
+            documents, positions[name], more = read_changes(
+                mongo.db[name], user_id_str, positions.get(name), horizon, limit
+            )
+            has_more = has_more or more
+            if documents:
+                changes[name] = [FORMATTERS[name](document) for document in documents]
+
+        deleted = {}
+        tombstones, positions[TOMBSTONES], more = read_changes(
+            mongo.db.sync_tombstones, user_id_str, positions.get(TOMBSTONES), horizon, limit
+        )
+        has_more = has_more or more
+        for tombstone in tombstones:
+            deleted.setdefault(tombstone["collection"], []).append(tombstone["id"])
+
+        return jsonify({
+            "changes": changes,
+            "deleted": deleted,
+            "cursor": encode_cursor({name: position for name, position in positions.items() if position}, now),
+            "has_more": has_more
+        }), 200
+    except Exception as e:
+        print(f"DEBUG: Error reading sync changes: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": "Failed to read changes", "details": str(e)}), 500
@@ -0,0 +1,90 @@
+"""
+Text helpers shared by the local (no network) chat pre-processing steps
+Handles normalization across Latin and Arabic scripts and rough language detection
+"""
+import re
+import unicodedata
+
+# Arabic short vowels, tanween, shadda, sukun, superscript alef, Quranic marks and tatweel
+_ARABIC_DIACRITICS = re.compile(r'[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+
+# Fold the common Arabic letter variants onto a single form
+_ARABIC_LETTER_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+})
+
+# Punctuation that ends a clause is kept as a standalone "." token so that
+# phrase matching and negation windows never run across two clauses
+_CLAUSE_BREAKS = re.compile(r'[.!?;:,؟؛،\n]+')
+_NON_WORD = re.compile(r'[^\w.]+')
+_SPACES = re.compile(r'\s+')
+
+_ARABIC_SCRIPT = re.compile(r'[\u0600-\u06ff]')
+_TIFINAGH_SCRIPT = re.compile(r'[\u2d30-\u2d7f]')
+
+# Very small stopword lists, only used to tell Latin-script languages apart
+_LANGUAGE_HINTS = {
+    "en": {"i", "you", "the", "and", "is", "am", "to", "my", "me", "it", "not", "what", "how", "feel"},
+    "fr": {"je", "tu", "le", "la", "les", "et", "est", "suis", "pas", "mon", "ma", "moi", "ne", "des", "comment"},
+    "es": {"yo", "el", "los", "las", "y", "es", "estoy", "no", "mi", "me", "que", "como", "siento"},
+}
+
+def _strip_latin_accents(text):
+    """Remove combining accents from Latin characters (é -> e) without touching Arabic"""
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch) or _ARABIC_SCRIPT.match(ch))
+
+def normalize_text(text):
+    """
+    Normalize a message for local matching
+    Lowercases, folds accents and Arabic letter variants, replaces punctuation with
+    spaces and marks clause boundaries with a " . " token
+    Returns the normalized string padded with a single space on each side
+    """
+    if not text:
+        return " "
+    text = text.casefold()
+    text = _ARABIC_DIACRITICS.sub('', text)
+    text = text.translate(_ARABIC_LETTER_MAP)
+    text = _strip_latin_accents(text)
+    text = _CLAUSE_BREAKS.sub(' . ', text)
+    text = _NON_WORD.sub(' ', text).replace('_', ' ')
+    text = _SPACES.sub(' ', text).strip()
+    return f" {text} "
+
+def tokenize(text):
+    """Split a message into normalized word tokens (clause markers removed)"""
+    return [token for token in normalize_text(text).split() if token != '.']
+
+def detect_language(text):
+    """
+    Rough language detection for routing localized content
+    Returns one of: ar, zgh (Tamazight in Tifinagh), fr, es, en
+    """
+    if not text:
+        return "en"
+    if _TIFINAGH_SCRIPT.search(text):
+        return "zgh"
+    arabic_chars = len(_ARABIC_SCRIPT.findall(text))
+    if arabic_chars and arabic_chars >= len(text.replace(' ', '')) * 0.3:
+        return "ar"
+
+    tokens = set(tokenize(text))
+    best_language, best_hits = "en", 0
+    for language, hints in _LANGUAGE_HINTS.items():
+        hits = len(tokens & hints)
+        if hits > best_hits:
+            best_language, best_hits = language, hits
+    return best_language
+
+def estimate_tokens(text):
+    """
+    Cheap local token estimate for budgeting prompts
+    Roughly 4 characters per token for Latin text, which is what the OpenAI tokenizers average
+    """
+    if not text:
+        return 0
+    return max(1, (len(text) + 3) // 4)
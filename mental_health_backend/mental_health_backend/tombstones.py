@@ -0,0 +1,39 @@
+"""
+Deletion records for the delta sync feed (see sync.py)
+Deleting a synced document leaves its client-facing id in sync_tombstones so clients
+holding a sync cursor learn about the deletion. Tombstones expire after
+SYNC_TOMBSTONE_DAYS; cursors older than that are told to resync from scratch
+"""
+from datetime import datetime
+from pymongo import ASCENDING
+from config import Config
+from extensions import mongo
+
+# Collections served by the sync feed
+SYNCED_COLLECTIONS = ("mood_entries", "appointments", "chat_sessions")
+
+def record_tombstones(user_id, collection, ids):
+    """Remember that documents of a synced collection were deleted (ids as clients know them)"""
+    ids = [str(doc_id) for doc_id in ids]
+    if not ids:
+        return
+    now = datetime.utcnow()
+    try:
+        mongo.db.sync_tombstones.insert_many([
+            {"user_id": str(user_id), "collection": collection, "id": doc_id, "updated_at": now}
+            for doc_id in ids
+        ], ordered=False)
+    except Exception as e:
+        # Clients keep the deleted document until their next full sync
+        print(f"DEBUG: Could not record sync tombstones: {str(e)}")
+
+def record_tombstone(user_id, collection, doc_id):
+    record_tombstones(user_id, collection, [doc_id])
+
+def ensure_sync_indexes():
+    """(user_id, updated_at, _id) on every synced collection and on the tombstones, which expire"""
+    for collection in SYNCED_COLLECTIONS + ("sync_tombstones",):
+        mongo.db[collection].create_index([("user_id", ASCENDING), ("updated_at", ASCENDING), ("_id", ASCENDING)])
+    mongo.db.sync_tombstones.create_index(
+        [("updated_at", ASCENDING)], expireAfterSeconds=Config.SYNC_TOMBSTONE_DAYS * 24 * 3600
+    )
@@ -0,0 +1,68 @@
+"""
+Users' timezones, for computing mood days in local time
+A user's timezone is the IANA name in user_profiles.timezone (e.g. "Africa/Casablanca");
+a missing or unknown name falls back to DEFAULT_TIMEZONE. Lookups are cached per
+worker (LRU with a TTL), so a request resolves the timezone with at most one profile
+read, and profile updates drop the cached value
+Mood days are calendar days in the user's timezone, stored like every mood date as a
+YYYY-MM-DD string (date) and a naive midnight datetime (date_at); conversions go
+through zoneinfo, so DST transitions move the day boundaries with the clocks
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from config import Config
+from extensions import mongo
+
+# Bounded LRU of user_id -> (ZoneInfo, resolved_at)
+_entries = OrderedDict()
+_lock = threading.Lock()
+
+def resolve_timezone(name):
+    """ZoneInfo for an IANA timezone name, DEFAULT_TIMEZONE if it is missing or unknown"""
+    if isinstance(name, str) and name.strip():
+        try:
+            return ZoneInfo(name.strip())
+        except (ZoneInfoNotFoundError, ValueError, OSError):
+            print(f"DEBUG: Unknown timezone {name!r}, using {Config.DEFAULT_TIMEZONE}")
+    return ZoneInfo(Config.DEFAULT_TIMEZONE)
+
+def user_timezone(user_id):
+    """The user's timezone, from the cache or their profile"""
+    key = str(user_id)
+    now = time.monotonic()
+    with _lock:
+        cached = _entries.get(key)
+        if cached and now - cached[1] < Config.USER_TIMEZONE_CACHE_TTL_SECONDS:
+            _entries.move_to_end(key)
+            return cached[0]
+
+    profile = mongo.db.user_profiles.find_one({"user_id": key}, {"_id": 0, "timezone": 1}) or {}
+    tz = resolve_timezone(profile.get("timezone"))
+
+    with _lock:
+        _entries[key] = (tz, now)
+        _entries.move_to_end(key)
+        while len(_entries) > Config.USER_TIMEZONE_CACHE_ENTRIES:
+            _entries.popitem(last=False)
+    return tz
+
+def invalidate(user_id):
+    """Forget a user's cached timezone (after a profile update or deletion)"""
+    with _lock:
+        _entries.pop(str(user_id), None)
+
+def local_now(tz, now=None):
+    """The current time (or now, a naive UTC datetime) as a naive local time in tz"""
+    now = now or datetime.utcnow()
+    return now.replace(tzinfo=timezone.utc).astimezone(tz).replace(tzinfo=None)
+
+def local_today(tz, now=None):
+    """Midnight of the current local day in tz, as a naive datetime (the date_at of today's entries)"""
+    return local_now(tz, now).replace(hour=0, minute=0, second=0, microsecond=0)
+
+def local_timestamp(value, tz):
+    """A naive UTC timestamp as an ISO string in tz, with its UTC offset"""
+    return value.replace(tzinfo=timezone.utc).astimezone(tz).isoformat()